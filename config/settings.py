@@ -126,7 +126,33 @@ STATIC_URL = 'static/'
 MEDIA_ROOT = BASE_DIR / 'media'
 MEDIA_URL = '/media/'
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# reports はレポートのグラフ（PNG）用。warm_report_cache コマンドで温めた分を web からも使えるようにファイルに置く
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reports': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'reports',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# レポートのグラフの描き方。'matplotlib' はサーバーで PNG を描き、'json' は系列だけ返してブラウザで描く
+# リクエストごとに ?engine=json のように切り替えられる
+REPORT_GRAPH_ENGINE = env('REPORT_GRAPH_ENGINE', default='matplotlib')
+
+# レポートのグラフを並列に描くプロセス数（1 以下ならリクエストを処理するプロセスでそのまま描く）
+REPORT_CHART_WORKERS = env.int('REPORT_CHART_WORKERS', default=0)
@@ -0,0 +1,29 @@
+from crm.models import LandLedger, LandScoreChemical
+
+
+class ChemicalReportRepository:
+    """
+    化学レポートに使う台帳と土壌分析結果を読む
+    台帳は画面に出す関連（圃場、作物、時期、採土法、採土者、分析機関）ごと1回、分析結果は圃場ブロックごと1回で読む
+    """
+    def __init__(self, landledger_id: int):
+        self._landledger_id = landledger_id
+
+    def read_landledger(self) -> LandLedger:
+        """
+        Raises:
+            LandLedger.DoesNotExist: 台帳がないとき
+        """
+        return LandLedger.objects \
+            .select_related('land', 'crop', 'landperiod', 'sampling_method', 'sampling_staff', 'analytical_agency') \
+            .get(pk=self._landledger_id)
+
+    def read_landscores(self) -> list:
+        """
+        Returns:
+            list: 台帳の LandScoreChemical（landblock を読み込み済み）
+        """
+        return list(LandScoreChemical.objects
+                    .filter(landledger_id=self._landledger_id)
+                    .select_related('landblock')
+                    .order_by('pk'))
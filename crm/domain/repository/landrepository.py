@@ -1,3 +1,5 @@
+from django.db.models import Prefetch
+
 from crm.models import Land, Company, LandLedger
 
 
@@ -9,3 +11,29 @@ class LandRepository:
 
     def read_landledgers(self, land: Land):
         return self.land_ledgers.filter(land=land)
+
+    def read_lands(self):
+        """
+        圃場一覧のカードに出す関連（法人、作型、オーナー）と、台帳（時期つき）をまとめて読む
+        圃場の数によらず、圃場と台帳の2回のクエリになる
+
+        Returns:
+            QuerySet: 法人の圃場（台帳は read_landledger_map で取り出す）
+        """
+        return self._lands \
+            .select_related('company', 'cultivation_type', 'owner') \
+            .prefetch_related(
+                Prefetch('landledger_set',
+                         queryset=LandLedger.objects.select_related('landperiod').order_by('pk'))) \
+            .order_by('pk')
+
+    @staticmethod
+    def read_landledger_map(lands) -> dict:
+        """
+        Args:
+            lands: read_lands() で読んだ圃場
+
+        Returns:
+            dict: 圃場ごとの台帳のリスト（クエリは発行しない）
+        """
+        return {land: list(land.landledger_set.all()) for land in lands}
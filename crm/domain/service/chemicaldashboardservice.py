@@ -0,0 +1,135 @@
+import warnings
+
+import numpy as np
+from django.core.cache import caches
+from django.db.models import Count, Max
+
+from crm.domain.service.reports.reportcache import ChemicalReportCache
+from crm.models import LandScoreChemical, LandScoreChemicalSummary
+
+
+class ChemicalDashboardService:
+    """
+    台帳ごとの分析値の平均を、比べる母集団（法人のすべての台帳、または同じ作物のすべての台帳）の中で順位づける
+    母集団の集計（LandScoreChemicalSummary）を1回のクエリで 台帳✕METRICS の行列にし、パーセンタイル順位、z スコア、
+    順位、外れ値（四分位範囲の1.5倍より外側）をまとめて計算してキャッシュする
+    キーは母集団の集計の件数と最大の pk から作るバージョンなので、分析値が変わって集計が作りなおされると使われなくなる
+    """
+    SCOPES = {
+        'company': 'landledger__land__company_id',
+        'crop': 'landledger__crop_id',
+    }
+    OUTLIER_IQR = 1.5
+
+    def __init__(self, scope: str, scope_id: int):
+        """
+        Args:
+            scope: SCOPES のキー
+            scope_id: 法人または作物の id
+
+        Raises:
+            ValueError: scope が SCOPES にないとき
+        """
+        if scope not in self.SCOPES:
+            raise ValueError(f'unknown scope: {scope}')
+        self._scope = scope
+        self._summaries = LandScoreChemicalSummary.objects.filter(**{self.SCOPES[scope]: scope_id})
+        self._scope_id = scope_id
+
+    def version(self) -> str:
+        agg = self._summaries.aggregate(Count('pk'), Max('pk'))
+        return f"{agg['pk__count']}-{agg['pk__max']}"
+
+    def _load_means(self):
+        """
+        Returns:
+            tuple: 台帳の id の配列（昇順）と、平均の行列（台帳✕METRICS、集計がなければ NaN）
+        """
+        rows = self._summaries.values_list('landledger_id', 'metric', 'count', 'value_sum')
+        table = np.array([(landledger_id, LandScoreChemical.METRICS.index(metric), value_sum / count)
+                          for landledger_id, metric, count, value_sum in rows], dtype=float).reshape(-1, 3)
+
+        landledger_ids, index = np.unique(table[:, 0].astype(np.int64), return_inverse=True)
+        means = np.full((landledger_ids.size, len(LandScoreChemical.METRICS)), np.nan)
+        means[index, table[:, 1].astype(np.intp)] = table[:, 2]
+        return landledger_ids, means
+
+    @staticmethod
+    def _statistics(means: np.ndarray) -> dict:
+        """
+        Args:
+            means: 平均の行列（台帳✕METRICS）
+
+        Returns:
+            dict: means と同じ形の percentile（0〜100）, zscore, rank（値が大きい順に1から）, outlier（bool）
+                  値がない要素は NaN（outlier は False）
+        """
+        valid = ~np.isnan(means)
+        counts = valid.sum(axis=0)
+        percentile = np.full(means.shape, np.nan)
+        rank = np.full(means.shape, np.nan)
+        for i in range(means.shape[1]):
+            column = means[valid[:, i], i]
+            ordered = np.sort(column)
+            lower = np.searchsorted(ordered, column, side='left')
+            upper = np.searchsorted(ordered, column, side='right')
+            # 同じ値は同じ順位にし、パーセンタイル順位は同じ値の半分を下に数える
+            percentile[valid[:, i], i] = (lower + upper) / 2 / column.size * 100
+            rank[valid[:, i], i] = column.size - upper + 1
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            std = np.nanstd(means, axis=0)
+            zscore = (means - np.nanmean(means, axis=0)) / np.where(std > 0, std, np.nan)
+            q1, q3 = np.nanpercentile(means, [25, 75], axis=0)
+        iqr = q3 - q1
+        outlier = valid & (counts >= 4) & (
+            (means < q1 - ChemicalDashboardService.OUTLIER_IQR * iqr) |
+            (means > q3 + ChemicalDashboardService.OUTLIER_IQR * iqr))
+
+        return {'percentile': percentile, 'zscore': zscore, 'rank': rank, 'outlier': outlier}
+
+    def load(self) -> dict:
+        """
+        Returns:
+            dict: 'landledger_ids'（昇順）, 'mean' と、_statistics() の行列（台帳✕METRICS）
+        """
+        key = f'chemical_dashboard:{self._scope}:{self._scope_id}:{self.version()}'
+        cache = caches[ChemicalReportCache.CACHE_ALIAS]
+        dashboard = cache.get(key)
+        if dashboard is None:
+            landledger_ids, means = self._load_means()
+            dashboard = {'landledger_ids': landledger_ids, 'mean': means, **self._statistics(means)}
+            cache.set(key, dashboard, timeout=None)
+        return dashboard
+
+    @staticmethod
+    def rows(dashboard: dict, landledger_ids, metrics) -> dict:
+        """
+        Args:
+            dashboard: load() の戻り値
+            landledger_ids: 取り出す台帳の id（母集団にない台帳は含めない）
+            metrics: 取り出す分析値
+
+        Returns:
+            dict: 台帳の id ごとに、分析値ごとの mean, percentile, zscore, rank, outlier（値がなければ None）
+        """
+        columns = [LandScoreChemical.METRICS.index(metric) for metric in metrics]
+        all_ids = dashboard['landledger_ids']
+        positions = np.searchsorted(all_ids, landledger_ids)
+        rows = {}
+        for landledger_id, position in zip(landledger_ids, positions):
+            if position >= all_ids.size or all_ids[position] != landledger_id:
+                continue
+            rows[landledger_id] = {
+                metric: None if np.isnan(dashboard['mean'][position, column]) else {
+                    'mean': float(dashboard['mean'][position, column]),
+                    'percentile': float(dashboard['percentile'][position, column]),
+                    'zscore': None if np.isnan(dashboard['zscore'][position, column])
+                    else float(dashboard['zscore'][position, column]),
+                    'rank': int(dashboard['rank'][position, column]),
+                    'outlier': bool(dashboard['outlier'][position, column]),
+                }
+                for metric, column in zip(metrics, columns)
+            }
+        return rows
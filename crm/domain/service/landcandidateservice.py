@@ -1,5 +1,3 @@
-from fastkml import kml
-
 from crm.domain.valueobject.land import Land
 from crm.domain.valueobject.landcandidates import LandCandidates
 
@@ -28,6 +26,9 @@ class LandCandidateService:
         Raises:
             ValueError: 不正なKML形式の文字列が指定された場合に発生します。
         """
+        # fastkml は lxml ごと読み込むので、KML を解析するときに import する
+        from fastkml import kml
+
         land_candidates = LandCandidates()
 
         try:
@@ -0,0 +1,86 @@
+from typing import Iterable, Iterator
+
+from django.db import transaction
+from django.db.models import Count, Sum, Min, Max, F
+
+from crm.models import LandScoreChemical, LandScoreChemicalSummary
+
+
+class LandScoreSummaryService:
+    @staticmethod
+    def _aggregate(landscores):
+        """
+        Args:
+            landscores: 集計する土壌分析結果の QuerySet
+
+        Returns:
+            QuerySet: 台帳ごとに、分析値それぞれの件数、合計、2乗の合計、最小、最大（1回の GROUP BY）
+        """
+        annotations = {}
+        for metric in LandScoreChemical.METRICS:
+            annotations[f'{metric}__count'] = Count(metric)
+            annotations[f'{metric}__sum'] = Sum(metric)
+            annotations[f'{metric}__sum_sq'] = Sum(F(metric) * F(metric))
+            annotations[f'{metric}__min'] = Min(metric)
+            annotations[f'{metric}__max'] = Max(metric)
+        return landscores.values('landledger').annotate(**annotations).order_by('landledger')
+
+    @staticmethod
+    def _to_entities(row: dict) -> Iterator[LandScoreChemicalSummary]:
+        """
+        台帳1つ分の集計を、分析値ごとの行にする（値がひとつもない分析値は作らない）
+        """
+        for metric in LandScoreChemical.METRICS:
+            if not row[f'{metric}__count']:
+                continue
+            yield LandScoreChemicalSummary(
+                landledger_id=row['landledger'],
+                metric=metric,
+                count=row[f'{metric}__count'],
+                value_sum=row[f'{metric}__sum'],
+                value_sum_sq=row[f'{metric}__sum_sq'],
+                value_min=row[f'{metric}__min'],
+                value_max=row[f'{metric}__max'],
+            )
+
+    @staticmethod
+    def refresh(landledger_ids: Iterable[int]):
+        """
+        分析値が変わった台帳のロールアップだけを集計しなおす
+
+        Args:
+            landledger_ids: 台帳の id（None は無視する）
+        """
+        landledger_ids = {landledger_id for landledger_id in landledger_ids if landledger_id is not None}
+        if not landledger_ids:
+            return
+
+        with transaction.atomic():
+            LandScoreChemicalSummary.objects.filter(landledger_id__in=landledger_ids).delete()
+            rows = LandScoreSummaryService._aggregate(
+                LandScoreChemical.objects.filter(landledger_id__in=landledger_ids))
+            LandScoreChemicalSummary.objects.bulk_create(
+                [entity for row in rows for entity in LandScoreSummaryService._to_entities(row)])
+
+    @staticmethod
+    def rebuild(batch_size: int = 1000) -> int:
+        """
+        すべてのロールアップを土壌分析結果から作りなおす
+
+        Returns:
+            int: 作成したロールアップの行数
+        """
+        rows = LandScoreSummaryService._aggregate(LandScoreChemical.objects.all())
+        created = 0
+        with transaction.atomic():
+            LandScoreChemicalSummary.objects.all().delete()
+            entities = []
+            for row in rows.iterator(chunk_size=batch_size):
+                entities.extend(LandScoreSummaryService._to_entities(row))
+                if len(entities) >= batch_size:
+                    LandScoreChemicalSummary.objects.bulk_create(entities)
+                    created += len(entities)
+                    entities = []
+            LandScoreChemicalSummary.objects.bulk_create(entities)
+            created += len(entities)
+        return created
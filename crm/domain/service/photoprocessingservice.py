@@ -1,7 +1,5 @@
 from typing import List
 
-from haversine import haversine, Unit
-
 from crm.domain.valueobject.capturelocation import CaptureLocation
 from crm.domain.valueobject.coords.capturelocationcoords import CaptureLocationCoords
 from crm.domain.valueobject.coords.landcoords import LandCoords
@@ -46,7 +44,7 @@ class PhotoProcessingService:
         return nearest_land
 
     @staticmethod
-    def calculate_distance(coords1: CaptureLocationCoords, coords2: LandCoords, unit: str = Unit.METERS) -> float:
+    def calculate_distance(coords1: CaptureLocationCoords, coords2: LandCoords, unit: str = 'm') -> float:
         """
         他の座標との距離を計算します。
         xarvio は 経度緯度(lng,lat) をエクスポートする
@@ -58,6 +56,8 @@ class PhotoProcessingService:
         :param unit: 距離の単位（'km'、'miles'、'm'など）
         :return: 距離（単位に応じた値）
         """
+        from haversine import haversine  # 距離を測るときだけ使うので、ここで import する
+
         return haversine(
             coords1.to_googlemapcoords().get_coords(),
             coords2.to_googlemapcoords().get_coords(),
@@ -1,8 +1,124 @@
+import logging
+import threading
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from crm.domain.valueobject.graph.basegraphengine import BaseGraphEngine
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_chart_executor():
+    """
+    グラフを描くためのプロセスプール（すべてのレポートで共有し、プロセスは使いまわす）
+
+    Returns:
+        ProcessPoolExecutor: settings.REPORT_CHART_WORKERS が 1 以下のときは None（その場で描く）
+    """
+    global _executor
+    workers = getattr(settings, 'REPORT_CHART_WORKERS', 0)
+    if workers <= 1:
+        return None
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        return _executor
+
+
+def shutdown_chart_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def recycle_chart_executor(executor: ProcessPoolExecutor):
+    """
+    時間切れのグラフを描きつづけているプールを、新しいプールに入れ替える
+    future.cancel() では描きはじめたグラフは止まらずワーカーを使いつづけるので、以降のグラフは新しいプールで描く
+    古いプールは待たずに閉じる（ほかのレポートが投入済みのグラフは古いプールで描きおえる）
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def _render_chart(graph_engine: BaseGraphEngine, method: str, args: tuple):
+    """
+    ワーカープロセスで実行するので、モジュールの関数にしておく（pickle できるように）
+    """
+    return getattr(graph_engine, method)(*args)
 
 
 class BaseReportLayout(ABC):
     """レポートを定義するための基底クラス"""
+    # 1つのレポートのグラフを待つ秒数。過ぎたグラフは CHART_FALLBACK にして、ページは返す
+    CHART_TIMEOUT = 10
+    CHART_FALLBACK = None
+
     @abstractmethod
     def publish(self, *args):
         pass
+
+    def _render_charts(self, graph_engine: BaseGraphEngine, jobs: dict) -> dict:
+        """
+        グラフをまとめて描く
+        PNG を描くような重いエンジン（parallel = True）は、プロセスプールで並列に描いて待ち合わせる
+
+        Args:
+            graph_engine: グラフエンジン
+            jobs: グラフ名と (エンジンのメソッド名, 引数のタプル) の dict e.g. {'chart1': ('plot_graph', (title, x, y))}
+
+        Returns:
+            dict: グラフ名とエンジンの戻り値（失敗、時間切れのグラフは CHART_FALLBACK）
+        """
+        executor = get_chart_executor() if graph_engine.parallel else None
+        if executor is None:
+            return {name: self._render_or_fallback(graph_engine, name, method, args)
+                    for name, (method, args) in jobs.items()}
+
+        try:
+            futures = {name: executor.submit(_render_chart, graph_engine, method, args)
+                       for name, (method, args) in jobs.items()}
+        except BrokenProcessPool:
+            logger.exception('chart process pool is broken, rendering in process')
+            shutdown_chart_executor()
+            return {name: self._render_or_fallback(graph_engine, name, method, args)
+                    for name, (method, args) in jobs.items()}
+
+        # 並列に描いているので、待ち時間は全体で CHART_TIMEOUT 秒にする
+        deadline = time.monotonic() + self.CHART_TIMEOUT
+        charts = {}
+        stuck = False
+        for name, future in futures.items():
+            try:
+                charts[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except TimeoutError:
+                logger.exception('timed out rendering chart %s', name)
+                # まだ描きはじめていなければ取り消せる。描いている途中のものはワーカーを空けないので、プールを入れ替える
+                stuck |= not future.cancel()
+                charts[name] = self.CHART_FALLBACK
+            except Exception:
+                logger.exception('failed to render chart %s', name)
+                charts[name] = self.CHART_FALLBACK
+        if stuck:
+            recycle_chart_executor(executor)
+        return charts
+
+    def _render_or_fallback(self, graph_engine: BaseGraphEngine, name: str, method: str, args: tuple):
+        try:
+            return _render_chart(graph_engine, method, args)
+        except Exception:
+            logger.exception('failed to render chart %s', name)
+            return self.CHART_FALLBACK
@@ -0,0 +1,177 @@
+import base64
+import logging
+import zipfile
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Iterator, Tuple
+
+from django.core.cache import caches
+from django.db.models import Prefetch, QuerySet
+from django.template.loader import render_to_string
+
+from crm.domain.service.reports.reportcache import ChemicalReportCache
+from crm.domain.service.reports.reportlayout1 import ReportLayout1
+from crm.domain.valueobject.graph.graphengines import get_graph_engine
+from crm.models import LandLedger, LandScoreChemical, LandReview
+
+logger = logging.getLogger(__name__)
+
+
+class _ZipStream:
+    """
+    ZipFile が書き込んだバイト列をためておき、pop() で取り出す（seek できないので zip はデータディスクリプタ付きで書かれる）
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ChemicalReportExporter:
+    """
+    複数の台帳の化学レポート（グラフ4つの png と、台帳と分析結果の html）を1つの zip にして少しずつ返す
+    台帳は分析結果、講評とあわせてチャンクごとに読み、キャッシュにないグラフは executor で並列に描く
+    先に描き始めるのは window 件の台帳までなので、台帳の件数によらずメモリは一定
+    """
+    CHUNK_SIZE = 100
+    TEMPLATE_NAME = 'crm/landreport/chemical_export.html'
+
+    def __init__(self, landledgers: QuerySet, executor: Executor = None, window: int = 8):
+        """
+        Args:
+            landledgers: 出力する台帳
+            executor: グラフを描く executor（未指定ならその場で描く）
+            window: グラフを描き始めておく台帳の数
+        """
+        self._landledgers = landledgers
+        self._executor = executor
+        self._window = max(window, 1)
+        self.count = 0
+
+    def _iter_landledgers(self) -> Iterator[LandLedger]:
+        return self._landledgers \
+            .select_related('land__company', 'crop', 'landperiod', 'sampling_method', 'sampling_staff',
+                            'analytical_agency') \
+            .prefetch_related(
+                Prefetch('landscorechemical_set',
+                         queryset=LandScoreChemical.objects.select_related('landblock').order_by('pk')),
+                Prefetch('landreview_set', queryset=LandReview.objects.order_by('pk'))) \
+            .order_by('pk') \
+            .iterator(chunk_size=self.CHUNK_SIZE)
+
+    def _submit(self, fn, *args) -> Future:
+        if self._executor is not None:
+            return self._executor.submit(fn, *args)
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _start(self, landledger: LandLedger) -> tuple:
+        """
+        キャッシュにある png を読み、ないグラフを描き始める
+
+        Returns:
+            tuple: 台帳、分析結果、バージョン、グラフ番号ごとの png のバイト列（描いているものは Future）
+        """
+        landscores = list(landledger.landscorechemical_set.all())
+        version = ChemicalReportCache.version(landledger, landscores)
+        keys = {
+            chart_no: ChemicalReportCache.png_key(landledger.pk, chart_no, version)
+            for chart_no in range(1, ReportLayout1.CHART_COUNT + 1)
+        }
+        cached = caches[ChemicalReportCache.CACHE_ALIAS].get_many(keys.values())
+
+        charts = {chart_no: cached[key] for chart_no, key in keys.items() if key in cached}
+        if len(charts) < len(keys):
+            engine = get_graph_engine('matplotlib')
+            specs = ReportLayout1(landledger, engine, landscores).chart_specs()
+            for chart_no in keys.keys() - charts.keys():
+                charts[chart_no] = self._submit(engine.plot_graph, *specs[chart_no - 1])
+        return landledger, landscores, version, charts
+
+    def _finish(self, started: tuple) -> list:
+        """
+        描き終えるのを待って、台帳1つ分のファイルにする（描けなかったグラフは html に載せない）
+
+        Returns:
+            list: zip の中のパスとバイト列
+        """
+        landledger, landscores, version, charts = started
+        cache = caches[ChemicalReportCache.CACHE_ALIAS]
+        pngs = {}
+        for chart_no, chart in sorted(charts.items()):
+            if isinstance(chart, Future):
+                try:
+                    chart = base64.b64decode(chart.result(timeout=ReportLayout1.CHART_TIMEOUT))
+                except Exception:
+                    logger.exception('failed to render chart %s of landledger %s', chart_no, landledger.pk)
+                    continue
+                cache.set(ChemicalReportCache.png_key(landledger.pk, chart_no, version), chart, timeout=None)
+            pngs[f'chart{chart_no}.png'] = chart
+
+        folder = self.folder_name(landledger)
+        html = render_to_string(self.TEMPLATE_NAME, {
+            'landledger': landledger,
+            'landscores': landscores,
+            'landreview': next(iter(landledger.landreview_set.all()), None),
+            'charts': list(pngs),
+        })
+        files = [(f'{folder}/report.html', html.encode('utf-8'))]
+        files += [(f'{folder}/{name}', png) for name, png in pngs.items()]
+        return files
+
+    @staticmethod
+    def folder_name(landledger: LandLedger) -> str:
+        """
+        e.g. 株式会社ＡＡＡ/ススムA1/202307_7月_1（台帳の pk を付けて一意にする）
+        """
+        def clean(name: str) -> str:
+            return str(name).replace('/', '_').replace('\\', '_')
+
+        return '/'.join([
+            clean(landledger.land.company.name),
+            clean(landledger.land.name),
+            clean(f'{landledger.sampling_date:%Y%m}_{landledger.landperiod.name}_{landledger.pk}'),
+        ])
+
+    def iter_files(self) -> Iterator[Tuple[str, bytes]]:
+        """
+        Returns:
+            Iterator: zip の中のパスとバイト列（台帳の pk 順）
+        """
+        started = deque()
+        for landledger in self._iter_landledgers():
+            started.append(self._start(landledger))
+            if len(started) >= self._window:
+                yield from self._finish(started.popleft())
+                self.count += 1
+        while started:
+            yield from self._finish(started.popleft())
+            self.count += 1
+
+    def iter_zip(self) -> Iterator[bytes]:
+        """
+        Returns:
+            Iterator: zip のバイト列をファイル1つごとに区切ったもの（StreamingHttpResponse やファイルにそのまま書く）
+        """
+        stream = _ZipStream()
+        with zipfile.ZipFile(stream, 'w') as zf:
+            for name, data in self.iter_files():
+                # png はすでに圧縮されているので、そのまま格納する
+                compress_type = zipfile.ZIP_STORED if name.endswith('.png') else zipfile.ZIP_DEFLATED
+                zf.writestr(name, data, compress_type=compress_type)
+                yield stream.pop()
+        yield stream.pop()
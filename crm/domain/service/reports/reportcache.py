@@ -0,0 +1,119 @@
+import base64
+from datetime import datetime, timezone
+from typing import Tuple
+
+from django.core.cache import caches
+from django.db.models import Count, Max
+from django.utils import timezone as django_timezone
+
+from crm.domain.service.reports.reportlayout1 import ReportLayout1
+from crm.domain.valueobject.graph.graphengines import get_graph_engine, resolve_graph_engine_name
+from crm.models import LandLedger
+
+
+class ChemicalReportCache:
+    """
+    化学レポート（ReportLayout1）のグラフをキャッシュする
+    キーは台帳と LandScoreChemical から作るバージョン（件数、最大の pk, updated_at）に、台帳の landscore_changed_at を加えたもの
+    updated_at は自動では入らないので、保存と削除は signals で進める landscore_changed_at で検知する
+    （キャッシュに置くと MAX_ENTRIES で追い出されたときに古いグラフが使われてしまうので、DB に置く）
+    """
+    CACHE_ALIAS = 'reports'
+
+    @staticmethod
+    def state(landledger: LandLedger, landscores: list = None) -> Tuple[str, datetime]:
+        """
+        Args:
+            landledger: 台帳
+            landscores: 読み込み済みの台帳の LandScoreChemical（あればクエリせずに、台帳の landscore_changed_at と
+                        そこから求める。なければ台帳の landscore_changed_at も DB から読みなおす）
+
+        Returns:
+            tuple: 台帳の LandScoreChemical が変わると変わる文字列と、最後に変わった日時（Last-Modified 用）
+        """
+        if landscores is None:
+            # 台帳から LEFT JOIN するので、分析結果が1件もない台帳でも landscore_changed_at を読める
+            agg = LandLedger.objects \
+                .filter(pk=landledger.pk) \
+                .aggregate(count=Count('landscorechemical'),
+                           max_pk=Max('landscorechemical__pk'),
+                           updated_at=Max('landscorechemical__updated_at'),
+                           created_at=Max('landscorechemical__created_at'),
+                           landscore_changed_at=Max('landscore_changed_at'))
+        else:
+            agg = {
+                'count': len(landscores),
+                'max_pk': max((landscore.pk for landscore in landscores), default=None),
+                'updated_at': max((x.updated_at for x in landscores if x.updated_at), default=None),
+                'created_at': max((x.created_at for x in landscores if x.created_at), default=None),
+                'landscore_changed_at': landledger.landscore_changed_at,
+            }
+        # どちらの読み方でも、ない値（None）は同じ 0 にしてバージョンをそろえる
+        timestamps = [agg[key].timestamp() if agg[key] else 0 for key in ('updated_at', 'landscore_changed_at')]
+        version = f"{agg['count']}-{agg['max_pk']}-{timestamps[0]}-{timestamps[1]}"
+
+        changed_at = [datetime.fromtimestamp(0, tz=timezone.utc)]
+        changed_at += [agg[key] for key in ('updated_at', 'created_at', 'landscore_changed_at') if agg[key]]
+        return version, max(changed_at)
+
+    @staticmethod
+    def version(landledger: LandLedger, landscores: list = None) -> str:
+        """
+        Returns:
+            str: 台帳の LandScoreChemical が変わると変わる文字列
+        """
+        return ChemicalReportCache.state(landledger, landscores)[0]
+
+    @staticmethod
+    def get_charts(landledger: LandLedger, engine: str = None, landscores: list = None) -> dict:
+        """
+        キャッシュになければ ReportLayout1 で描いてキャッシュする
+
+        Args:
+            landledger: 台帳
+            engine: GRAPH_ENGINES のキー（未指定なら settings.REPORT_GRAPH_ENGINE）
+            landscores: 読み込み済みの台帳の LandScoreChemical（バージョンとグラフの平均に使う）
+
+        Returns:
+            dict: ReportLayout1.publish() の戻り値
+        """
+        engine = resolve_graph_engine_name(engine)
+        key = f'chemical_report:{landledger.pk}:{engine}:{ChemicalReportCache.version(landledger, landscores)}'
+        cache = caches[ChemicalReportCache.CACHE_ALIAS]
+        charts = cache.get(key)
+        if charts is None:
+            charts = ReportLayout1(landledger, get_graph_engine(engine), landscores).publish()
+            # 描けなかった（時間切れなど）グラフがあるときは、次のリクエストで描き直すのでキャッシュしない
+            if all(chart is not None for chart in charts.values()):
+                cache.set(key, charts, timeout=None)
+        return charts
+
+    @staticmethod
+    def png_key(landledger_id: int, chart_no: int, version: str) -> str:
+        return f'chemical_report:{landledger_id}:png{chart_no}:{version}'
+
+    @staticmethod
+    def get_chart_png(landledger: LandLedger, chart_no: int, version: str = None) -> bytes:
+        """
+        グラフ1つ分の png をキャッシュから返す（なければそのグラフだけ Matplotlib で描いてキャッシュする）
+
+        Args:
+            landledger: 台帳
+            chart_no: 1〜ReportLayout1.CHART_COUNT
+            version: state() で求めたバージョン（省略すると求めなおす）
+
+        Returns:
+            bytes: png のバイト列
+        """
+        version = version or ChemicalReportCache.version(landledger)
+        return caches[ChemicalReportCache.CACHE_ALIAS].get_or_set(
+            ChemicalReportCache.png_key(landledger.pk, chart_no, version),
+            lambda: base64.b64decode(ReportLayout1(landledger, get_graph_engine('matplotlib')).publish_chart(chart_no)),
+            timeout=None)
+
+    @staticmethod
+    def invalidate(landledger_id: int):
+        """
+        台帳の landscore_changed_at を進めて、その台帳のキャッシュを使われなくする（古いエントリは MAX_ENTRIES で追い出される）
+        """
+        LandLedger.objects.filter(pk=landledger_id).update(landscore_changed_at=django_timezone.now())
@@ -1,81 +1,124 @@
-from django.db.models import Avg
+import warnings
 
 from crm.domain.service.reports.basereportlayout import BaseReportLayout
-from crm.domain.valueobject.graph.matplotlib import Matplotlib
+from crm.domain.valueobject.graph.basegraphengine import BaseGraphEngine
+from crm.domain.valueobject.graph.graphengines import get_graph_engine
 from crm.models import LandLedger, LandScoreChemical
 
 
 class ReportLayout1(BaseReportLayout):
-    def __init__(self, landledger: LandLedger):
+    CHART_COUNT = 4
+    AVERAGE_FIELDS = LandScoreChemical.METRICS
+
+    def __init__(self, landledger: LandLedger, graph_engine: BaseGraphEngine = None, landscores: list = None):
+        """
+        Args:
+            landledger: 台帳
+            graph_engine: グラフエンジン（未指定なら Matplotlib）
+            landscores: 読み込み済みの台帳の LandScoreChemical（画面と共有する。未指定なら平均に使う列だけ読む）
+        """
         self._landledger = landledger
-        self._landscores = LandScoreChemical.objects.filter(landledger=landledger)
-        self._landscores_agg = self._landscores_aggregate()
+        self._graph_engine = graph_engine or get_graph_engine('matplotlib')
+        if landscores is None:
+            rows = LandScoreChemical.objects.filter(landledger=landledger).values_list(*self.AVERAGE_FIELDS)
+        else:
+            rows = [[getattr(landscore, field) for field in self.AVERAGE_FIELDS] for landscore in landscores]
+        self._landscores_agg = self._landscores_aggregate(rows)
 
-    def _landscores_aggregate(self):
+    def _landscores_aggregate(self, rows) -> dict:
         """
-        landscoresの平均
+        landscoresの平均（SQL の AVG と同じく NULL は除き、すべて NULL なら None）
+
+        Args:
+            rows: AVERAGE_FIELDS の順に並んだ値の行
+
+        Returns:
+            dict: 'ec__avg' のような キー と平均
         """
-        return self._landscores.aggregate(
-            Avg('ec'), Avg('nh4n'), Avg('no3n'), Avg('total_nitrogen'), Avg('nh4_per_nitrogen'),
-            Avg('ph'), Avg('cao'), Avg('mgo'), Avg('k2o'), Avg('base_saturation'), Avg('cao_per_mgo'),
-            Avg('mgo_per_k2o'), Avg('phosphorus_absorption'), Avg('p2o5'), Avg('cec'), Avg('humus'),
-            Avg('bulk_density'),
-        )
+        import numpy as np  # 画面を表示するだけのプロセスでは読み込まないように、集計するときに import する
 
-    def publish(self, *args):
-        g = Matplotlib()
+        values = np.array(list(rows), dtype=float).reshape(-1, len(self.AVERAGE_FIELDS))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            averages = np.nanmean(values, axis=0)
+        return {
+            f'{field}__avg': None if np.isnan(average) else float(average)
+            for field, average in zip(self.AVERAGE_FIELDS, averages)
+        }
 
-        x = ['EC(mS/cm)', 'NH4-N(mg/100g)', 'NO3-N(mg/100g)', '無機態窒素', 'NH4/無機態窒素', ' ', '  ']
-        y = [
-            self._landscores_agg['ec__avg'],
-            self._landscores_agg['nh4n__avg'],
-            self._landscores_agg['no3n__avg'],
-            self._landscores_agg['total_nitrogen__avg'],
-            self._landscores_agg['nh4_per_nitrogen__avg'],
-            0,
-            0
+    def chart_specs(self) -> list:
+        """
+        Returns:
+            list: chart1〜chart4 の (タイトル, x, y)
+        """
+        return [
+            (
+                "窒素関連（1圃場の全エリア平均）",
+                ['EC(mS/cm)', 'NH4-N(mg/100g)', 'NO3-N(mg/100g)', '無機態窒素', 'NH4/無機態窒素', ' ', '  '],
+                [
+                    self._landscores_agg['ec__avg'],
+                    self._landscores_agg['nh4n__avg'],
+                    self._landscores_agg['no3n__avg'],
+                    self._landscores_agg['total_nitrogen__avg'],
+                    self._landscores_agg['nh4_per_nitrogen__avg'],
+                    0,
+                    0
+                ],
+            ),
+            (
+                "塩基類関連（1圃場の全エリア平均）",
+                ['ph', 'CaO(mg/100g)', 'MgO(mg/100g)', 'K2O(mg/100g)', '塩基飽和度(%)', 'CaO/MgO', 'MgO/K2O'],
+                [
+                    self._landscores_agg['ph__avg'],
+                    self._landscores_agg['cao__avg'],
+                    self._landscores_agg['mgo__avg'],
+                    self._landscores_agg['k2o__avg'],
+                    self._landscores_agg['base_saturation__avg'],
+                    self._landscores_agg['cao_per_mgo__avg'],
+                    self._landscores_agg['mgo_per_k2o__avg']
+                ],
+            ),
+            (
+                "リン酸関連（1圃場の全エリア平均）",
+                ['リン吸(mg/100g)', 'P2O5(mg/100g)', ' ', '  ', '   ', '    ', '     '],
+                [
+                    self._landscores_agg['phosphorus_absorption__avg'],
+                    self._landscores_agg['p2o5__avg'],
+                    0,
+                    0,
+                    0,
+                    0,
+                    0
+                ],
+            ),
+            (
+                "土壌ポテンシャル関連（1圃場の全エリア平均）",
+                ['CEC(meq/100g)', '腐植(%)', '仮比重', ' ', '  ', '   ', '    '],
+                [
+                    self._landscores_agg['cec__avg'],
+                    self._landscores_agg['humus__avg'],
+                    self._landscores_agg['bulk_density__avg'],
+                    0,
+                    0,
+                    0,
+                    0
+                ],
+            ),
         ]
-        chart1 = g.plot_graph("窒素関連（1圃場の全エリア平均）", x, y)
 
-        x = ['ph', 'CaO(mg/100g)', 'MgO(mg/100g)', 'K2O(mg/100g)', '塩基飽和度(%)', 'CaO/MgO', 'MgO/K2O']
-        y = [
-            self._landscores_agg['ph__avg'],
-            self._landscores_agg['cao__avg'],
-            self._landscores_agg['mgo__avg'],
-            self._landscores_agg['k2o__avg'],
-            self._landscores_agg['base_saturation__avg'],
-            self._landscores_agg['cao_per_mgo__avg'],
-            self._landscores_agg['mgo_per_k2o__avg']
-        ]
-        chart2 = g.plot_graph("塩基類関連（1圃場の全エリア平均）", x, y)
+    def publish_chart(self, chart_no: int):
+        """
+        グラフを1つだけ描く（グラフごとの画像URLから呼ぶ）
 
-        x = ['リン吸(mg/100g)', 'P2O5(mg/100g)', ' ', '  ', '   ', '    ', '     ']
-        y = [
-            self._landscores_agg['phosphorus_absorption__avg'],
-            self._landscores_agg['p2o5__avg'],
-            0,
-            0,
-            0,
-            0,
-            0
-        ]
-        chart3 = g.plot_graph("リン酸関連（1圃場の全エリア平均）", x, y)
+        Args:
+            chart_no: 1〜CHART_COUNT
 
-        x = ['CEC(meq/100g)', '腐植(%)', '仮比重', ' ', '  ', '   ', '    ']
-        y = [
-            self._landscores_agg['cec__avg'],
-            self._landscores_agg['humus__avg'],
-            self._landscores_agg['bulk_density__avg'],
-            0,
-            0,
-            0,
-            0
-        ]
-        chart4 = g.plot_graph("土壌ポテンシャル関連（1圃場の全エリア平均）", x, y)
+        Returns:
+            グラフエンジンの plot_graph の戻り値
+        """
+        return self._graph_engine.plot_graph(*self.chart_specs()[chart_no - 1])
 
-        return {
-            'chart1': chart1,
-            'chart2': chart2,
-            'chart3': chart3,
-            'chart4': chart4
-        }
+    def publish(self, *args):
+        return self._render_charts(self._graph_engine, {
+            f'chart{i}': ('plot_graph', spec) for i, spec in enumerate(self.chart_specs(), start=1)
+        })
@@ -0,0 +1,134 @@
+import warnings
+
+import numpy as np
+from django.db.models import Sum
+
+from crm.domain.service.reports.basereportlayout import BaseReportLayout
+from crm.domain.valueobject.graph.graphengines import get_graph_engine
+from crm.domain.valueobject.packedseries import PackedSeries
+from crm.models import LandLedger, SoilHardnessAggregate, SoilHardnessProfile
+
+
+class ReportLayout2(BaseReportLayout):
+    """
+    物理レポート（土壌硬度）
+    台帳に関連付けた貫入（SoilHardnessProfile）を1回のクエリで読み、貫入✕深さ の行列にして
+    圃場ブロックごとと圃場全体の深さ別 平均・中央値・90パーセンタイル をまとめて計算する
+    同じ圃場の作期どうしの比較は、貫入を読まずにロールアップ（SoilHardnessAggregate）から読む
+    """
+    def __init__(self, landledger: LandLedger):
+        self._landledger = landledger
+        self._landblock_names, self._pressures = self._load_pressures()
+
+    def _load_pressures(self):
+        """
+        Returns:
+            tuple: 貫入ごとの圃場ブロック名の配列と、圧力の行列（貫入✕深さ 1cm〜、計測していない深さは NaN）
+        """
+        rows = SoilHardnessProfile.objects \
+            .filter(landledger=self._landledger, landblock__isnull=False) \
+            .order_by('landblock__name', 'setmemory') \
+            .values_list('landblock__name', 'depths', 'pressures', 'compressed')
+        landblock_names = []
+        series = []
+        for landblock_name, depths, pressures, compressed in rows:
+            depths = PackedSeries.unpack(depths, compressed)
+            pressures = PackedSeries.unpack(pressures, compressed)
+            # 1cm より浅い深さは行列の列にできない（負の添字だと末尾の深さに回りこむ）ので捨てる
+            valid = depths >= 1
+            landblock_names.append(landblock_name)
+            series.append((depths[valid], pressures[valid]))
+
+        # 貫入がない、またはどの貫入も空（Set Depth 0）のときは空のレポートにする
+        max_depth = max((int(depths.max()) for depths, _ in series if depths.size), default=0)
+        if not max_depth:
+            return np.array([], dtype=object), np.empty((0, 0))
+
+        matrix = np.full((len(series), max_depth), np.nan)
+        for i, (depths, pressures) in enumerate(series):
+            matrix[i, depths.astype(np.intp) - 1] = pressures
+        return np.array(landblock_names, dtype=object), matrix
+
+    @staticmethod
+    def _depth_statistics(pressures: np.ndarray) -> dict:
+        """
+        Args:
+            pressures: 圧力の行列（貫入✕深さ）
+
+        Returns:
+            dict: 深さごとの mean, median, p90 の配列（どの貫入も届いていない深さは NaN）
+        """
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return {
+                'mean': np.nanmean(pressures, axis=0),
+                'median': np.nanmedian(pressures, axis=0),
+                'p90': np.nanpercentile(pressures, 90, axis=0),
+            }
+
+    @property
+    def depths(self) -> np.ndarray:
+        return np.arange(1, self._pressures.shape[1] + 1)
+
+    def statistics(self) -> dict:
+        """
+        Returns:
+            dict: 'field' に圃場全体、'landblocks' に圃場ブロック名ごとの深さ別統計（関連付けた貫入がなければ空）
+        """
+        if not self._pressures.size:
+            return {}
+
+        return {
+            'field': self._depth_statistics(self._pressures),
+            'landblocks': {
+                landblock_name: self._depth_statistics(self._pressures[self._landblock_names == landblock_name])
+                for landblock_name in dict.fromkeys(self._landblock_names)
+            },
+        }
+
+    def season_means(self) -> tuple:
+        """
+        同じ圃場のすべての台帳（作期）の深さ別の平均を、ロールアップから1回のクエリで読む
+
+        Returns:
+            tuple: 作期のラベルのリストと、深さの配列と、平均の行列（作期✕深さ、計測していない深さは NaN）
+        """
+        rows = SoilHardnessAggregate.objects \
+            .filter(landledger__land_id=self._landledger.land_id, depth__gte=1) \
+            .values('landledger', 'landledger__sampling_date', 'landledger__landperiod__name', 'depth') \
+            .annotate(count=Sum('count'), pressure_sum=Sum('pressure_sum')) \
+            .order_by('landledger__sampling_date', 'landledger', 'depth')
+        seasons = {}
+        values = []
+        for row in rows:
+            seasons.setdefault(
+                row['landledger'], f"{row['landledger__sampling_date']:%Y%m} {row['landledger__landperiod__name']}")
+            values.append((len(seasons) - 1, row['depth'], row['pressure_sum'] / row['count']))
+        if not values:
+            return [], np.arange(0), np.empty((0, 0))
+
+        table = np.array(values, dtype=float)
+        max_depth = int(table[:, 1].max())
+        matrix = np.full((len(seasons), max_depth), np.nan)
+        matrix[table[:, 0].astype(np.intp), table[:, 1].astype(np.intp) - 1] = table[:, 2]
+        return list(seasons.values()), np.arange(1, max_depth + 1), matrix
+
+    def publish(self, *args):
+        statistics = self.statistics()
+        if not statistics:
+            return {}
+
+        field = statistics['field']
+        jobs = {
+            'chart1': ('plot_profile', (
+                "土壌硬度（1圃場の全エリア）", self.depths,
+                {'平均': field['mean'], '中央値': field['median'], '90パーセンタイル': field['p90']})),
+            'chart2': ('plot_profile', (
+                "土壌硬度（エリアごとの平均）", self.depths,
+                {landblock_name: landblock['mean'] for landblock_name, landblock in statistics['landblocks'].items()})),
+        }
+        seasons, depths, means = self.season_means()
+        if seasons:
+            jobs['chart3'] = ('plot_profile', (
+                "土壌硬度（作期ごとの平均）", depths, dict(zip(seasons, means))))
+        return self._render_charts(get_graph_engine('matplotlib'), jobs)
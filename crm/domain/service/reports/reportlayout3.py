@@ -0,0 +1,122 @@
+import numpy as np
+
+from crm.domain.service.reports.basereportlayout import BaseReportLayout
+from crm.domain.valueobject.graph.basegraphengine import BaseGraphEngine
+from crm.domain.valueobject.graph.graphengines import get_graph_engine
+from crm.models import Land, LandScoreChemical, LandScoreChemicalSummary
+
+
+class ReportLayout3(BaseReportLayout):
+    """
+    推移レポート（化学）
+    圃場のすべての台帳の集計（LandScoreChemicalSummary）を1回のクエリで読み、作期✕分析値 の行列にして
+    作期ごとの 平均・最小・最大・標準偏差 を並べる
+    """
+    METRIC_LABELS = {
+        'ec': '電気伝導率',
+        'nh4n': 'アンモニア態窒素',
+        'no3n': '硝酸態窒素',
+        'total_nitrogen': '無機態窒素',
+        'nh4_per_nitrogen': 'アンモニア態窒素比',
+        'ph': '水素イオン濃度',
+        'cao': '交換性石灰',
+        'mgo': '交換性苦土',
+        'k2o': '交換性加里',
+        'base_saturation': '塩基飽和度',
+        'cao_per_mgo': '交換性石灰/交換性苦土',
+        'mgo_per_k2o': '交換性苦土/交換性加里',
+        'phosphorus_absorption': 'リン酸吸収係数',
+        'p2o5': '可給態リン酸',
+        'cec': '塩基置換容量',
+        'humus': '腐植',
+        'bulk_density': '仮比重',
+    }
+    DEFAULT_METRICS = ('ph', 'ec', 'cao_per_mgo')
+
+    def __init__(self, land: Land, graph_engine: BaseGraphEngine = None):
+        self._land = land
+        self._graph_engine = graph_engine or get_graph_engine('matplotlib')
+        self._seasons, self._matrices = self._load_summaries()
+
+    def _load_summaries(self):
+        """
+        Returns:
+            tuple: 作期のラベルの配列と、'mean', 'min', 'max', 'std' の行列（作期✕METRICS、集計がなければ NaN）
+        """
+        rows = LandScoreChemicalSummary.objects \
+            .filter(landledger__land=self._land) \
+            .order_by('landledger__sampling_date', 'landledger_id') \
+            .values_list('landledger_id', 'landledger__sampling_date', 'landledger__landperiod__name',
+                         'metric', 'count', 'value_sum', 'value_sum_sq', 'value_min', 'value_max')
+        seasons = {}
+        values = []
+        for landledger_id, sampling_date, landperiod_name, metric, *value in rows:
+            seasons.setdefault(landledger_id, f'{sampling_date:%Y%m} {landperiod_name}')
+            values.append((len(seasons) - 1, LandScoreChemical.METRICS.index(metric), *value))
+
+        shape = (len(seasons), len(LandScoreChemical.METRICS))
+        count, value_sum, value_sum_sq, value_min, value_max = (np.full(shape, np.nan) for _ in range(5))
+        if values:
+            table = np.array(values, dtype=float)
+            index = (table[:, 0].astype(np.intp), table[:, 1].astype(np.intp))
+            for matrix, column in zip((count, value_sum, value_sum_sq, value_min, value_max), range(2, 7)):
+                matrix[index] = table[:, column]
+
+        mean = value_sum / count
+        return list(seasons.values()), {
+            'mean': mean,
+            'min': value_min,
+            'max': value_max,
+            # 母標準偏差
+            'std': np.sqrt(np.clip(value_sum_sq / count - mean ** 2, 0, None)),
+        }
+
+    @property
+    def seasons(self) -> list:
+        return self._seasons
+
+    def statistics(self) -> dict:
+        """
+        Returns:
+            dict: 分析値ごとに、作期の順に並んだ mean, min, max, std の配列
+        """
+        return {
+            metric: {name: matrix[:, i] for name, matrix in self._matrices.items()}
+            for i, metric in enumerate(LandScoreChemical.METRICS)
+        }
+
+    def table(self) -> list:
+        """
+        Returns:
+            list: 分析値ごとに、名前と 作期ごとの (平均, 標準偏差) のリスト（集計がなければ None）
+        """
+        return [
+            {
+                'metric': metric,
+                'label': self.METRIC_LABELS[metric],
+                'cells': [
+                    None if np.isnan(mean) else (float(mean), float(std))
+                    for mean, std in zip(statistics['mean'], statistics['std'])
+                ],
+            }
+            for metric, statistics in self.statistics().items()
+        ]
+
+    def publish(self, metrics=None):
+        """
+        Args:
+            metrics: グラフにする分析値（未指定なら DEFAULT_METRICS）
+
+        Returns:
+            dict: 分析値ごとのグラフ（集計がなければ空）
+        """
+        if not self._seasons:
+            return {}
+
+        statistics = self.statistics()
+        return self._render_charts(self._graph_engine, {
+            metric: ('plot_trend', (
+                f'{self.METRIC_LABELS[metric]}（平均と最小〜最大）', self._seasons,
+                statistics[metric]['mean'], statistics[metric]['min'], statistics[metric]['max']))
+            for metric in metrics or self.DEFAULT_METRICS
+        })
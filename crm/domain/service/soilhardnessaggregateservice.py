@@ -0,0 +1,171 @@
+from itertools import groupby
+from typing import Iterable, Tuple
+
+from django.db import transaction
+from django.db.models import Q
+
+from crm.models import SoilHardnessAggregate, SoilHardnessProfile
+
+
+class SoilHardnessAggregateService:
+    @staticmethod
+    def _to_entity(key: Tuple[int, int, int], summary: list) -> SoilHardnessAggregate:
+        landledger_id, landblock_id, depth = key
+        count, pressure_sum, pressure_sum_sq, pressure_min, pressure_max = summary
+        return SoilHardnessAggregate(
+            landledger_id=landledger_id,
+            landblock_id=landblock_id,
+            depth=depth,
+            count=count,
+            pressure_sum=pressure_sum,
+            pressure_sum_sq=pressure_sum_sq,
+            pressure_min=pressure_min,
+            pressure_max=pressure_max,
+        )
+
+    @staticmethod
+    def _associated_profiles():
+        """
+        Returns:
+            QuerySet: ロールアップの元になる、関連付け済みの貫入（apply() と rebuild() で同じものを読む）
+        """
+        return SoilHardnessProfile.objects \
+            .filter(associated=True, landledger__isnull=False, landblock__isnull=False) \
+            .only('landledger', 'landblock', 'depths', 'pressures', 'compressed')
+
+    @staticmethod
+    def _summarize(sessions: Iterable[Tuple]) -> dict:
+        """
+        Args:
+            sessions: 貫入ごとの (landledger_id, landblock_id, depths, pressures)（None を含む貫入は無視する）
+
+        Returns:
+            dict: (landledger_id, landblock_id, depth) ごとの [件数, 合計, 2乗の合計, 最小, 最大]
+        """
+        # NumPy を読み込むので、関連付けの画面を import するときではなく集計するときに import する
+        import numpy as np
+
+        grouped = {}
+        for landledger_id, landblock_id, depths, pressures in sessions:
+            if landledger_id is not None and landblock_id is not None and depths.size:
+                grouped.setdefault((landledger_id, landblock_id), []).append((depths, pressures))
+
+        summaries = {}
+        for (landledger_id, landblock_id), series in grouped.items():
+            depths, index = np.unique(np.concatenate([d for d, _ in series]), return_inverse=True)
+            pressures = np.concatenate([p for _, p in series]).astype(np.int64)
+            count = np.bincount(index, minlength=depths.size)
+            pressure_sum = np.zeros(depths.size, dtype=np.int64)
+            np.add.at(pressure_sum, index, pressures)
+            pressure_sum_sq = np.zeros(depths.size, dtype=np.int64)
+            np.add.at(pressure_sum_sq, index, pressures * pressures)
+            pressure_min = np.full(depths.size, np.iinfo(np.int64).max)
+            np.minimum.at(pressure_min, index, pressures)
+            pressure_max = np.full(depths.size, np.iinfo(np.int64).min)
+            np.maximum.at(pressure_max, index, pressures)
+            for i, depth in enumerate(depths.tolist()):
+                summaries[(landledger_id, landblock_id, depth)] = [
+                    int(count[i]), int(pressure_sum[i]), int(pressure_sum_sq[i]),
+                    int(pressure_min[i]), int(pressure_max[i])]
+        return summaries
+
+    @staticmethod
+    def _groups_condition(groups: Iterable[Tuple[int, int]]) -> Q:
+        condition = Q()
+        for landledger_id, landblock_id in set(groups):
+            condition |= Q(landledger_id=landledger_id, landblock_id=landblock_id)
+        return condition
+
+    @staticmethod
+    def apply(removed: Iterable[Tuple], added: Iterable[Tuple]):
+        """
+        関連付けを付け替えた貫入の分だけ、(台帳, 圃場ブロック, 深さ) のロールアップに差分を足し引きする
+        件数・合計・2乗の合計は差分で更新し、最小・最大は外した貫入の値がそれに当たっていた深さだけ
+        残っている貫入（SoilHardnessProfile）から件数・合計ごと求めなおす（rebuild() と同じく測定データは読まない）
+        付け替えたあとのプロファイルを保存してから呼ぶこと
+
+        Args:
+            removed: 関連付けを外した貫入の (landledger_id, landblock_id, depths, pressures)
+            added: 関連付けた貫入の (landledger_id, landblock_id, depths, pressures)
+        """
+        removed = SoilHardnessAggregateService._summarize(removed)
+        added = SoilHardnessAggregateService._summarize(added)
+        condition = SoilHardnessAggregateService._groups_condition(key[:2] for key in [*removed, *added])
+        if not condition:
+            return
+
+        with transaction.atomic():
+            current = {
+                (aggregate.landledger_id, aggregate.landblock_id, aggregate.depth): [
+                    aggregate.count, aggregate.pressure_sum, aggregate.pressure_sum_sq,
+                    aggregate.pressure_min, aggregate.pressure_max]
+                for aggregate in SoilHardnessAggregate.objects.select_for_update().filter(condition)
+            }
+
+            stale = set()
+            for key, (count, pressure_sum, pressure_sum_sq, pressure_min, pressure_max) in removed.items():
+                row = current.get(key)
+                if row is None:
+                    continue
+                row[0] -= count
+                row[1] -= pressure_sum
+                row[2] -= pressure_sum_sq
+                if row[0] > 0 and (pressure_min <= row[3] or pressure_max >= row[4]):
+                    stale.add(key)
+            for key, delta in added.items():
+                row = current.get(key)
+                if row is None or row[0] <= 0:
+                    current[key] = list(delta)
+                    continue
+                row[0] += delta[0]
+                row[1] += delta[1]
+                row[2] += delta[2]
+                row[3] = min(row[3], delta[3])
+                row[4] = max(row[4], delta[4])
+
+            if stale:
+                profiles = SoilHardnessAggregateService._associated_profiles() \
+                    .filter(SoilHardnessAggregateService._groups_condition(key[:2] for key in stale))
+                recomputed = SoilHardnessAggregateService._summarize(
+                    (p.landledger_id, p.landblock_id, p.depth_array(), p.pressure_array()) for p in profiles)
+                for key in stale:
+                    # 件数・合計もいっしょに貫入から求めなおして、最小・最大と食い違わないようにする
+                    # 残っている貫入にその深さがなければ、ロールアップのほうが古いので行を消す
+                    current[key] = recomputed.get(key, [0, 0, 0, 0, 0])
+
+            SoilHardnessAggregate.objects.filter(condition).delete()
+            SoilHardnessAggregate.objects.bulk_create([
+                SoilHardnessAggregateService._to_entity(key, summary)
+                for key, summary in current.items()
+                if summary[0] > 0
+            ])
+
+    @staticmethod
+    def rebuild(batch_size: int = 1000) -> int:
+        """
+        すべてのロールアップを関連付け済みの貫入（SoilHardnessProfile）から作りなおす
+        apply() と同じく貫入から求めるので、プロファイルのない測定データは先に backfill_soil_hardness_profile で
+        プロファイルにしておくこと
+
+        Returns:
+            int: 作成したロールアップの行数
+        """
+        profiles = SoilHardnessAggregateService._associated_profiles().order_by('landledger', 'landblock', 'pk')
+        created = 0
+        with transaction.atomic():
+            SoilHardnessAggregate.objects.all().delete()
+            entities = []
+            # (台帳, 圃場ブロック) ごとにまとめて集計するので、読み込むのは1グループ分の貫入だけ
+            for _, group in groupby(profiles.iterator(chunk_size=batch_size),
+                                    key=lambda p: (p.landledger_id, p.landblock_id)):
+                summaries = SoilHardnessAggregateService._summarize(
+                    (p.landledger_id, p.landblock_id, p.depth_array(), p.pressure_array()) for p in group)
+                entities.extend(SoilHardnessAggregateService._to_entity(key, summary)
+                                for key, summary in summaries.items())
+                if len(entities) >= batch_size:
+                    SoilHardnessAggregate.objects.bulk_create(entities, batch_size=batch_size)
+                    created += len(entities)
+                    entities = []
+            SoilHardnessAggregate.objects.bulk_create(entities, batch_size=batch_size)
+            created += len(entities)
+        return created
@@ -0,0 +1,134 @@
+from typing import List
+
+from django.db import transaction
+from django.db.models import Case, When, Value, Q
+
+from crm.domain.service.soilhardnessaggregateservice import SoilHardnessAggregateService
+from crm.models import SoilHardnessMeasurement, SoilHardnessProfile, LandLedger, SamplingOrder, \
+    SamplingMethod
+
+
+class SoilHardnessAssociationService:
+    @staticmethod
+    def field_size(sampling_method: SamplingMethod) -> int:
+        """
+        R型 で1つの起点から関連付ける測定の数（採土順のブロック数✕採土法の回数）
+
+        Returns:
+            int: 1圃場の測定の数。採土順が登録されていないときは 0
+        """
+        return SamplingOrder.objects.filter(sampling_method=sampling_method).count() * sampling_method.times
+
+    @staticmethod
+    def associate_r_pattern(landledger: LandLedger, memory_anchors: List[int]) -> int:
+        """
+        R型 で、メモリ番号の起点（memory_anchor）から 採土順（SamplingOrder）のブロック数✕採土法の回数 分の測定を
+        圃場ブロックに関連付ける
+        起点からのメモリ番号のずれを採土法の回数で割ると、SamplingOrder での何番目のブロックかがわかるので
+        測定データを読み込まずに CASE 式の UPDATE 1回で書き込む（プロファイルも同様に1回）
+        付け替えた貫入のプロファイルから、付け替え前後の (台帳, 圃場ブロック) のロールアップに差分を足し引きする
+
+        Args:
+            landledger: 関連付ける台帳（sampling_method を select_related しておくとクエリが1回減る）
+            memory_anchors: チェックされたメモリ番号の起点
+
+        Returns:
+            int: 更新した測定データの行数
+
+        Raises:
+            ValueError: 台帳の採土法に採土順が登録されていないとき
+        """
+        if not memory_anchors:
+            return 0
+
+        sampling_times = landledger.sampling_method.times
+        landblock_ids = list(SamplingOrder.objects
+                             .filter(sampling_method=landledger.sampling_method)
+                             .order_by('ordering')
+                             .values_list('landblock_id', flat=True))
+        if not landblock_ids:
+            raise ValueError(f'no sampling order for sampling method: {landledger.sampling_method.name}')
+
+        whens = []
+        associated_whens = []
+        # 範囲が重なったときは、あとにチェックされた起点を優先する
+        for memory_anchor in reversed(memory_anchors):
+            for i, landblock_id in enumerate(landblock_ids):
+                first = memory_anchor + i * sampling_times
+                whens.append(When(setmemory__range=(first, first + sampling_times - 1), then=Value(landblock_id)))
+                associated_whens.append(When(setmemory__range=(first, first + sampling_times - 1), then=Value(True)))
+        memory_range = Q()
+        for memory_anchor in memory_anchors:
+            memory_range |= Q(setmemory__range=(memory_anchor, memory_anchor + len(landblock_ids) * sampling_times - 1))
+
+        # 測定データ、プロファイル、ロールアップの差分のどれかで失敗したときに、ロールアップだけずれたままにならないようにする
+        with transaction.atomic():
+            profiles = list(SoilHardnessProfile.objects
+                            .select_for_update()
+                            .filter(memory_range)
+                            .only('setmemory', 'landledger', 'landblock', 'associated',
+                                  'depths', 'pressures', 'compressed'))
+
+            landblock = Case(*whens, default=None)
+            updated = SoilHardnessMeasurement.objects.filter(memory_range).update(landblock_id=landblock,
+                                                                                  landledger=landledger)
+            SoilHardnessProfile.objects.filter(memory_range).update(
+                landblock_id=landblock, landledger=landledger, associated=Case(*associated_whens, default=Value(False)))
+
+            # CASE 式と同じく、あとにチェックされた起点を優先して付け替え後の圃場ブロックを求め、変わった貫入の差分だけ集計する
+            removed = []
+            added = []
+            for profile in profiles:
+                new_landblock_id = None
+                for memory_anchor in memory_anchors:
+                    offset = profile.setmemory - memory_anchor
+                    if 0 <= offset < len(landblock_ids) * sampling_times:
+                        new_landblock_id = landblock_ids[offset // sampling_times]
+                old_group = (profile.landledger_id, profile.landblock_id) if profile.associated else (None, None)
+                if old_group == (landledger.pk, new_landblock_id):
+                    continue
+                depths, pressures = profile.depth_array(), profile.pressure_array()
+                removed.append((*old_group, depths, pressures))
+                added.append((landledger.pk, new_landblock_id, depths, pressures))
+            SoilHardnessAggregateService.apply(removed, added)
+        return updated
+
+    @staticmethod
+    def sync_profiles(measurements: List[SoilHardnessMeasurement]):
+        """
+        関連付けた測定データの圃場ブロックと台帳（と関連付け済みか）を、同じセッションの SoilHardnessProfile にも反映する
+        付け替えた貫入のプロファイルから、付け替え前後の (台帳, 圃場ブロック) のロールアップに差分を足し引きする
+        測定データの更新と同じ transaction.atomic() の中で呼ぶこと
+
+        Args:
+            measurements: landblock, landledger を更新した測定データ
+        """
+        associations = {
+            (m.setdevice_id, m.setmemory, m.setdatetime): (m.landblock_id, m.landledger_id) for m in measurements
+        }
+        if not associations:
+            return
+
+        # プロファイルとロールアップの差分を、呼び出し元の測定データの更新といっしょに1つのトランザクションにする
+        with transaction.atomic():
+            profiles = SoilHardnessProfile.objects \
+                .select_for_update() \
+                .filter(setdevice__in={session[0] for session in associations},
+                        setmemory__in={session[1] for session in associations},
+                        setdatetime__in={session[2] for session in associations}) \
+                .only('setdevice', 'setmemory', 'setdatetime', 'landblock', 'landledger', 'associated',
+                      'depths', 'pressures', 'compressed')
+            profiles = [p for p in profiles if (p.setdevice_id, p.setmemory, p.setdatetime) in associations]
+            removed = []
+            added = []
+            for profile in profiles:
+                old_group = (profile.landledger_id, profile.landblock_id) if profile.associated else (None, None)
+                profile.landblock_id, profile.landledger_id = \
+                    associations[(profile.setdevice_id, profile.setmemory, profile.setdatetime)]
+                profile.associated = profile.landblock_id is not None
+                if old_group != (profile.landledger_id, profile.landblock_id):
+                    depths, pressures = profile.depth_array(), profile.pressure_array()
+                    removed.append((*old_group, depths, pressures))
+                    added.append((profile.landledger_id, profile.landblock_id, depths, pressures))
+            SoilHardnessProfile.objects.bulk_update(profiles, fields=["landblock", "landledger", "associated"])
+            SoilHardnessAggregateService.apply(removed, added)
@@ -0,0 +1,80 @@
+import os
+import zipfile
+from datetime import datetime, timedelta
+from typing import Iterator, Tuple, Type
+
+import numpy as np
+
+
+class SoilHardnessCsvGenerator:
+    """
+    DIK-5531 が出力するレイアウトの土壌硬度CSVを合成する
+    1圃場あたり 5ブロック✕5箇所 = 25ファイルを、圃場名のフォルダ（e.g. ススムA1）にまとめる
+    """
+    PROBES_PER_LAND = 25
+
+    def __init__(self, device: str = 'DIK-5531', setdepth: int = 60, seed: int = None,
+                 start: datetime = datetime(2023, 7, 1, 9, 0, 0)):
+        self._device = device
+        self._setdepth = setdepth
+        self._rng = np.random.default_rng(seed)
+        self._start = start
+
+    def csv_text(self, setmemory: int, setdatetime: datetime) -> str:
+        """
+        CSVファイル1つ分の文字列をつくる
+        圧力は深さとともに増え、25～35cm に耕盤層の硬いピークがある
+        """
+        depths = np.arange(1, self._setdepth + 1)
+        plow_pan = 600 * np.exp(-((depths - 30) / 5) ** 2)
+        pressures = 200 + 25 * depths + plow_pan + self._rng.normal(0, 80, size=depths.size)
+        pressures = np.clip(pressures, 0, None).astype(int)
+
+        lines = [
+            f'{self._device},Digital Cone Penetrometer',
+            f'Memory No.,{setmemory}',
+            'Latitude,0',
+            'Longitude,0',
+            f'Set Depth,{self._setdepth}',
+            f'Date and Time, {setdatetime.strftime("%y.%m.%d %H:%M:%S")}',
+            'Spring,5',
+            'Cone,2',
+            '',
+            'Depth[cm],Pressure[kPa]',
+        ]
+        lines += [f'{depth},{pressure}' for depth, pressure in zip(depths.tolist(), pressures.tolist())]
+        return '\r\n'.join(lines) + '\r\n'
+
+    def generate(self, files: int) -> Iterator[Tuple[str, str]]:
+        """
+        Args:
+            files: 作成するCSVファイル数
+
+        Returns:
+            Iterator: 圃場フォルダを含むCSVのパス（e.g. ススムA1/DIK-5531_0001.csv）とその中身
+        """
+        for i in range(files):
+            setmemory = i + 1
+            folder = f'ススムA{i // self.PROBES_PER_LAND + 1}'
+            setdatetime = self._start + timedelta(minutes=i)
+            yield f'{folder}/{self._device}_{setmemory:04}.csv', self.csv_text(setmemory, setdatetime)
+
+    def write_folder(self, files: int, folder_path: str):
+        for member_name, text in self.generate(files):
+            csv_path = os.path.join(folder_path, *member_name.split('/'))
+            os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+            with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+                f.write(text)
+
+    def write_zip(self, files: int, zip_path: str, zipinfo_class: Type[zipfile.ZipInfo] = zipfile.ZipInfo):
+        """
+        Args:
+            files: 作成するCSVファイル数
+            zip_path: 書き込むzipのパス
+            zipinfo_class: メンバーの ZipInfo（既定ではメンバー名を UTF-8 フラグ付きで書き込む）
+        """
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as z:
+            for member_name, text in self.generate(files):
+                info = zipinfo_class(member_name, date_time=self._start.timetuple()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                z.writestr(info, text.encode('utf-8'))
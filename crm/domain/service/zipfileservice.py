@@ -1,5 +1,7 @@
 import os
+import uuid
 import zipfile
+from typing import Iterator, Tuple
 
 from django.conf import settings
 from django.core.files.uploadedfile import InMemoryUploadedFile
@@ -7,37 +9,68 @@ from django.core.files.uploadedfile import InMemoryUploadedFile
 
 class ZipFileService:
     @staticmethod
-    def handle_uploaded_zip(file: InMemoryUploadedFile) -> str:
+    def save_uploaded_zip(file: InMemoryUploadedFile) -> str:
         """
-        アップロードされたファイルを一時フォルダ media/soilhardness に保存
+        アップロードされたzipを解凍せずに media/soilhardness に保存する
+        同時にアップロードされても衝突しないようにファイル名は一意にする
         Args:
             file: requestから受け取ったファイル
+
+        Returns:
+            str: 保存したzipファイルのパス
         """
-        # 解凍場所の用意
         upload_folder = os.path.join(settings.MEDIA_ROOT, 'soilhardness')
         if not os.path.exists(upload_folder):
             os.makedirs(upload_folder)
 
-        # ファイルを保存
-        destination_zip_path = os.path.join(upload_folder, 'uploaded.zip')
+        destination_zip_path = os.path.join(upload_folder, f'{uuid.uuid4().hex}.zip')
         with open(destination_zip_path, 'wb+') as z:
             for chunk in file.chunks():
                 z.write(chunk)
 
-        # ファイルを解凍
-        with zipfile.ZipFile(destination_zip_path) as z:
+        return destination_zip_path
+
+    @staticmethod
+    def iter_members(zip_path: str, suffix: str = '') -> Iterator[Tuple[str, bytes]]:
+        """
+        zipをディスクに解凍せず、メンバーを1つずつ読み出す
+        Args:
+            zip_path: zipファイルのパス
+            suffix: 読み出すメンバーの拡張子 e.g. .csv
+
+        Returns:
+            Iterator: 文字化けを直したメンバー名とその中身
+        """
+        with zipfile.ZipFile(zip_path) as z:
             for info in z.infolist():
-                info.filename = ZipFileService._convert_to_cp932(info.filename)
-                z.extract(info, path=upload_folder)
+                member_name = ZipFileService._member_name(info)
+                if info.is_dir() or not member_name.lower().endswith(suffix):
+                    continue
+                yield member_name, z.read(info)
 
-        return upload_folder
+    @staticmethod
+    def count_members(zip_path: str, suffix: str = '') -> int:
+        """
+        zipの中央ディレクトリだけを見て、メンバーの数を数える
+        """
+        with zipfile.ZipFile(zip_path) as z:
+            return sum(1 for info in z.infolist()
+                       if not info.is_dir() and ZipFileService._member_name(info).lower().endswith(suffix))
+
+    @staticmethod
+    def _member_name(info: zipfile.ZipInfo) -> str:
+        """
+        UTF-8フラグ（0x800）が立っていないメンバー名は cp437 として読まれているので cp932 に直す
+        """
+        if info.flag_bits & 0x800:
+            return info.filename
+        return ZipFileService._convert_to_cp932(info.filename)
 
     @staticmethod
     def _convert_to_cp932(folder_name: str) -> str:
         """
         WindowsでZipファイルを作成すると、文字化けが起こるので対応
-        TODO: テストが作れない（cp437で壊れたzipfileが再現できないので、公開サーバいったときに失敗する可能性あり）
-         南さんのパソコンでやっているあいだは大丈夫だと思う
+        cp437で壊れたzipfileはテストの Cp932ZipInfo（crm/tests/domain/service/test_zipfileservice.py）で再現できる
 
         See Also: https://qiita.com/tohka383/items/b72970b295cbc4baf5ab
         """
@@ -3,6 +3,17 @@ from abc import ABC, abstractmethod
 
 class BaseGraphEngine(ABC):
     """グラフ処理を定義するための基底クラス"""
+    # 描くのが重く、レポートでプロセスプールに分けて描いたほうがよいか
+    parallel = False
+
     @abstractmethod
     def plot_graph(self, *args):
         pass
+
+    @abstractmethod
+    def plot_profile(self, *args):
+        pass
+
+    @abstractmethod
+    def plot_trend(self, *args):
+        pass
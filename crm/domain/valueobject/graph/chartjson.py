@@ -0,0 +1,62 @@
+import math
+
+from .basegraphengine import BaseGraphEngine
+
+
+def _to_number(value):
+    """
+    Decimal や NumPy の値を JSON にできる float にする（値がない、NaN のときは None）
+    """
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+class ChartJson(BaseGraphEngine):
+    """
+    グラフを描かずに、ブラウザで描くための系列（dict）を返す
+    テンプレートで json_script にして、static の crm/js/landreport/barchart.js で描く
+    """
+    def plot_graph(self, title, x, y):
+        """
+        :param title:
+        :param x: ラベル
+        :param y: 値
+        :return: {'title', 'labels', 'values'}
+        """
+        return {
+            'title': title,
+            'labels': [str(label) for label in x],
+            'values': [_to_number(value) for value in y],
+        }
+
+    def plot_profile(self, title, depths, series):
+        """
+        :param title:
+        :param depths: 深さ(cm)の配列
+        :param series: 凡例名と、深さごとの圧力(kPa)の配列の dict
+        :return: {'title', 'depths', 'series'}
+        """
+        return {
+            'title': title,
+            'depths': [int(depth) for depth in depths],
+            'series': {label: [_to_number(value) for value in values] for label, values in series.items()},
+        }
+
+    def plot_trend(self, title, labels, mean, low, high):
+        """
+        :param title:
+        :param labels: 作期のラベル
+        :param mean: 作期ごとの平均
+        :param low: 作期ごとの下限（最小値など）
+        :param high: 作期ごとの上限（最大値など）
+        :return: {'title', 'labels', 'mean', 'low', 'high'}
+        """
+        return {
+            'title': title,
+            'labels': [str(label) for label in labels],
+            'mean': [_to_number(value) for value in mean],
+            'low': [_to_number(value) for value in low],
+            'high': [_to_number(value) for value in high],
+        }
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .basegraphengine import BaseGraphEngine
+
+# matplotlib は読み込むのが重いので、エンジンは最初に使うときに import する
+GRAPH_ENGINES = {
+    'matplotlib': 'crm.domain.valueobject.graph.matplotlib.Matplotlib',
+    'json': 'crm.domain.valueobject.graph.chartjson.ChartJson',
+}
+
+
+def resolve_graph_engine_name(name: str = None) -> str:
+    """
+    Args:
+        name: リクエストで指定されたエンジン名（未指定や不明なときは settings.REPORT_GRAPH_ENGINE）
+
+    Returns:
+        str: GRAPH_ENGINES のキー
+    """
+    if name in GRAPH_ENGINES:
+        return name
+    return getattr(settings, 'REPORT_GRAPH_ENGINE', 'matplotlib')
+
+
+def get_graph_engine(name: str = None) -> BaseGraphEngine:
+    return import_string(GRAPH_ENGINES[resolve_graph_engine_name(name)])()
@@ -1,11 +1,39 @@
-import matplotlib.pyplot as plt
 import base64
 from io import BytesIO
 
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
 from .basegraphengine import BaseGraphEngine
 
+# pyplot は使わずにオブジェクト指向の Figure で描くので、バックエンドの切り替えも不要。フォントの設定は import 時の1回だけ
+matplotlib.rcParams["font.family"] = "Meiryo"
+
 
 class Matplotlib(BaseGraphEngine):
+    """
+    呼び出しごとに pyplot のグローバルな状態を使わない Figure を作って描き、描き終えたら解放する
+    Figure はスレッド間で共有しないので、複数スレッドから同時に呼んでもよい
+    """
+    parallel = True
+
+    @staticmethod
+    def _to_base64(figure: Figure) -> str:
+        """
+        Figure を png にして base64 の文字列で返し、Figure を解放する
+        """
+        canvas = FigureCanvasAgg(figure)
+        buffer = BytesIO()              # バイナリI/O(画像や音声データを取り扱う際に利用)
+        try:
+            figure.tight_layout()
+            canvas.print_png(buffer)
+            graph = base64.b64encode(buffer.getvalue()).decode("utf-8")
+        finally:
+            buffer.close()
+            figure.clear()
+        return graph
+
     def plot_graph(self, title, x, y):
         """
         グラフをプロットするための設定
@@ -14,20 +42,51 @@ class Matplotlib(BaseGraphEngine):
         :param y:
         :return:
         """
-        plt.rcParams["font.family"] = "Meiryo"
-        plt.switch_backend("AGG")       # スクリプトを出力させない
-        plt.figure(figsize=(5, 2))      # グラフサイズ
-        plt.barh(x, y)                  # グラフ作成
-        plt.xticks(rotation=45)         # X軸値を45度傾けて表示
-        plt.title(title)                # グラフタイトル
-
-        buffer = BytesIO()                  # バイナリI/O(画像や音声データを取り扱う際に利用)
-        plt.tight_layout()
-        plt.savefig(buffer, format="png")   # png形式の画像データを取り扱う
-        buffer.seek(0)                      # ストリーム先頭のoffset byteに変更
-        img = buffer.getvalue()             # バッファの全内容を含むbytes
-        graph = base64.b64encode(img)       # 画像ファイルをbase64でエンコード
-        graph = graph.decode("utf-8")       # デコードして文字列から画像に変換
-        buffer.close()
+        figure = Figure(figsize=(5, 2))     # グラフサイズ
+        ax = figure.add_subplot()
+        ax.barh(x, y)                       # グラフ作成
+        ax.tick_params(axis="x", labelrotation=45)  # X軸値を45度傾けて表示
+        ax.set_title(title)                 # グラフタイトル
 
-        return graph
+        return self._to_base64(figure)
+
+    def plot_profile(self, title, depths, series):
+        """
+        深さを縦軸（下向き）、圧力を横軸にした折れ線グラフ（土壌硬度の断面）
+        :param title:
+        :param depths: 深さ(cm)の配列
+        :param series: 凡例名と、深さごとの圧力(kPa)の配列の dict
+        :return:
+        """
+        figure = Figure(figsize=(5, 4))     # グラフサイズ
+        ax = figure.add_subplot()
+        for label, pressures in series.items():
+            ax.plot(pressures, depths, label=label)
+        ax.invert_yaxis()                   # 地表を上にする
+        ax.set_xlabel("Pressure(kPa)")
+        ax.set_ylabel("Depth(cm)")
+        ax.legend(fontsize="small")
+        ax.set_title(title)                 # グラフタイトル
+
+        return self._to_base64(figure)
+
+    def plot_trend(self, title, labels, mean, low, high):
+        """
+        作期を横軸にした平均の折れ線と、下限〜上限の帯（作期をまたいだ推移）
+        :param title:
+        :param labels: 作期のラベル
+        :param mean: 作期ごとの平均
+        :param low: 作期ごとの下限（最小値など）
+        :param high: 作期ごとの上限（最大値など）
+        :return:
+        """
+        figure = Figure(figsize=(5, 2))     # グラフサイズ
+        ax = figure.add_subplot()
+        positions = range(len(labels))
+        ax.fill_between(positions, low, high, alpha=0.2)
+        ax.plot(positions, mean, marker="o")
+        ax.set_xticks(positions, labels)
+        ax.tick_params(axis="x", labelrotation=45)  # X軸値を45度傾けて表示
+        ax.set_title(title)                 # グラフタイトル
+
+        return self._to_base64(figure)
@@ -0,0 +1,47 @@
+import zlib
+
+import numpy as np
+
+
+class PackedSeries:
+    """
+    整数の系列を int16 の NumPy 配列のバイト列にして BinaryField に保存するための変換
+    土壌硬度計の深さ（cm）と圧力（kPa）は int16 の範囲に収まる
+    """
+    DTYPE = np.dtype('<i2')
+
+    @staticmethod
+    def pack(values, compress: bool = False) -> bytes:
+        """
+        Args:
+            values: 整数の系列
+            compress: zlib で圧縮するか
+
+        Returns:
+            bytes: リトルエンディアンの int16 のバイト列
+
+        Raises:
+            ValueError: int16 に収まらない値が含まれている場合に発生します。
+        """
+        array = np.asarray(values, dtype=np.int64)
+        info = np.iinfo(PackedSeries.DTYPE)
+        if array.size and (array.min() < info.min or array.max() > info.max):
+            raise ValueError(f"value out of int16 range: {array.min()}..{array.max()}")
+
+        packed = array.astype(PackedSeries.DTYPE).tobytes()
+        return zlib.compress(packed) if compress else packed
+
+    @staticmethod
+    def unpack(packed: bytes, compressed: bool = False) -> np.ndarray:
+        """
+        Args:
+            packed: pack したバイト列（DBから読んだ memoryview でもよい）
+            compressed: zlib で圧縮されているか
+
+        Returns:
+            np.ndarray: int16 の配列
+        """
+        packed = bytes(packed)
+        if compressed:
+            packed = zlib.decompress(packed)
+        return np.frombuffer(packed, dtype=PackedSeries.DTYPE)
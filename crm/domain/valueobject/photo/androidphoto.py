@@ -1,12 +1,14 @@
 import io
 import os
 import re
-
-import exifread
+from typing import TYPE_CHECKING
 
 from crm.domain.valueobject.capturelocation import CaptureLocation
 from crm.domain.valueobject.photo.basephoto import BasePhoto
 
+if TYPE_CHECKING:
+    import exifread
+
 
 class AndroidPhoto(BasePhoto):
     def __init__(self, photo_path: str):
@@ -17,6 +19,8 @@ class AndroidPhoto(BasePhoto):
         self.location = self._extract_location()
 
     def _extract_exif_data(self) -> dict:
+        import exifread  # 写真を読むときだけ使うので、ここで import する
+
         with open(self.filepath, "rb") as f:
             file_data = f.read()
         tags = exifread.process_file(io.BytesIO(file_data))
@@ -51,7 +55,7 @@ class AndroidPhoto(BasePhoto):
         return CaptureLocation(self._convert_to_degrees(gps_longitude), self._convert_to_degrees(gps_latitude))
 
     @staticmethod
-    def _convert_to_degrees(coord: exifread.classes.IfdTag):
+    def _convert_to_degrees(coord: 'exifread.classes.IfdTag'):
         degrees = float(coord.values[0].num) / float(coord.values[0].den)
         minutes = float(coord.values[1].num) / float(coord.values[1].den)
         seconds = float(coord.values[2].num) / float(coord.values[2].den)
@@ -0,0 +1,59 @@
+import itertools
+
+from django.core.management.base import BaseCommand
+
+from crm.domain.valueobject.packedseries import PackedSeries
+from crm.models import SoilHardnessMeasurement, SoilHardnessProfile
+
+
+class Command(BaseCommand):
+    help = 'Build SoilHardnessProfile rows from existing SoilHardnessMeasurement rows'
+
+    SESSION_FIELDS = ('setdevice', 'setmemory', 'setdatetime')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of profiles per INSERT statement (default: 500)')
+        parser.add_argument('--compress', action='store_true', help='Compress depth/pressure arrays with zlib')
+
+    def handle(self, *args, **options):
+        """
+        深さごとの測定データをセッション (setdevice, setmemory, setdatetime) ごとにまとめて SoilHardnessProfile にする
+        作成済みのセッションは読み飛ばすので、何度実行してもよい
+        """
+        measurements = SoilHardnessMeasurement.objects \
+            .values_list(*self.SESSION_FIELDS, 'setdepth', 'setspring', 'setcone', 'csvfolder',
+                         'landblock', 'landledger', 'depth', 'pressure') \
+            .order_by(*self.SESSION_FIELDS, 'depth') \
+            .iterator(chunk_size=10000)
+
+        profiles_before = SoilHardnessProfile.objects.count()
+        profiles = []
+        for session, rows in itertools.groupby(measurements, key=lambda row: row[:3]):
+            rows = list(rows)
+            setdevice, setmemory, setdatetime, setdepth, setspring, setcone, csvfolder, landblock, landledger, _, _ \
+                = rows[0]
+            profiles.append(SoilHardnessProfile(
+                setdevice_id=setdevice,
+                setmemory=setmemory,
+                setdatetime=setdatetime,
+                setdepth=setdepth,
+                setspring=setspring,
+                setcone=setcone,
+                depths=PackedSeries.pack([row[9] for row in rows], options['compress']),
+                pressures=PackedSeries.pack([row[10] for row in rows], options['compress']),
+                compressed=options['compress'],
+                row_count=len(rows),
+                associated=landblock is not None,
+                csvfolder=csvfolder,
+                landblock_id=landblock,
+                landledger_id=landledger,
+            ))
+            if len(profiles) == options['batch_size']:
+                SoilHardnessProfile.objects.bulk_create(profiles, ignore_conflicts=True)
+                profiles = []
+        if profiles:
+            SoilHardnessProfile.objects.bulk_create(profiles, ignore_conflicts=True)
+
+        created = SoilHardnessProfile.objects.count() - profiles_before
+        self.stdout.write(self.style.SUCCESS(f'Successfully backfilled {created} soil hardness profiles.'))
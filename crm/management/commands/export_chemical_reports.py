@@ -0,0 +1,42 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from crm.domain.service.reports.chemicalreportexporter import ChemicalReportExporter
+from crm.models import LandLedger
+
+
+class Command(BaseCommand):
+    help = 'Export chemical reports (chart PNGs and an HTML score table) of many land ledgers into one zip'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', type=str, help='Path of the zip to write')
+        parser.add_argument('--company', type=int, nargs='*', help='Company ids (default: all)')
+        parser.add_argument('--landperiod', type=int, nargs='*', help='LandPeriod ids (default: all)')
+        parser.add_argument('--landledger', type=int, nargs='*', help='LandLedger ids (default: all with scores)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Processes rendering charts in parallel (1 renders in this process)')
+
+    def handle(self, *args, **options):
+        landledgers = LandLedger.objects.filter(landscorechemical__isnull=False).distinct()
+        if options['company']:
+            landledgers = landledgers.filter(land__company__in=options['company'])
+        if options['landperiod']:
+            landledgers = landledgers.filter(landperiod__in=options['landperiod'])
+        if options['landledger']:
+            landledgers = landledgers.filter(pk__in=options['landledger'])
+
+        workers = options['workers']
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        exporter = ChemicalReportExporter(landledgers, executor, window=max(workers, 1) * 2)
+        try:
+            with open(options['output'], 'wb') as f:
+                for chunk in exporter.iter_zip():
+                    f.write(chunk)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully exported {exporter.count} chemical reports to {options['output']}."))
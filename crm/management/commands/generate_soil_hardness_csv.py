@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from crm.domain.service.soilhardnesscsvgenerator import SoilHardnessCsvGenerator
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic DIK-5531 soil hardness CSV files into a folder or zip'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_path', type=str, help='Folder path, or zip file path with --zip')
+        parser.add_argument('--files', type=int, default=25, help='Number of CSV files (default: 25)')
+        parser.add_argument('--zip', action='store_true', help='Write a zip instead of a folder')
+        parser.add_argument('--setdepth', type=int, default=60, help='Set Depth of each CSV (default: 60)')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible pressures')
+
+    def handle(self, *args, **options):
+        generator = SoilHardnessCsvGenerator(setdepth=options['setdepth'], seed=options['seed'])
+        if options['zip']:
+            generator.write_zip(options['files'], options['output_path'])
+        else:
+            generator.write_folder(options['files'], options['output_path'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully generated {options['files']} soil hardness CSV files: {options['output_path']}"))
@@ -1,14 +1,25 @@
 import csv
 import glob
+import hashlib
+import io
+import itertools
 import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+import django
+import numpy as np
 import pytz
 
 from django.core.management.base import BaseCommand
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 
-from crm.models import SoilHardnessMeasurement, SoilHardnessMeasurementImportErrors, Device
+from crm.domain.service.zipfileservice import ZipFileService
+from crm.domain.valueobject.packedseries import PackedSeries
+from crm.models import SoilHardnessMeasurement, SoilHardnessMeasurementImportErrors, Device, SoilHardnessImportJob, \
+    SoilHardnessImportManifest, SoilHardnessProfile
 
 
 def extract_setdevice(line: list) -> str:
@@ -50,80 +61,334 @@ def extract_numeric_value(line: list) -> int:
     return value
 
 
+def read_data_block(text: str, setdepth: int) -> tuple:
+    """
+    11行目以降の測定データを NumPy でまとめて解析し、ベクトル演算で検証する
+
+    Args:
+        text: 11行目以降の文字列
+        setdepth: 属性情報の Set Depth（1cm ごとに1行なので行数と一致する）
+
+    Returns:
+        tuple: depth の配列と pressure の配列
+
+    Raises:
+        ValueError: 数値でない値、深さが単調増加でない、圧力が負、行数が Set Depth と一致しない場合に発生します。
+    """
+    if text.strip():
+        data = np.loadtxt(io.StringIO(text), delimiter=',', usecols=(0, 1), dtype=np.int64, ndmin=2)
+    else:
+        data = np.empty((0, 2), dtype=np.int64)
+    depths, pressures = data[:, 0], data[:, 1]
+
+    if len(depths) != setdepth:
+        raise ValueError(f"unexpected row count: {len(depths)} (Set Depth {setdepth})")
+    if not np.all(np.diff(depths) > 0):
+        raise ValueError(f"unexpected depth order at row {np.argmax(np.diff(depths) <= 0) + 12}")
+    if not np.all(pressures >= 0):
+        raise ValueError(f"unexpected negative pressure at row {np.argmax(pressures < 0) + 11}")
+
+    return depths, pressures
+
+
+def read_csv(f) -> tuple:
+    """
+    CSVファイル1つ分を読み込み、属性情報と測定データに分ける
+
+    Args:
+        f: 開いたCSVファイル
+
+    Returns:
+        tuple: 属性情報の辞書と depth の配列、pressure の配列
+    """
+    reader = csv.reader(f)
+
+    # 1行目～10行目 から属性情報を取得
+    header = {'setdevice': extract_setdevice(next(reader)), 'setmemory': extract_numeric_value(next(reader))}
+    next(reader)  # skip Latitude
+    next(reader)  # skip Longitude
+    header['setdepth'] = extract_numeric_value(next(reader))
+    header['setdatetime'] = extract_setdatetime(next(reader))
+    header['setspring'] = extract_numeric_value(next(reader))
+    header['setcone'] = extract_numeric_value(next(reader))
+    next(reader)  # skip blank line
+    next(reader)  # skip header line
+
+    # 11行目以降のデータ
+    depths, pressures = read_data_block(f.read(), header['setdepth'])
+    return header, depths, pressures
+
+
+def iter_csv_sources(path: str):
+    """
+    取り込み対象のCSVを (パス, 中身) で1つずつ返す
+    zipファイルが指定されたときはディスクに解凍せず、アーカイブから直接読み出す
+    """
+    if os.path.isfile(path) and zipfile.is_zipfile(path):
+        yield from ZipFileService.iter_members(path, '.csv')
+        return
+
+    for csv_file in glob.glob(os.path.join(path, '**/*.csv'), recursive=True):
+        with open(csv_file, 'rb') as f:
+            yield csv_file, f.read()
+
+
+def count_csv_sources(path: str) -> int:
+    """
+    取り込み対象のCSVの数を、中身を読まずに数える
+    """
+    if os.path.isfile(path) and zipfile.is_zipfile(path):
+        return ZipFileService.count_members(path, '.csv')
+
+    return len(glob.glob(os.path.join(path, '**/*.csv'), recursive=True))
+
+
+def parse_csv_file(source: tuple) -> tuple:
+    """
+    CSVファイル1つ分を解析する（ワーカープロセスで実行できるようにDBには触らない）
+    解析に失敗したときは例外を投げずにメッセージを返し、エラーの記録は書き込み側に任せる
+
+    Args:
+        source: CSVのパスとその中身（bytes）、中身の SHA-256
+
+    Returns:
+        tuple: csv_file, sha256, 属性情報, depth の配列, pressure の配列, エラーメッセージ
+    """
+    csv_file, data, sha256 = source
+    try:
+        with io.StringIO(data.decode('utf-8'), newline='') as f:
+            header, depths, pressures = read_csv(f)
+        return csv_file, sha256, header, depths, pressures, None
+    except Exception as e:
+        return csv_file, sha256, None, None, None, str(e)
+
+
+def chunked(iterable, size: int):
+    """
+    iterable を size 件ずつのリストに分けて返す
+    """
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
 class Command(BaseCommand):
     help = 'Import soil hardness measurements from CSV'
 
+    PREFLIGHT_CHUNK_SIZE = 500
+
     def add_arguments(self, parser):
-        parser.add_argument('folder_path', type=str, help='Folder path containing CSV files')
+        parser.add_argument('folder_path', type=str, help='Folder path or zip file containing CSV files')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of rows per INSERT statement (default: 500)')
+        parser.add_argument('--files-per-transaction', type=int, default=1,
+                            help='Number of CSV files committed in one transaction (default: 1)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of processes parsing CSV files in parallel (default: 1)')
+        parser.add_argument('--job', type=int, default=None,
+                            help='SoilHardnessImportJob id to report progress and errors to')
 
     def handle(self, *args, **options):
         folder_path = options['folder_path']
         try:
             if not folder_path or not os.path.exists(folder_path):
                 raise ValueError(f'Folder path does not exist: {folder_path}')
+            if min(options['batch_size'], options['files_per_transaction'], options['workers']) < 1:
+                raise ValueError('--batch-size, --files-per-transaction and --workers must be 1 or more')
         except ValueError as e:
             self.stderr.write(self.style.ERROR(str(e)))
             return
 
-        SoilHardnessMeasurementImportErrors.objects.all().delete()
-        csv_files = glob.glob(os.path.join(options['folder_path'], '**/*.csv'), recursive=True)
+        # ジョブから実行されたときは進捗とエラーをジョブに記録する
+        self.job = SoilHardnessImportJob.objects.get(pk=options['job']) if options['job'] else None
+        self.processed_files = 0
+        self.error_files = 0
+        self.skipped_files = 0
+        if self.job:
+            self.job.total_files = count_csv_sources(folder_path)
+            self.job.save(update_fields=['total_files'])
+        else:
+            SoilHardnessMeasurementImportErrors.objects.filter(job__isnull=True).delete()
+
+        csv_sources = self._skip_unchanged(iter_csv_sources(folder_path))
         m_device = {device.name: device for device in Device.objects.all()}
 
-        for csv_file in csv_files:
-            parent_folder = os.path.basename(os.path.dirname(csv_file))
-
-            try:
-                with open(csv_file, newline='', encoding='utf-8') as f:
-                    reader = csv.reader(f)
-
-                    # 1行目～10行目 から属性情報を取得
-                    setdevice = m_device[extract_setdevice(next(reader))]
-                    setmemory = extract_numeric_value(next(reader))
-                    next(reader)  # skip Latitude
-                    next(reader)  # skip Longitude
-                    setdepth = extract_numeric_value(next(reader))
-                    setdatetime = extract_setdatetime(next(reader))
-                    setspring = extract_numeric_value(next(reader))
-                    setcone = extract_numeric_value(next(reader))
-                    next(reader)  # skip blank line
-                    next(reader)  # skip header line
-
-                    # 11行目以降のデータを保存
-                    for row in reader:
-                        SoilHardnessMeasurement.objects.create(
-                            setdevice=setdevice,
-                            setmemory=setmemory,
-                            setdatetime=setdatetime,
-                            setdepth=setdepth,
-                            setspring=setspring,
-                            setcone=setcone,
-                            depth=int(row[0]),
-                            pressure=int(row[1]),
-                            csvfolder=parent_folder,
-                        )
-
-            except IntegrityError as e:
-                if 'duplicate entry' in str(e).lower():
-                    SoilHardnessMeasurementImportErrors.objects.create(
-                        csvfile=os.path.basename(csv_file),
-                        csvfolder=parent_folder,
-                        message='取り込み済み',
-                    )
-                    self.stderr.write(self.style.WARNING(
-                        f'Duplicate entry detected: {parent_folder}/{os.path.basename(csv_file)}. '
-                        f'Skipping import.'))
-                else:
-                    raise e
-
-            except Exception as e:
-                SoilHardnessMeasurementImportErrors.objects.create(
-                    csvfile=os.path.basename(csv_file),
-                    csvfolder=parent_folder,
-                    message=str(e),
-                )
-                self.stderr.write(self.style.ERROR(
-                    f'Error occurred while importing soil hardness measurements '
-                    f'from {parent_folder}/{os.path.basename(csv_file)}: {str(e)}'))
+        if options['workers'] > 1:
+            # 解析はプロセスプールで並列に行い、書き込みはこのプロセスだけがファイル順に行う
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as executor:
+                parsed_files = executor.map(parse_csv_file, csv_sources, chunksize=8)
+                self._write_parsed_files(parsed_files, m_device, options)
+        else:
+            self._write_parsed_files(map(parse_csv_file, csv_sources), m_device, options)
+        self._update_job_progress()
 
+        if self.skipped_files:
+            self.stdout.write(f'Skipped {self.skipped_files} unchanged CSV files.')
         self.stdout.write(self.style.SUCCESS(
             'Successfully imported all soil hardness measurements from CSV files.'))
+
+    def _skip_unchanged(self, csv_sources):
+        """
+        前回までの取り込みで台帳に記録したCSVと中身のハッシュが一致するものを、解析する前に読み飛ばす
+        台帳は PREFLIGHT_CHUNK_SIZE ファイルごとに1クエリで照会する
+        この取り込みで先に出てきた同じ中身のCSVは読み飛ばさずに解析し、取り込み済みとして報告する
+        """
+        yielded = set()
+        for chunk in chunked(csv_sources, self.PREFLIGHT_CHUNK_SIZE):
+            sources = [(csv_file, data, hashlib.sha256(data).hexdigest()) for csv_file, data in chunk]
+            recorded = set(SoilHardnessImportManifest.objects
+                           .filter(sha256__in={sha256 for _, _, sha256 in sources})
+                           .values_list('sha256', 'csvfolder'))
+            for csv_file, data, sha256 in sources:
+                key = (sha256, os.path.basename(os.path.dirname(csv_file)))
+                if key in recorded and key not in yielded:
+                    self.processed_files += 1
+                    self.skipped_files += 1
+                    continue
+                yielded.add(key)
+                yield csv_file, data, sha256
+
+    def _write_parsed_files(self, parsed_files, m_device: dict, options: dict):
+        """
+        解析済みのファイルを N ファイルごとにコミットし、ファイル単位の失敗はセーブポイントで巻き戻す
+        取り込み済みの測定は INSERT する前に PREFLIGHT_CHUNK_SIZE ファイルごとにまとめて照会して除外する
+        """
+        imported_sessions = set()
+        for chunk in chunked(parsed_files, self.PREFLIGHT_CHUNK_SIZE):
+            imported_sessions |= self._find_imported_sessions(chunk, m_device)
+            for batch in chunked(chunk, options['files_per_transaction']):
+                with transaction.atomic():
+                    for parsed_file in batch:
+                        self._import_csv_file(*parsed_file, m_device, options['batch_size'], imported_sessions)
+                    self._update_job_progress()
+
+    def _update_job_progress(self):
+        """
+        コミットと同じトランザクションでジョブの進捗を更新する
+        """
+        if not self.job:
+            return
+        SoilHardnessImportJob.objects.filter(pk=self.job.pk).update(
+            processed_files=self.processed_files,
+            error_files=self.error_files,
+            updated_at=timezone.now(),
+        )
+
+    @staticmethod
+    def _find_imported_sessions(parsed_files: list, m_device: dict) -> set:
+        """
+        解析済みファイルのヘッダ (setdevice, setmemory, setdatetime) のうち、すでにDBにあるものを1クエリで探す
+
+        Returns:
+            set: 取り込み済みの (setdevice_id, setmemory, setdatetime)
+        """
+        sessions = {
+            (m_device[header['setdevice']].pk, header['setmemory'], header['setdatetime'])
+            for _, _, header, _, _, error in parsed_files if not error and header['setdevice'] in m_device
+        }
+        if not sessions:
+            return set()
+
+        imported_sessions = SoilHardnessMeasurement.objects \
+            .filter(setdevice__in={session[0] for session in sessions},
+                    setmemory__in={session[1] for session in sessions},
+                    setdatetime__in={session[2] for session in sessions}) \
+            .values_list('setdevice', 'setmemory', 'setdatetime') \
+            .distinct()
+
+        return sessions & set(imported_sessions)
+
+    def _import_csv_file(self, csv_file: str, sha256: str, header: dict, depths: np.ndarray, pressures: np.ndarray,
+                         error: str, m_device: dict, batch_size: int, imported_sessions: set):
+        """
+        CSVファイル1つ分を bulk_create でまとめて保存し、台帳に記録する
+        失敗したときはそのファイルの行をすべて巻き戻し、SoilHardnessMeasurementImportErrors に記録する
+        """
+        parent_folder = os.path.basename(os.path.dirname(csv_file))
+        self.processed_files += 1
+
+        try:
+            if error:
+                raise ValueError(error)
+            setdevice = m_device[header['setdevice']]
+            session = (setdevice.pk, header['setmemory'], header['setdatetime'])
+            if session in imported_sessions:
+                # 取り込み済みのファイルも台帳に記録して、次からは開かずに読み飛ばす
+                self._report_duplicate(csv_file, parent_folder, sha256)
+                return
+
+            measurements = [
+                SoilHardnessMeasurement(
+                    setdevice=setdevice,
+                    setmemory=header['setmemory'],
+                    setdatetime=header['setdatetime'],
+                    setdepth=header['setdepth'],
+                    setspring=header['setspring'],
+                    setcone=header['setcone'],
+                    depth=depth,
+                    pressure=pressure,
+                    csvfolder=parent_folder,
+                ) for depth, pressure in zip(depths.tolist(), pressures.tolist())
+            ]
+            profile = SoilHardnessProfile(
+                setdevice=setdevice,
+                setmemory=header['setmemory'],
+                setdatetime=header['setdatetime'],
+                setdepth=header['setdepth'],
+                setspring=header['setspring'],
+                setcone=header['setcone'],
+                depths=PackedSeries.pack(depths),
+                pressures=PackedSeries.pack(pressures),
+                row_count=len(measurements),
+                csvfolder=parent_folder,
+            )
+            with transaction.atomic():
+                SoilHardnessMeasurement.objects.bulk_create(measurements, batch_size=batch_size)
+                profile.save()
+                self._record_manifest(csv_file, parent_folder, sha256)
+            imported_sessions.add(session)
+
+        except IntegrityError:
+            # 事前チェックのあとに別の取り込みが同じ測定を保存したときだけここにくる
+            # ドライバのメッセージは DB ごとに違うので、同じ測定が保存されているかを照会しなおして判定する
+            parsed_file = (csv_file, sha256, header, depths, pressures, error)
+            if session not in self._find_imported_sessions([parsed_file], m_device):
+                raise
+            imported_sessions.add(session)
+            self._report_duplicate(csv_file, parent_folder, sha256)
+
+        except Exception as e:
+            self.error_files += 1
+            SoilHardnessMeasurementImportErrors.objects.create(
+                csvfile=os.path.basename(csv_file),
+                csvfolder=parent_folder,
+                message=str(e),
+                job=self.job,
+            )
+            self.stderr.write(self.style.ERROR(
+                f'Error occurred while importing soil hardness measurements '
+                f'from {parent_folder}/{os.path.basename(csv_file)}: {str(e)}'))
+
+    @staticmethod
+    def _record_manifest(csv_file: str, parent_folder: str, sha256: str):
+        """
+        同じ取り込みで同じ中身のCSVが同じフォルダに2つあると、2つめは記録済みなので get_or_create にする
+        """
+        SoilHardnessImportManifest.objects.get_or_create(
+            sha256=sha256,
+            csvfolder=parent_folder,
+            defaults={'csvfile': os.path.basename(csv_file)},
+        )
+
+    def _report_duplicate(self, csv_file: str, parent_folder: str, sha256: str):
+        self._record_manifest(csv_file, parent_folder, sha256)
+        self.error_files += 1
+        SoilHardnessMeasurementImportErrors.objects.create(
+            csvfile=os.path.basename(csv_file),
+            csvfolder=parent_folder,
+            message='取り込み済み',
+            job=self.job,
+        )
+        self.stderr.write(self.style.WARNING(
+            f'Duplicate entry detected: {parent_folder}/{os.path.basename(csv_file)}. '
+            f'Skipping import.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from crm.domain.service.landscoresummaryservice import LandScoreSummaryService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild LandScoreChemicalSummary rows (landledger, metric) from LandScoreChemical rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of summaries per INSERT statement (default: 1000)')
+
+    def handle(self, *args, **options):
+        created = LandScoreSummaryService.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt {created} land score summaries.'))
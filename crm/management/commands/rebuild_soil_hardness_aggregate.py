@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from crm.domain.service.soilhardnessaggregateservice import SoilHardnessAggregateService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild SoilHardnessAggregate rows (landledger, landblock, depth) from associated SoilHardnessProfile rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of aggregates per INSERT statement (default: 1000)')
+
+    def handle(self, *args, **options):
+        created = SoilHardnessAggregateService.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt {created} soil hardness aggregates.'))
@@ -0,0 +1,78 @@
+import os
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from crm.models import SoilHardnessImportJob
+
+
+class Command(BaseCommand):
+    help = 'Run queued soil hardness import jobs (polls the database, no broker needed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait when the queue is empty (default: 2.0)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when the queue is empty instead of polling')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Passed to import_soil_hardness --workers (default: 1)')
+        parser.add_argument('--resume-interrupted', action='store_true',
+                            help='Requeue jobs left running by a stopped worker (only when no other worker is running)')
+
+    def handle(self, *args, **options):
+        if options['resume_interrupted']:
+            # 取り込み済みのCSVは台帳で読み飛ばされるので、最後にコミットしたファイルの続きから再開される
+            resumed = SoilHardnessImportJob.objects \
+                .filter(status=SoilHardnessImportJob.RUNNING) \
+                .update(status=SoilHardnessImportJob.QUEUED, updated_at=timezone.now())
+            self.stdout.write(f'Requeued {resumed} interrupted import jobs.')
+
+        while True:
+            job = self._claim_next_job()
+            if job:
+                self._run(job, options)
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+
+    @staticmethod
+    def _claim_next_job():
+        """
+        待機中のいちばん古いジョブを取り出して running にする
+        複数のワーカーが動いていても同じジョブを取り合わないように行ロックする
+        """
+        with transaction.atomic():
+            job = SoilHardnessImportJob.objects \
+                .select_for_update(skip_locked=True) \
+                .filter(status=SoilHardnessImportJob.QUEUED) \
+                .order_by('pk') \
+                .first()
+            if job:
+                job.status = SoilHardnessImportJob.RUNNING
+                job.updated_at = timezone.now()
+                job.save(update_fields=['status', 'updated_at'])
+
+        return job
+
+    def _run(self, job: SoilHardnessImportJob, options: dict):
+        self.stdout.write(f'Start import job {job.pk}: {job.zip_path}')
+        try:
+            if not os.path.exists(job.zip_path):
+                raise ValueError(f'Zip file does not exist: {job.zip_path}')
+            call_command('import_soil_hardness', job.zip_path, job=job.pk, workers=options['workers'],
+                         stdout=self.stdout, stderr=self.stderr)
+            job.status = SoilHardnessImportJob.DONE
+        except Exception as e:
+            job.status = SoilHardnessImportJob.FAILED
+            job.message = str(e)
+            self.stderr.write(self.style.ERROR(f'Import job {job.pk} failed: {str(e)}'))
+
+        job.updated_at = timezone.now()
+        job.save(update_fields=['status', 'message', 'updated_at'])
+        if os.path.exists(job.zip_path):
+            os.remove(job.zip_path)
+        self.stdout.write(self.style.SUCCESS(f'Finished import job {job.pk}: {job.status}'))
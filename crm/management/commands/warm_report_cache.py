@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from crm.domain.service.reports.reportcache import ChemicalReportCache
+from crm.domain.service.reports.reportlayout1 import ReportLayout1
+from crm.domain.valueobject.graph.graphengines import GRAPH_ENGINES, resolve_graph_engine_name
+from crm.models import LandLedger
+
+
+class Command(BaseCommand):
+    help = 'Render chemical report charts into the report cache ahead of requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--landledger', type=int, nargs='*', help='LandLedger ids (default: all with scores)')
+        parser.add_argument('--engine', choices=list(GRAPH_ENGINES), default=None,
+                            help='Graph engine (default: settings.REPORT_GRAPH_ENGINE)')
+
+    def handle(self, *args, **options):
+        landledgers = LandLedger.objects.filter(landscorechemical__isnull=False).distinct().order_by('pk')
+        if options['landledger']:
+            landledgers = landledgers.filter(pk__in=options['landledger'])
+
+        engine = resolve_graph_engine_name(options['engine'])
+        warmed = 0
+        for landledger in landledgers:
+            if engine == 'matplotlib':
+                # 画面はグラフごとの png の URL を参照する
+                version = ChemicalReportCache.version(landledger)
+                for chart_no in range(1, ReportLayout1.CHART_COUNT + 1):
+                    ChemicalReportCache.get_chart_png(landledger, chart_no, version)
+            else:
+                ChemicalReportCache.get_charts(landledger, engine)
+            warmed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully warmed {warmed} chemical report charts.'))
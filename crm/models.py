@@ -139,11 +139,13 @@ class LandLedger(models.Model):
     """
     採土した日についてまとめる台帳
     採土日, 採土法, 採土者, 分析依頼日, 報告日, 分析機関, 分析番号
+    landscore_changed_at    分析値（LandScoreChemical）を最後に保存、削除した日時（化学レポートのキャッシュのバージョンに使う）
     """
     sampling_date = models.DateField()
     analysis_request_date = models.DateField(null=True)
     reporting_date = models.DateField(null=True)
     analysis_number = models.IntegerField(null=True)
+    landscore_changed_at = models.DateTimeField(null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(null=True)
     analytical_agency = models.ForeignKey(Company, on_delete=models.CASCADE)
@@ -221,6 +223,50 @@ class LandScoreChemical(models.Model):
     landblock = models.ForeignKey(LandBlock, on_delete=models.CASCADE)
     landledger = models.ForeignKey(LandLedger, on_delete=models.CASCADE)
 
+    # 集計の対象にする分析値の列
+    METRICS = (
+        'ec', 'nh4n', 'no3n', 'total_nitrogen', 'nh4_per_nitrogen', 'ph', 'cao', 'mgo', 'k2o', 'base_saturation',
+        'cao_per_mgo', 'mgo_per_k2o', 'phosphorus_absorption', 'p2o5', 'cec', 'humus', 'bulk_density',
+    )
+
+
+class LandScoreChemicalSummary(models.Model):
+    """
+    土壌分析結果 を (台帳, 分析値) ごとに集計したロールアップ（作期をまたいだ推移を見るため）
+    分析値が保存、削除されるたびに、その台帳の分だけを集計しなおす
+    metric          LandScoreChemical.METRICS の列名 e.g. ph
+    count           値がある（NULLでない）エリアの数
+    value_sum_sq    値の2乗の合計（標準偏差を求めるため）
+    """
+    metric = models.CharField(max_length=32)
+    count = models.IntegerField()
+    value_sum = models.FloatField()
+    value_sum_sq = models.FloatField()
+    value_min = models.FloatField()
+    value_max = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(null=True)
+    landledger = models.ForeignKey(LandLedger, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["landledger", "metric"],
+                name="landledger_metric_unique"
+            ),
+        ]
+
+    @property
+    def value_mean(self) -> float:
+        return self.value_sum / self.count
+
+    @property
+    def value_std(self) -> float:
+        """
+        母標準偏差
+        """
+        return max(self.value_sum_sq / self.count - self.value_mean ** 2, 0) ** 0.5
+
 
 class LandReview(models.Model):
     """
@@ -279,9 +325,165 @@ class SoilHardnessMeasurement(models.Model):
         ]
 
 
+class SoilHardnessImportManifest(models.Model):
+    """
+    土壌硬度測定 取り込み済みCSVの台帳
+    同じ中身（SHA-256）のCSVは、同じフォルダから再アップロードされても開かずに読み飛ばす
+    測定がすでにあって取り込み済みと報告したCSVも記録するので、報告は最初の1回だけになる
+    測定データと同じトランザクションで記録するので、中断した取り込みはやり直すだけで続きから再開できる
+    """
+    csvfile = models.CharField(max_length=256)
+    csvfolder = models.CharField(max_length=256)
+    sha256 = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sha256", "csvfolder"],
+                name="sha256_csvfolder_unique"
+            ),
+        ]
+
+
+class SoilHardnessImportJob(models.Model):
+    """
+    土壌硬度測定 取り込みジョブ
+    アップロードされたzipを run_import_worker がバックグラウンドで取り込む
+    zip_path        取り込むzipファイルのパス
+    status          queued: 待機中、running: 取り込み中、done: 完了、failed: 失敗
+    total_files     zipに含まれるCSVファイル数
+    processed_files 処理済み（エラーを含む）のCSVファイル数
+    error_files     エラーになったCSVファイル数
+    message         ジョブ自体が失敗したときのメッセージ
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    FINISHED_STATUSES = (DONE, FAILED)
+
+    zip_path = models.CharField(max_length=256)
+    status = models.CharField(max_length=16, default=QUEUED)
+    total_files = models.IntegerField(default=0)
+    processed_files = models.IntegerField(default=0)
+    error_files = models.IntegerField(default=0)
+    message = models.TextField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"], name="status_id_index"),
+        ]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in self.FINISHED_STATUSES
+
+
+class SoilHardnessProfile(models.Model):
+    """
+    土壌硬度測定 1回の貫入（1セッション）分の深さと圧力をまとめた1レコード
+    SoilHardnessMeasurement は深さごとに1レコード（1回あたり60レコード）になるので、集計や関連付けはこちらを使う
+    depths      深さの配列（int16 の NumPy 配列のバイト列）
+    pressures   圧力の配列（int16 の NumPy 配列のバイト列）
+    compressed  depths, pressures を zlib で圧縮しているか
+    row_count   SoilHardnessMeasurement の行数（関連付け画面の count）
+    associated  圃場ブロックに関連付け済みか（関連付け画面で未関連付けのセッションだけを索引で引くため）
+    """
+    setmemory = models.IntegerField()
+    setdatetime = models.DateTimeField()
+    setdepth = models.IntegerField()
+    setspring = models.IntegerField()
+    setcone = models.IntegerField()
+    depths = models.BinaryField()
+    pressures = models.BinaryField()
+    compressed = models.BooleanField(default=False)
+    row_count = models.IntegerField(default=0)
+    associated = models.BooleanField(default=False)
+    csvfolder = models.CharField(max_length=256)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(null=True)
+    setdevice = models.ForeignKey(Device, on_delete=models.CASCADE)
+    landblock = models.ForeignKey(LandBlock, null=True, on_delete=models.CASCADE)
+    landledger = models.ForeignKey(LandLedger, null=True, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["setdevice", "setmemory", "setdatetime"],
+                name="setdevice_setmemory_setdatetime_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["associated", "setmemory"], name="associated_setmemory_index"),
+            models.Index(fields=["setmemory", "setdatetime"], name="setmemory_setdatetime_index"),
+        ]
+
+    def depth_array(self):
+        """
+        Returns:
+            np.ndarray: 深さの配列（int16）
+        """
+        # NumPy を読み込むので、モデルの import 時ではなく使うときに import する
+        from crm.domain.valueobject.packedseries import PackedSeries
+
+        return PackedSeries.unpack(self.depths, self.compressed)
+
+    def pressure_array(self):
+        """
+        Returns:
+            np.ndarray: 圧力の配列（int16）
+        """
+        from crm.domain.valueobject.packedseries import PackedSeries
+
+        return PackedSeries.unpack(self.pressures, self.compressed)
+
+
+class SoilHardnessAggregate(models.Model):
+    """
+    土壌硬度測定 を (台帳, 圃場ブロック, 深さ) ごとに集計したロールアップ
+    関連付けのたびに、付け替えた貫入（SoilHardnessProfile）の分だけ件数・合計・2乗の合計を足し引きする
+    物理レポートで同じ圃場の作期を比べるときは、測定データではなくこのテーブルを読む
+    pressure_sum_sq     圧力の2乗の合計（標準偏差を求めるため）
+    """
+    depth = models.IntegerField()
+    count = models.IntegerField()
+    pressure_sum = models.BigIntegerField()
+    pressure_sum_sq = models.BigIntegerField()
+    pressure_min = models.IntegerField()
+    pressure_max = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(null=True)
+    landledger = models.ForeignKey(LandLedger, on_delete=models.CASCADE)
+    landblock = models.ForeignKey(LandBlock, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["landledger", "landblock", "depth"],
+                name="landledger_landblock_depth_unique"
+            ),
+        ]
+
+    @property
+    def pressure_mean(self) -> float:
+        return self.pressure_sum / self.count
+
+    @property
+    def pressure_std(self) -> float:
+        """
+        母標準偏差
+        """
+        return max(self.pressure_sum_sq / self.count - self.pressure_mean ** 2, 0) ** 0.5
+
+
 class SoilHardnessMeasurementImportErrors(models.Model):
     """
     土壌硬度測定 生データ 取り込みエラーリスト
+    job はバックグラウンドで取り込んだときのジョブ（コマンドを直接実行したときは null）
     """
     csvfile = models.CharField(max_length=256)
     csvfolder = models.CharField(max_length=256)
@@ -289,6 +491,7 @@ class SoilHardnessMeasurementImportErrors(models.Model):
     remark = models.TextField(null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(null=True)
+    job = models.ForeignKey(SoilHardnessImportJob, null=True, on_delete=models.CASCADE)
 
 
 class RouteSuggestImport(models.Model):
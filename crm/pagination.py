@@ -0,0 +1,142 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+
+
+class KeysetPage:
+    """
+    KeysetPaginator の1ページ（テンプレートでは page_obj として使う）
+    """
+    def __init__(self, object_list: list, next_cursor: str = None, previous_cursor: str = None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    OFFSET を使わずに、前のページの最後の行のキーより後ろを読むキーセット（シーク）方式のページ分割
+    何ページ目でもインデックスをたどって per_page + 1 件読むだけなので、1ページ目と同じコストになる
+    カーソルはキーの値を JSON にして URL に載せられるように base64 にしたもの
+    """
+    def __init__(self, queryset: QuerySet, fields: tuple, per_page: int):
+        """
+        Args:
+            queryset: ページ分割する QuerySet（並びは fields の昇順に置き換える）
+            fields: 並べるキー（すべてで一意になるように、最後は pk にする）
+            per_page: 1ページの件数
+        """
+        self._queryset = queryset
+        self._fields = fields
+        self._per_page = per_page
+
+    def _encode(self, obj) -> str:
+        values = [getattr(obj, field) for field in self._fields]
+        data = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def _decode(self, cursor: str) -> list:
+        """
+        Raises:
+            ValueError: カーソルが壊れているとき
+        """
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ValueError('invalid cursor') from e
+        if not isinstance(values, list) or len(values) != len(self._fields):
+            raise ValueError('invalid cursor')
+
+        opts = self._queryset.model._meta
+        try:
+            return [(opts.pk if field == 'pk' else opts.get_field(field)).to_python(value)
+                    for field, value in zip(self._fields, values)]
+        except ValidationError as e:
+            raise ValueError('invalid cursor') from e
+
+    def _seek(self, values: list, lookup: str) -> Q:
+        """
+        (a, b, c) > (x, y, z) を a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z) にする
+        """
+        condition = Q()
+        for i, field in enumerate(self._fields):
+            equal = {self._fields[j]: values[j] for j in range(i)}
+            condition |= Q(**equal, **{f'{field}__{lookup}': values[i]})
+        return condition
+
+    def page(self, after: str = None, before: str = None) -> KeysetPage:
+        """
+        Args:
+            after: このカーソルより後ろのページ（次へ）
+            before: このカーソルより前のページ（前へ）。壊れたカーソルのときは1ページ目にする
+
+        Returns:
+            KeysetPage: ページ
+        """
+        try:
+            after = self._decode(after) if after else None
+            before = self._decode(before) if before else None
+        except ValueError:
+            after = before = None
+
+        if before is not None:
+            rows = list(self._queryset
+                        .filter(self._seek(before, 'lt'))
+                        .order_by(*[f'-{field}' for field in self._fields])[:self._per_page + 1])
+            has_previous = len(rows) > self._per_page
+            rows = rows[:self._per_page][::-1]
+            has_next = True
+        else:
+            queryset = self._queryset.filter(self._seek(after, 'gt')) if after is not None else self._queryset
+            rows = list(queryset.order_by(*self._fields)[:self._per_page + 1])
+            has_next = len(rows) > self._per_page
+            rows = rows[:self._per_page]
+            has_previous = after is not None
+
+        return KeysetPage(
+            rows,
+            next_cursor=self._encode(rows[-1]) if rows and has_next else None,
+            previous_cursor=self._encode(rows[0]) if rows and has_previous else None,
+        )
+
+
+class KeysetPaginationMixin:
+    """
+    ListView を KeysetPaginator でページ分割する（?after=<カーソル>, ?before=<カーソル>）
+    テンプレートでは page_obj.next_cursor, page_obj.previous_cursor でページを移る（crm/pagination.html）
+    カーソル以外のクエリパラメータ（絞り込みなど）は pagination_query としてページのリンクに引き継ぐ
+    """
+    paginate_by = 20
+    keyset_fields = ('pk',)
+
+    def paginate_queryset(self, queryset, page_size):
+        page = KeysetPaginator(queryset, self.keyset_fields, page_size) \
+            .page(self.request.GET.get('after'), self.request.GET.get('before'))
+        return None, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        params = self.request.GET.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        context['pagination_query'] = f'{params.urlencode()}&' if params else ''
+        return context
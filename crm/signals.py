@@ -0,0 +1,28 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from crm.domain.service.landscoresummaryservice import LandScoreSummaryService
+from crm.domain.service.reports.reportcache import ChemicalReportCache
+from crm.models import LandScoreChemical
+
+
+@receiver([post_save, post_delete], sender=LandScoreChemical)
+def invalidate_chemical_report(sender, instance, **kwargs):
+    """
+    分析値が保存、削除されたら、その台帳の化学レポートのキャッシュを使われなくする
+    loaddata（raw）のときは件数と pk でバージョンが変わるので何もしない
+    """
+    if kwargs.get('raw'):
+        return
+    ChemicalReportCache.invalidate(instance.landledger_id)
+
+
+@receiver([post_save, post_delete], sender=LandScoreChemical)
+def refresh_chemical_summary(sender, instance, **kwargs):
+    """
+    分析値が保存、削除されたら、その台帳の集計を作りなおす
+    loaddata（raw）のときは何もしないので、読み込んだあとに rebuild_land_score_summary を実行する
+    """
+    if kwargs.get('raw'):
+        return
+    LandScoreSummaryService.refresh([instance.landledger_id])
@@ -0,0 +1,90 @@
+/**
+ * ChartJson エンジンが返す {title, labels, values} を canvas に横棒グラフで描く
+ * 外部のライブラリに頼らないように、化学レポートに必要な分だけを実装している
+ *
+ * <canvas class="barchart" data-chart-id="chart1"></canvas> に json_script の id を data-chart-id で渡す
+ */
+(function () {
+    const BAR_COLOR = '#1f77b4';
+    const FONT = '12px sans-serif';
+    const TITLE_FONT = 'bold 14px sans-serif';
+
+    const PLACEHOLDER = 'グラフを表示できませんでした（しばらくしてから再読み込みしてください）';
+
+    function prepareCanvas(canvas) {
+        const ratio = window.devicePixelRatio || 1;
+        const width = canvas.clientWidth || 500;
+        const height = canvas.clientHeight || 200;
+        canvas.width = width * ratio;
+        canvas.height = height * ratio;
+
+        const ctx = canvas.getContext('2d');
+        ctx.scale(ratio, ratio);
+        ctx.clearRect(0, 0, width, height);
+        return {ctx, width, height};
+    }
+
+    /**
+     * 描けなかったグラフ（null など）は、ほかのグラフを止めないように代わりの文言だけを描く
+     */
+    function drawPlaceholder(canvas) {
+        const {ctx, width, height} = prepareCanvas(canvas);
+        ctx.font = FONT;
+        ctx.fillStyle = '#6c757d';
+        ctx.textAlign = 'center';
+        ctx.textBaseline = 'middle';
+        ctx.fillText(PLACEHOLDER, width / 2, height / 2);
+    }
+
+    function isChart(chart) {
+        return chart !== null && typeof chart === 'object'
+            && Array.isArray(chart.labels) && Array.isArray(chart.values);
+    }
+
+    function drawBarChart(canvas, chart) {
+        const {ctx, width, height} = prepareCanvas(canvas);
+
+        ctx.font = TITLE_FONT;
+        ctx.fillStyle = '#000';
+        ctx.textAlign = 'center';
+        ctx.textBaseline = 'top';
+        ctx.fillText(chart.title || '', width / 2, 4);
+
+        ctx.font = FONT;
+        const labelWidth = Math.max(...chart.labels.map(label => ctx.measureText(label).width), 0) + 8;
+        const values = chart.values.map(value => value || 0);
+        const maxValue = Math.max(...values, 0) || 1;
+        const top = 28;
+        const left = labelWidth;
+        const right = width - 48;
+        const rowHeight = (height - top - 4) / Math.max(values.length, 1);
+
+        values.forEach((value, i) => {
+            const y = top + i * rowHeight;
+            const barWidth = (right - left) * value / maxValue;
+            ctx.fillStyle = BAR_COLOR;
+            ctx.fillRect(left, y + rowHeight * 0.15, barWidth, rowHeight * 0.7);
+
+            ctx.fillStyle = '#000';
+            ctx.textBaseline = 'middle';
+            ctx.textAlign = 'right';
+            ctx.fillText(chart.labels[i], left - 4, y + rowHeight / 2);
+            if (chart.values[i] !== null) {
+                ctx.textAlign = 'left';
+                ctx.fillText(Number(value.toFixed(2)).toString(), left + barWidth + 4, y + rowHeight / 2);
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('canvas.barchart').forEach(function (canvas) {
+            const data = document.getElementById(canvas.dataset.chartId);
+            const chart = data ? JSON.parse(data.textContent) : null;
+            if (isChart(chart)) {
+                drawBarChart(canvas, chart);
+            } else {
+                drawPlaceholder(canvas);
+            }
+        });
+    });
+})();
@@ -0,0 +1,72 @@
+import os
+import time
+from datetime import date
+
+import numpy as np
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from crm.domain.service.chemicaldashboardservice import ChemicalDashboardService
+from crm.models import Land, LandLedger, LandScoreChemical, LandScoreChemicalSummary
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES
+
+BENCHMARK_LEDGERS = int(os.environ.get('BENCHMARK_LEDGERS', 5000))
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-dashboard'},
+})
+class BenchChemicalDashboard(TestCase):
+    """
+    法人の台帳が BENCHMARK_LEDGERS 件あるときの、ダッシュボードの集計と画面の応答時間を計測する
+    python manage.py test crm.tests.benchmarks --pattern="bench_*.py"
+    """
+    fixtures = FIXTURES
+
+    def setUp(self):
+        caches['reports'].clear()
+        template = LandLedger.objects.select_related('land').get(pk=1)
+        lands = Land.objects.bulk_create([
+            Land(name=f'圃場{i}', prefecture='茨城県', location='結城郡八千代町', company_id=1,
+                 cultivation_type_id=template.land.cultivation_type_id, owner_id=template.land.owner_id)
+            for i in range(BENCHMARK_LEDGERS)
+        ], batch_size=1000)
+        LandLedger.objects.bulk_create([
+            LandLedger(sampling_date=date(2000 + i % 20, 1 + i % 12, 1), land=land,
+                       analytical_agency_id=template.analytical_agency_id, crop_id=template.crop_id,
+                       landperiod_id=template.landperiod_id, sampling_method_id=template.sampling_method_id,
+                       sampling_staff_id=template.sampling_staff_id)
+            for i, land in enumerate(lands)
+        ], batch_size=1000)
+        rng = np.random.default_rng(0)
+        LandScoreChemicalSummary.objects.bulk_create([
+            LandScoreChemicalSummary(landledger_id=landledger_id, metric=metric, count=5,
+                                     value_sum=value * 5, value_sum_sq=value * value * 5, value_min=value,
+                                     value_max=value)
+            for landledger_id in LandLedger.objects.values_list('pk', flat=True)
+            for metric, value in zip(LandScoreChemical.METRICS, rng.lognormal(size=len(LandScoreChemical.METRICS)))
+        ], batch_size=1000)
+
+    def test_load(self):
+        service = ChemicalDashboardService('company', 1)
+        start = time.perf_counter()
+        service.load()
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        service.load()
+        warm = time.perf_counter() - start
+        print(f'\n{BENCHMARK_LEDGERS} ledgers: dashboard load {cold * 1000:,.0f} ms, cached {warm * 1000:,.1f} ms')
+
+    def test_view(self):
+        url = reverse('crm:chemical_dashboard', kwargs={'company_id': 1})
+        elapsed = []
+        for _ in range(3):
+            start = time.perf_counter()
+            response = self.client.get(url, {'metric': list(LandScoreChemical.METRICS)})
+            elapsed.append(time.perf_counter() - start)
+            self.assertEqual(200, response.status_code)
+        print(f'\n{BENCHMARK_LEDGERS} ledgers, 17 metrics: first page {elapsed[0] * 1000:,.0f} ms, '
+              f'cached {min(elapsed[1:]) * 1000:,.0f} ms')
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+from typing import Callable
+
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from crm.domain.service.soilhardnesscsvgenerator import SoilHardnessCsvGenerator
+from crm.management.commands.import_soil_hardness import iter_csv_sources, parse_csv_file
+from crm.models import Device, SoilHardnessMeasurement, SoilHardnessProfile, SoilHardnessImportManifest, \
+    SoilHardnessImportJob
+from crm.tests.domain.service.test_zipfileservice import Cp932ZipInfo
+
+BENCHMARK_FILES = int(os.environ.get('BENCHMARK_FILES', 200))
+
+
+def measure(func: Callable) -> tuple:
+    """
+    Returns:
+        tuple: 経過秒数とピークメモリ（MiB）
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+class BenchImportSoilHardness(TransactionTestCase):
+    """
+    import_soil_hardness と SoilhardnessUploadView の取り込み速度（files/sec, rows/sec, ピークメモリ）を計測する
+    通常のテストには含めないので、以下のように明示的に実行する
+    python manage.py test crm.tests.benchmarks --pattern="bench_*.py"
+    """
+    def setUp(self):
+        Device.objects.create(name='DIK-5531')
+        self.work_path = tempfile.mkdtemp()
+        self.folder_path = os.path.join(self.work_path, 'csv')
+        self.zip_path = os.path.join(self.work_path, 'uploaded.zip')
+        generator = SoilHardnessCsvGenerator(seed=0)
+        generator.write_folder(BENCHMARK_FILES, self.folder_path)
+        # Windows で作ったzipと同じく cp932 のメンバー名にして、文字化け対応も計測に含める
+        generator.write_zip(BENCHMARK_FILES, self.zip_path, zipinfo_class=Cp932ZipInfo)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_path)
+
+    def _reset(self):
+        SoilHardnessMeasurement.objects.all().delete()
+        SoilHardnessProfile.objects.all().delete()
+        SoilHardnessImportManifest.objects.all().delete()
+
+    def _report(self, label: str, elapsed: float, peak: float):
+        rows = SoilHardnessMeasurement.objects.count()
+        self.assertEqual(BENCHMARK_FILES * 60, rows)
+        print(f'\n{BENCHMARK_FILES} files, {label}: '
+              f'{BENCHMARK_FILES / elapsed:,.0f} files/sec, {rows / elapsed:,.0f} rows/sec, peak {peak:,.1f} MiB')
+
+    def _import(self, path: str, label: str, **options):
+        self._reset()
+        elapsed, peak = measure(lambda: call_command(
+            'import_soil_hardness', path, stdout=StringIO(), stderr=StringIO(), **options))
+        self._report(label, elapsed, peak)
+
+    def test_import_folder(self):
+        # 1行ずつ INSERT していた従来の取り込みに相当
+        self._import(self.folder_path, 'row-by-row', batch_size=1)
+        self._import(self.folder_path, 'bulk_create', batch_size=500)
+        self._import(self.folder_path, 'bulk_create + 50 files/transaction', batch_size=500,
+                     files_per_transaction=50)
+        self._import(self.folder_path, f'+ {os.cpu_count()} workers', batch_size=500, files_per_transaction=50,
+                     workers=os.cpu_count())
+
+    def test_import_zip(self):
+        self._import(self.zip_path, 'zip', batch_size=500, files_per_transaction=50)
+
+    def test_upload_view(self):
+        """
+        アップロード（保存とジョブ登録）から run_import_worker が取り込み終えるまで
+        """
+        self._reset()
+
+        def upload_and_import():
+            with open(self.zip_path, 'rb') as f:
+                response = self.client.post(reverse('crm:soilhardness_upload'), {'file': f})
+            self.assertEqual(302, response.status_code)
+            call_command('run_import_worker', once=True, stdout=StringIO(), stderr=StringIO())
+
+        with override_settings(MEDIA_ROOT=self.work_path):
+            elapsed, peak = measure(upload_and_import)
+        self.assertEqual(SoilHardnessImportJob.DONE, SoilHardnessImportJob.objects.get().status)
+        self._report('upload view + run_import_worker', elapsed, peak)
+
+    def test_reimport_files_per_sec(self):
+        self._import(self.folder_path, 'first import')
+        elapsed, peak = measure(lambda: call_command(
+            'import_soil_hardness', self.folder_path, stdout=StringIO(), stderr=StringIO()))
+        print(f'\n{BENCHMARK_FILES} files, re-import of imported files: '
+              f'{BENCHMARK_FILES / elapsed:,.0f} files/sec, peak {peak:,.1f} MiB')
+
+    def test_parse_rows_per_sec(self):
+        sources = [(csv_file, data, '') for csv_file, data in iter_csv_sources(self.folder_path)]
+        start = time.perf_counter()
+        rows = sum(len(parsed[3]) for parsed in map(parse_csv_file, sources))
+        elapsed = time.perf_counter() - start
+        print(f'\n{BENCHMARK_FILES} files: parse only {rows / elapsed:,.0f} rows/sec')
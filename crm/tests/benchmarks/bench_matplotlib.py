@@ -0,0 +1,45 @@
+import os
+import time
+from unittest import TestCase, skipIf
+
+from crm.domain.valueobject.graph.matplotlib import Matplotlib
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCHMARK_RENDERS = int(os.environ.get('BENCHMARK_RENDERS', 10000))
+
+
+def max_rss_mib() -> float:
+    """
+    Returns:
+        float: プロセスの最大 RSS（Linux の ru_maxrss は KiB）
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@skipIf(resource is None, 'resource module is not available')
+class BenchMatplotlib(TestCase):
+    """
+    Matplotlib エンジンの描画速度（charts/sec）と、描きつづけたときの RSS の増え方を計測する
+    python manage.py test crm.tests.benchmarks --pattern="bench_*.py"
+    """
+    def test_charts_per_sec(self):
+        g = Matplotlib()
+        x = ['EC(mS/cm)', 'NH4-N(mg/100g)', 'NO3-N(mg/100g)', '無機態窒素', 'NH4/無機態窒素', ' ', '  ']
+        y = [0.3, 1.2, 4.5, 5.7, 0.2, 0, 0]
+        # フォントの読み込みなど初回だけの処理を除く
+        for _ in range(10):
+            g.plot_graph("窒素関連", x, y)
+
+        rss_before = max_rss_mib()
+        start = time.perf_counter()
+        for _ in range(BENCHMARK_RENDERS):
+            g.plot_graph("窒素関連", x, y)
+        elapsed = time.perf_counter() - start
+        rss_after = max_rss_mib()
+
+        print(f'\n{BENCHMARK_RENDERS} renders: {BENCHMARK_RENDERS / elapsed:,.1f} charts/sec, '
+              f'max RSS {rss_before:,.1f} -> {rss_after:,.1f} MiB (+{rss_after - rss_before:,.1f} MiB)')
@@ -0,0 +1,50 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from unittest import TestCase
+
+from django.conf import settings
+
+BENCHMARK_STARTS = int(os.environ.get('BENCHMARK_STARTS', 5))
+MANAGE_PY = os.path.join(settings.BASE_DIR, 'manage.py')
+# import time: self [us] | cumulative | imported package
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def run(*args) -> subprocess.CompletedProcess:
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE, 'PYTHONPATH': os.pathsep.join(sys.path)}
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)
+
+
+class BenchStartup(TestCase):
+    """
+    ワーカーやコマンドの起動時間（manage.py check）と、そのときに読み込んでいるパッケージの import 時間を計測する
+    python manage.py test crm.tests.benchmarks --pattern="bench_*.py"
+    """
+    def test_manage_py_check(self):
+        elapsed = []
+        for _ in range(BENCHMARK_STARTS):
+            start = time.perf_counter()
+            run(MANAGE_PY, 'check')
+            elapsed.append(time.perf_counter() - start)
+        print(f'\nmanage.py check: median {statistics.median(elapsed) * 1000:,.0f} ms '
+              f'(min {min(elapsed) * 1000:,.0f} ms, {BENCHMARK_STARTS} runs)')
+
+    def test_import_time(self):
+        stderr = run('-X', 'importtime', MANAGE_PY, 'check').stderr
+        packages = {}
+        for line in stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            # インデントのないものが、そのパッケージを最初に読み込んだときの合計
+            if match and len(match.group(3)) == 1:
+                packages[match.group(4)] = int(match.group(2))
+
+        total = sum(packages.values())
+        print(f'\nmanage.py check imports: {total / 1000:,.0f} ms')
+        for package, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:10]:
+            print(f'  {package:<40} {cumulative / 1000:8,.1f} ms')
+        for package in ('matplotlib', 'numpy', 'fastkml', 'lxml', 'exifread', 'haversine'):
+            self.assertNotIn(package, packages)
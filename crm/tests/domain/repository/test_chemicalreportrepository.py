@@ -0,0 +1,30 @@
+from django.test import TestCase
+
+from crm.domain.repository.chemicalreportrepository import ChemicalReportRepository
+from crm.models import LandLedger, LandScoreChemical
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES
+
+
+class TestChemicalReportRepository(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def test_read_landledger(self):
+        repository = ChemicalReportRepository(1)
+
+        with self.assertNumQueries(1):
+            landledger = repository.read_landledger()
+            _ = (landledger.land.name, landledger.crop.name, landledger.landperiod.name,
+                 landledger.sampling_method.name, landledger.sampling_staff.username, landledger.analytical_agency.name)
+
+    def test_read_landledger_not_found(self):
+        with self.assertRaises(LandLedger.DoesNotExist):
+            ChemicalReportRepository(999).read_landledger()
+
+    def test_read_landscores(self):
+        repository = ChemicalReportRepository(1)
+
+        with self.assertNumQueries(1):
+            landscores = repository.read_landscores()
+            names = [landscore.landblock.name for landscore in landscores]
+
+        self.assertEqual(LandScoreChemical.objects.filter(landledger_id=1).count(), len(names))
@@ -0,0 +1,55 @@
+from django.test import TestCase
+
+from crm.domain.repository.landrepository import LandRepository
+from crm.models import Company, Land, LandLedger
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES
+
+
+def add_lands(company: Company, count: int):
+    """
+    台帳を1つずつ持つ圃場を count 件追加する
+    """
+    template = LandLedger.objects.select_related('land').get(pk=1)
+    lands = Land.objects.bulk_create([
+        Land(name=f'追加の圃場{i}', prefecture='茨城県', location='結城郡八千代町', company=company,
+             cultivation_type_id=template.land.cultivation_type_id, owner_id=template.land.owner_id)
+        for i in range(count)
+    ])
+    LandLedger.objects.bulk_create([
+        LandLedger(sampling_date=template.sampling_date, land=land, analytical_agency_id=template.analytical_agency_id,
+                   crop_id=template.crop_id, landperiod_id=template.landperiod_id,
+                   sampling_method_id=template.sampling_method_id, sampling_staff_id=template.sampling_staff_id)
+        for land in lands
+    ])
+
+
+class TestLandRepository(TestCase):
+    fixtures = FIXTURES
+
+    def setUp(self):
+        self.company = Company.objects.get(pk=1)
+
+    def _read_all(self) -> dict:
+        repository = LandRepository(self.company)
+        land_ledger_map = repository.read_landledger_map(repository.read_lands())
+        for land, landledgers in land_ledger_map.items():
+            _ = (land.company.name, land.owner.username, land.cultivation_type.name)
+            _ = [landledger.landperiod.name for landledger in landledgers]
+        return land_ledger_map
+
+    def test_read_lands(self):
+        with self.assertNumQueries(2):
+            land_ledger_map = self._read_all()
+
+        self.assertEqual(list(Land.objects.filter(company=self.company).order_by('pk')), list(land_ledger_map))
+        land = Land.objects.get(pk=1)
+        self.assertEqual(list(LandRepository(self.company).read_landledgers(land).order_by('pk')),
+                         land_ledger_map[land])
+
+    def test_read_lands_constant_queries(self):
+        add_lands(self.company, 50)
+
+        with self.assertNumQueries(2):
+            land_ledger_map = self._read_all()
+
+        self.assertEqual(Land.objects.filter(company=self.company).count(), len(land_ledger_map))
@@ -0,0 +1,103 @@
+import os
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from crm.domain.service.reports.basereportlayout import BaseReportLayout, get_chart_executor, \
+    shutdown_chart_executor
+from crm.domain.valueobject.graph.basegraphengine import BaseGraphEngine
+
+
+class PidEngine(BaseGraphEngine):
+    """描いたプロセスの pid を返す（プロセスプールで pickle できるようにモジュールに置く）"""
+    parallel = True
+
+    def plot_graph(self, title, x, y):
+        if title == 'error':
+            raise ValueError(title)
+        if title == 'slow':
+            time.sleep(5)
+        return os.getpid()
+
+    def plot_profile(self, title, depths, series):
+        return os.getpid()
+
+    def plot_trend(self, title, labels, mean, low, high):
+        return os.getpid()
+
+
+class Layout(BaseReportLayout):
+    CHART_FALLBACK = 'fallback'
+
+    def __init__(self, titles):
+        self._titles = titles
+
+    def publish(self, *args):
+        return self._render_charts(PidEngine(), {
+            f'chart{i}': ('plot_graph', (title, [], [])) for i, title in enumerate(self._titles, start=1)
+        })
+
+
+class TestBaseReportLayout(SimpleTestCase):
+    def tearDown(self):
+        shutdown_chart_executor()
+
+    @override_settings(REPORT_CHART_WORKERS=0)
+    def test_render_in_process(self):
+        self.assertIsNone(get_chart_executor())
+        self.assertEqual({'chart1': os.getpid(), 'chart2': os.getpid()}, Layout(['a', 'b']).publish())
+
+    @override_settings(REPORT_CHART_WORKERS=0)
+    def test_render_in_process_fallback(self):
+        with self.assertLogs('crm.domain.service.reports.basereportlayout', 'ERROR'):
+            charts = Layout(['a', 'error']).publish()
+
+        self.assertEqual(os.getpid(), charts['chart1'])
+        self.assertEqual('fallback', charts['chart2'])
+
+    @override_settings(REPORT_CHART_WORKERS=2)
+    def test_render_in_pool(self):
+        charts = Layout(['a', 'b', 'c', 'd']).publish()
+
+        self.assertEqual(['chart1', 'chart2', 'chart3', 'chart4'], list(charts))
+        self.assertNotIn(os.getpid(), charts.values())
+        # プロセスは使いまわす
+        self.assertIs(get_chart_executor(), get_chart_executor())
+        self.assertLessEqual(len(set(Layout(['a', 'b']).publish().values()) | set(charts.values())), 2)
+
+    @override_settings(REPORT_CHART_WORKERS=2)
+    def test_render_in_pool_fallback(self):
+        with self.assertLogs('crm.domain.service.reports.basereportlayout', 'ERROR'):
+            charts = Layout(['a', 'error']).publish()
+
+        self.assertIsInstance(charts['chart1'], int)
+        self.assertEqual('fallback', charts['chart2'])
+
+    @override_settings(REPORT_CHART_WORKERS=2)
+    def test_render_in_pool_timeout(self):
+        layout = Layout(['a', 'slow'])
+        layout.CHART_TIMEOUT = 1
+        start = time.monotonic()
+        with self.assertLogs('crm.domain.service.reports.basereportlayout', 'ERROR'):
+            charts = layout.publish()
+
+        self.assertLess(time.monotonic() - start, 4)
+        self.assertIsInstance(charts['chart1'], int)
+        self.assertEqual('fallback', charts['chart2'])
+
+    @override_settings(REPORT_CHART_WORKERS=2)
+    def test_render_after_timeout(self):
+        executor = get_chart_executor()
+        layout = Layout(['slow', 'slow'])
+        layout.CHART_TIMEOUT = 1
+        with self.assertLogs('crm.domain.service.reports.basereportlayout', 'ERROR'):
+            layout.publish()
+
+        # 時間切れのグラフがワーカーを2つとも使っていても、次のレポートは新しいプールで描ける
+        self.assertIsNot(executor, get_chart_executor())
+        # 古いプールのワーカーはあと4秒ほど空かないので、入れ替えていなければ時間切れになる
+        layout = Layout(['a', 'b'])
+        layout.CHART_TIMEOUT = 3
+        charts = layout.publish()
+        self.assertIsInstance(charts['chart1'], int)
+        self.assertIsInstance(charts['chart2'], int)
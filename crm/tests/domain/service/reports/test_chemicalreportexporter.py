@@ -0,0 +1,79 @@
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from crm.domain.service.reports.chemicalreportexporter import ChemicalReportExporter
+from crm.domain.valueobject.graph.matplotlib import Matplotlib
+from crm.models import LandLedger, LandScoreChemical
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES
+
+
+def export(exporter: ChemicalReportExporter) -> zipfile.ZipFile:
+    return zipfile.ZipFile(BytesIO(b''.join(exporter.iter_zip())))
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-export-reports'},
+})
+@mock.patch.object(Matplotlib, 'plot_graph', return_value='cG5n')
+class TestChemicalReportExporter(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def setUp(self):
+        caches['reports'].clear()
+
+    def test_iter_zip(self, plot_graph):
+        exporter = ChemicalReportExporter(LandLedger.objects.all(), window=2)
+
+        with export(exporter) as zf:
+            names = zf.namelist()
+            folder = ChemicalReportExporter.folder_name(LandLedger.objects.get(pk=1))
+            html = zf.read(f'{folder}/report.html').decode('utf-8')
+            png = zf.read(f'{folder}/chart3.png')
+            self.assertIsNone(zf.testzip())
+
+        self.assertEqual(5, exporter.count)
+        self.assertEqual(5 * 5, len(names))
+        self.assertEqual(b'png', png)
+        self.assertIn('<img src="chart1.png"', html)
+        for landscore in LandScoreChemical.objects.filter(landledger_id=1).select_related('landblock'):
+            self.assertIn(f'<td class="label">{landscore.landblock.name}</td>', html)
+        self.assertEqual(5 * 4, plot_graph.call_count)
+
+    def test_iter_zip_queries(self, plot_graph):
+        # 台帳、分析結果、講評をそれぞれ1回で読む
+        with self.assertNumQueries(3):
+            export(ChemicalReportExporter(LandLedger.objects.all()))
+
+    def test_iter_zip_cached(self, plot_graph):
+        export(ChemicalReportExporter(LandLedger.objects.filter(pk=1)))
+        export(ChemicalReportExporter(LandLedger.objects.filter(pk=1)))
+
+        self.assertEqual(4, plot_graph.call_count)
+
+    def test_iter_zip_executor(self, plot_graph):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            with export(ChemicalReportExporter(LandLedger.objects.all(), executor, window=3)) as zf:
+                names = zf.namelist()
+
+        self.assertEqual(5 * 5, len(names))
+        # 台帳の pk 順に並ぶ
+        self.assertEqual(
+            [ChemicalReportExporter.folder_name(landledger) for landledger in LandLedger.objects.order_by('pk')],
+            [name.rsplit('/', 1)[0] for name in names if name.endswith('report.html')])
+
+    def test_iter_zip_failed_chart(self, plot_graph):
+        plot_graph.side_effect = ['cG5n', ValueError('failed'), 'cG5n', 'cG5n']
+
+        with self.assertLogs('crm.domain.service.reports.chemicalreportexporter', 'ERROR'):
+            with export(ChemicalReportExporter(LandLedger.objects.filter(pk=1))) as zf:
+                names = zf.namelist()
+                html = zf.read(names[0]).decode('utf-8')
+
+        self.assertEqual(4, len(names))
+        self.assertEqual(3, html.count('<img '))
@@ -0,0 +1,86 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from crm.domain.service.reports.reportcache import ChemicalReportCache
+from crm.domain.service.reports.reportlayout1 import ReportLayout1
+from crm.models import LandLedger, LandScoreChemical
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-reports'},
+})
+@mock.patch.object(ReportLayout1, 'publish', side_effect=lambda: {'chart1': 'png'})
+class TestChemicalReportCache(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def setUp(self):
+        caches['reports'].clear()
+        self.landledger = LandLedger.objects.get(pk=1)
+
+    def test_get_charts(self, publish):
+        self.assertEqual({'chart1': 'png'}, ChemicalReportCache.get_charts(self.landledger))
+        self.assertEqual({'chart1': 'png'}, ChemicalReportCache.get_charts(self.landledger))
+
+        self.assertEqual(1, publish.call_count)
+
+    def test_get_charts_after_save(self, publish):
+        ChemicalReportCache.get_charts(self.landledger)
+        landscore = LandScoreChemical.objects.filter(landledger=self.landledger).first()
+        landscore.ph = 6.5
+        landscore.save()
+        ChemicalReportCache.get_charts(self.landledger)
+
+        self.assertEqual(2, publish.call_count)
+
+    def test_get_charts_after_delete(self, publish):
+        ChemicalReportCache.get_charts(self.landledger)
+        LandScoreChemical.objects.filter(landledger=self.landledger).first().delete()
+        ChemicalReportCache.get_charts(self.landledger)
+
+        self.assertEqual(2, publish.call_count)
+
+    def test_version_survives_cache_eviction(self, publish):
+        version = ChemicalReportCache.version(self.landledger)
+        landscore = LandScoreChemical.objects.filter(landledger=self.landledger).first()
+        landscore.ph = 6.5
+        landscore.save()
+        # 変更を知らせる日時はキャッシュではなく台帳に残るので、キャッシュのエントリが消えても元のバージョンに戻らない
+        caches['reports'].clear()
+
+        self.assertIsNotNone(LandLedger.objects.get(pk=1).landscore_changed_at)
+        self.assertNotEqual(version, ChemicalReportCache.version(self.landledger))
+        landscores = list(LandScoreChemical.objects.filter(landledger=self.landledger))
+        self.assertEqual(ChemicalReportCache.version(self.landledger),
+                         ChemicalReportCache.version(LandLedger.objects.get(pk=1), landscores))
+
+    def test_version_without_landscores(self, publish):
+        # 分析結果をすべて消した台帳（landscore_changed_at だけが残る）は、読み込み済みの分析結果から求めても
+        # DB から求めても同じバージョンにする
+        LandScoreChemical.objects.filter(landledger=self.landledger).delete()
+        landledger = LandLedger.objects.get(pk=1)
+        self.assertIsNotNone(landledger.landscore_changed_at)
+        self.assertEqual(ChemicalReportCache.state(landledger), ChemicalReportCache.state(landledger, []))
+
+        # 一度も分析結果を登録していない台帳も同じ
+        LandLedger.objects.filter(pk=1).update(landscore_changed_at=None)
+        landledger = LandLedger.objects.get(pk=1)
+        self.assertEqual(ChemicalReportCache.state(landledger), ChemicalReportCache.state(landledger, []))
+
+    def test_get_charts_other_landledger_is_kept(self, publish):
+        ChemicalReportCache.get_charts(self.landledger)
+        ChemicalReportCache.invalidate(2)
+        ChemicalReportCache.get_charts(self.landledger)
+
+        self.assertEqual(1, publish.call_count)
+
+    def test_get_charts_per_engine(self, publish):
+        ChemicalReportCache.get_charts(self.landledger, 'matplotlib')
+        charts = ChemicalReportCache.get_charts(self.landledger, 'json')
+        ChemicalReportCache.get_charts(self.landledger, 'json')
+
+        self.assertEqual({'chart1': 'png'}, charts)
+        self.assertEqual(2, publish.call_count)
@@ -0,0 +1,42 @@
+from django.db.models import Avg
+from django.test import TestCase
+
+from crm.domain.repository.chemicalreportrepository import ChemicalReportRepository
+from crm.domain.service.reports.reportlayout1 import ReportLayout1
+from crm.domain.valueobject.graph.chartjson import ChartJson
+from crm.models import LandLedger, LandScoreChemical
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES
+
+
+class TestReportLayout1(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def test_publish_json(self):
+        charts = ReportLayout1(LandLedger.objects.get(pk=1), ChartJson()).publish()
+
+        self.assertEqual(['chart1', 'chart2', 'chart3', 'chart4'], list(charts))
+        self.assertEqual("窒素関連（1圃場の全エリア平均）", charts['chart1']['title'])
+        self.assertEqual(7, len(charts['chart2']['values']))
+        self.assertIsInstance(charts['chart2']['values'][0], float)
+
+    def test_averages_match_database(self):
+        landledger = LandLedger.objects.get(pk=1)
+        landscores = ChemicalReportRepository(1).read_landscores()
+        landscores[0].ec = None
+        expected = LandScoreChemical.objects.filter(landledger=landledger).exclude(pk=landscores[0].pk) \
+            .aggregate(Avg('ec'), Avg('ph'))
+
+        with self.assertNumQueries(0):
+            charts = ReportLayout1(landledger, ChartJson(), landscores).publish()
+
+        self.assertAlmostEqual(expected['ec__avg'], charts['chart1']['values'][0])
+        self.assertAlmostEqual(
+            LandScoreChemical.objects.filter(landledger=landledger).aggregate(Avg('ph'))['ph__avg'],
+            charts['chart2']['values'][0])
+
+    def test_averages_without_landscores(self):
+        LandScoreChemical.objects.filter(landledger_id=3).delete()
+
+        charts = ReportLayout1(LandLedger.objects.get(pk=3), ChartJson()).publish()
+
+        self.assertEqual([None] * 5 + [0, 0], charts['chart1']['values'])
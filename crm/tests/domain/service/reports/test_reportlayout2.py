@@ -0,0 +1,80 @@
+import numpy as np
+from django.test import TestCase
+
+from crm.domain.service.reports.reportlayout2 import ReportLayout2
+from crm.domain.service.soilhardnessaggregateservice import SoilHardnessAggregateService
+from crm.domain.valueobject.packedseries import PackedSeries
+from crm.models import Device, LandLedger, SoilHardnessProfile
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES, create_session
+
+
+class TestReportLayout2(TestCase):
+    fixtures = FIXTURES
+
+    def setUp(self):
+        device = Device.objects.get(name='DIK-5531')
+        self.landledger = LandLedger.objects.get(pk=1)
+        # A1 に 60cm の貫入を2回、A2 に 50cm の貫入を1回（圧力はどれも depth * 10）
+        for setmemory, landblock_id, setdepth in ((1, 1, 60), (2, 1, 60), (3, 2, 50)):
+            create_session(device, setmemory, setdepth)
+            SoilHardnessProfile.objects.filter(setmemory=setmemory) \
+                .update(landblock_id=landblock_id, landledger=self.landledger, associated=True)
+
+    def test_statistics(self):
+        with self.assertNumQueries(1):
+            statistics = ReportLayout2(self.landledger).statistics()
+
+        depths = np.arange(1, 61)
+        np.testing.assert_array_equal(depths * 10, statistics['field']['median'])
+        self.assertEqual({'A1', 'A2'}, set(statistics['landblocks']))
+        np.testing.assert_array_equal(depths * 10, statistics['landblocks']['A1']['p90'])
+        # 50cm までしか計測していないエリアは 51cm から NaN
+        self.assertEqual(500, statistics['landblocks']['A2']['mean'][49])
+        self.assertTrue(np.isnan(statistics['landblocks']['A2']['mean'][50:]).all())
+
+    def test_publish(self):
+        charts = ReportLayout2(self.landledger).publish()
+
+        self.assertEqual({'chart1', 'chart2'}, set(charts))
+
+    def test_season_means(self):
+        # 同じ圃場の別の作期（台帳3）に 40cm の貫入を1回
+        create_session(Device.objects.get(name='DIK-5531'), 4, 40)
+        SoilHardnessProfile.objects.filter(setmemory=4) \
+            .update(landblock_id=1, landledger_id=3, associated=True)
+        SoilHardnessAggregateService.rebuild()
+
+        layout = ReportLayout2(self.landledger)
+        with self.assertNumQueries(1):
+            seasons, depths, means = layout.season_means()
+
+        self.assertEqual(2, len(seasons))
+        np.testing.assert_array_equal(np.arange(1, 61), depths)
+        season = f'{self.landledger.sampling_date:%Y%m} {self.landledger.landperiod.name}'
+        np.testing.assert_array_equal(np.arange(1, 61) * 10, means[seasons.index(season)])
+        # 40cm までしか計測していない作期は 41cm から NaN
+        self.assertEqual(1, np.isnan(means).any(axis=1).sum())
+        self.assertEqual({'chart1', 'chart2', 'chart3'}, set(layout.publish()))
+
+    def test_publish_without_measurements(self):
+        self.assertEqual({}, ReportLayout2(LandLedger.objects.get(pk=2)).publish())
+
+    def test_publish_with_empty_profiles(self):
+        landledger = LandLedger.objects.get(pk=2)
+        create_session(Device.objects.get(name='DIK-5531'), 4, setdepth=0)
+        SoilHardnessProfile.objects.filter(setmemory=4) \
+            .update(landblock_id=1, landledger=landledger, associated=True)
+
+        self.assertEqual({}, ReportLayout2(landledger).statistics())
+        self.assertEqual({}, ReportLayout2(landledger).publish())
+
+    def test_statistics_drops_depths_below_1(self):
+        SoilHardnessProfile.objects.filter(setmemory=3).update(
+            depths=PackedSeries.pack([-1, 0, 1]), pressures=PackedSeries.pack([9999, 9999, 10]))
+
+        statistics = ReportLayout2(self.landledger).statistics()
+
+        # 0cm 以下の圧力が 60cm（末尾）や 59cm に回りこまない
+        self.assertEqual(10, statistics['landblocks']['A2']['mean'][0])
+        self.assertTrue(np.isnan(statistics['landblocks']['A2']['mean'][1:]).all())
+        self.assertEqual(600, statistics['field']['mean'][59])
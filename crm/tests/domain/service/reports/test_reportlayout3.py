@@ -0,0 +1,44 @@
+from django.test import TestCase
+
+from crm.domain.service.landscoresummaryservice import LandScoreSummaryService
+from crm.domain.service.reports.reportlayout3 import ReportLayout3
+from crm.domain.valueobject.graph.chartjson import ChartJson
+from crm.models import Land, LandLedger, LandScoreChemicalSummary
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES
+
+
+class TestReportLayout3(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def setUp(self):
+        LandScoreSummaryService.rebuild()
+        self.land = Land.objects.get(pk=1)
+
+    def test_load_in_one_query(self):
+        with self.assertNumQueries(1):
+            layout = ReportLayout3(self.land, ChartJson())
+
+        landledgers = LandLedger.objects.filter(land=self.land).order_by('sampling_date', 'pk')
+        self.assertEqual([f'{x.sampling_date:%Y%m} {x.landperiod.name}' for x in landledgers], layout.seasons)
+
+    def test_statistics(self):
+        statistics = ReportLayout3(self.land, ChartJson()).statistics()
+
+        summary = LandScoreChemicalSummary.objects.get(landledger_id=1, metric='ph')
+        self.assertAlmostEqual(summary.value_mean, statistics['ph']['mean'][0])
+        self.assertAlmostEqual(summary.value_std, statistics['ph']['std'][0])
+        self.assertEqual(summary.value_max, statistics['ph']['max'][0])
+
+    def test_publish(self):
+        charts = ReportLayout3(self.land, ChartJson()).publish(['ec'])
+
+        self.assertEqual(['ec'], list(charts))
+        self.assertEqual(3, len(charts['ec']['labels']))
+        self.assertLessEqual(charts['ec']['low'][0], charts['ec']['mean'][0])
+
+    def test_publish_without_summaries(self):
+        LandScoreChemicalSummary.objects.filter(landledger_id=2, metric='ph').delete()
+        layout = ReportLayout3(self.land, ChartJson())
+
+        self.assertIsNone(layout.table()[list(ReportLayout3.METRIC_LABELS).index('ph')]['cells'][1])
+        self.assertEqual({}, ReportLayout3(Land.objects.get(pk=3), ChartJson()).publish())
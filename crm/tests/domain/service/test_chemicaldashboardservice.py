@@ -0,0 +1,75 @@
+import numpy as np
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from crm.domain.service.chemicaldashboardservice import ChemicalDashboardService
+from crm.domain.service.landscoresummaryservice import LandScoreSummaryService
+from crm.models import LandScoreChemical, LandLedger
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-dashboard'},
+})
+class TestChemicalDashboardService(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def setUp(self):
+        caches['reports'].clear()
+        LandScoreSummaryService.rebuild()
+
+    def test_statistics(self):
+        means = np.array([[1.0, 5.0], [2.0, np.nan], [2.0, 5.0], [3.0, 5.0], [100.0, 5.0]])
+
+        statistics = ChemicalDashboardService._statistics(means)
+
+        np.testing.assert_allclose([10, 40, 40, 70, 90], statistics['percentile'][:, 0])
+        np.testing.assert_array_equal([5, 3, 3, 2, 1], statistics['rank'][:, 0])
+        np.testing.assert_allclose((means[:, 0] - means[:, 0].mean()) / means[:, 0].std(), statistics['zscore'][:, 0])
+        np.testing.assert_array_equal([False, False, False, False, True], statistics['outlier'][:, 0])
+        # 値がない、ばらつきがない列
+        self.assertTrue(np.isnan(statistics['percentile'][1, 1]))
+        self.assertTrue(np.isnan(statistics['zscore'][0, 1]))
+        self.assertFalse(statistics['outlier'][:, 1].any())
+
+    def test_load(self):
+        dashboard = ChemicalDashboardService('company', 1).load()
+
+        landledger_ids = list(LandLedger.objects.filter(land__company_id=1).order_by('pk').values_list('pk', flat=True))
+        self.assertEqual(landledger_ids, dashboard['landledger_ids'].tolist())
+        ph = LandScoreChemical.METRICS.index('ph')
+        expected = np.mean(LandScoreChemical.objects.filter(landledger_id=2).values_list('ph', flat=True))
+        self.assertAlmostEqual(expected, dashboard['mean'][landledger_ids.index(2), ph])
+
+    def test_load_cached(self):
+        ChemicalDashboardService('company', 1).load()
+
+        # バージョンを求めるクエリだけ
+        with self.assertNumQueries(1):
+            ChemicalDashboardService('company', 1).load()
+
+    def test_load_after_save(self):
+        service = ChemicalDashboardService('crop', 1)
+        service.load()
+        landscore = LandScoreChemical.objects.filter(landledger_id=1).first()
+        landscore.ph = 100
+        landscore.save()
+
+        dashboard = service.load()
+
+        ph = LandScoreChemical.METRICS.index('ph')
+        self.assertEqual(1, dashboard['rank'][dashboard['landledger_ids'].tolist().index(1), ph])
+
+    def test_rows(self):
+        dashboard = ChemicalDashboardService('crop', 2).load()
+
+        rows = ChemicalDashboardService.rows(dashboard, [1, 4, 5], ['ph', 'ec'])
+
+        self.assertEqual([4, 5], list(rows))
+        self.assertEqual({'mean', 'percentile', 'zscore', 'rank', 'outlier'}, set(rows[4]['ph']))
+        self.assertEqual({1, 2}, {rows[4]['ec']['rank'], rows[5]['ec']['rank']})
+
+    def test_unknown_scope(self):
+        with self.assertRaises(ValueError):
+            ChemicalDashboardService('land', 1)
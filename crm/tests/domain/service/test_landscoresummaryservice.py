@@ -0,0 +1,48 @@
+import numpy as np
+from django.test import TestCase
+
+from crm.domain.service.landscoresummaryservice import LandScoreSummaryService
+from crm.models import LandScoreChemical, LandScoreChemicalSummary
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES
+
+
+class TestLandScoreSummaryService(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def test_rebuild(self):
+        created = LandScoreSummaryService.rebuild(batch_size=10)
+
+        self.assertEqual(created, LandScoreChemicalSummary.objects.count())
+        for metric in ('ph', 'cao_per_mgo'):
+            values = np.array(LandScoreChemical.objects.filter(landledger_id=2).values_list(metric, flat=True),
+                              dtype=float)
+            summary = LandScoreChemicalSummary.objects.get(landledger_id=2, metric=metric)
+            self.assertEqual(5, summary.count)
+            self.assertAlmostEqual(values.mean(), summary.value_mean)
+            self.assertAlmostEqual(values.std(), summary.value_std)
+            self.assertEqual(values.min(), summary.value_min)
+            self.assertEqual(values.max(), summary.value_max)
+
+    def test_refresh_skips_nulls(self):
+        LandScoreChemical.objects.filter(landledger_id=1).update(ec=None)
+        LandScoreChemical.objects.filter(landledger_id=1).exclude(pk=1).update(ph=None)
+
+        LandScoreSummaryService.refresh([1, None])
+
+        self.assertFalse(LandScoreChemicalSummary.objects.filter(landledger_id=1, metric='ec').exists())
+        summary = LandScoreChemicalSummary.objects.get(landledger_id=1, metric='ph')
+        self.assertEqual(1, summary.count)
+        self.assertEqual(LandScoreChemical.objects.get(pk=1).ph, summary.value_mean)
+        self.assertEqual(0, summary.value_std)
+        self.assertFalse(LandScoreChemicalSummary.objects.exclude(landledger_id=1).exists())
+
+    def test_signal(self):
+        landscore = LandScoreChemical.objects.filter(landledger_id=1).first()
+        landscore.ph = 100
+        landscore.save()
+
+        self.assertEqual(100, LandScoreChemicalSummary.objects.get(landledger_id=1, metric='ph').value_max)
+
+        LandScoreChemical.objects.get(pk=landscore.pk).delete()
+
+        self.assertEqual(4, LandScoreChemicalSummary.objects.get(landledger_id=1, metric='ph').count)
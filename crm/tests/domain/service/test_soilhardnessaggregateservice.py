@@ -0,0 +1,84 @@
+import numpy as np
+from django.test import TestCase
+
+from crm.domain.service.soilhardnessaggregateservice import SoilHardnessAggregateService
+from crm.domain.valueobject.packedseries import PackedSeries
+from crm.models import Device, SoilHardnessMeasurement, SoilHardnessAggregate, SoilHardnessProfile
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES, create_session
+
+
+def session(landledger_id, landblock_id, pressures):
+    """
+    1cm からの圧力の配列を、ロールアップに足し引きする貫入にする
+    """
+    return landledger_id, landblock_id, np.arange(1, len(pressures) + 1), np.array(pressures)
+
+
+class TestSoilHardnessAggregateService(TestCase):
+    fixtures = FIXTURES
+
+    def test_apply(self):
+        SoilHardnessAggregateService.apply([], [session(1, 1, [100, 200]), session(1, 1, [300, 200]),
+                                                session(1, None, [999])])
+
+        self.assertEqual(2, SoilHardnessAggregate.objects.count())
+        aggregate = SoilHardnessAggregate.objects.get(landledger_id=1, landblock_id=1, depth=1)
+        self.assertEqual(2, aggregate.count)
+        self.assertEqual(400, aggregate.pressure_sum)
+        self.assertEqual(100 ** 2 + 300 ** 2, aggregate.pressure_sum_sq)
+        self.assertEqual(100, aggregate.pressure_min)
+        self.assertEqual(300, aggregate.pressure_max)
+        self.assertEqual(200, aggregate.pressure_mean)
+        self.assertEqual(100, aggregate.pressure_std)
+
+    def test_apply_moves_session(self):
+        device = Device.objects.get(name='DIK-5531')
+        for setmemory in (1, 2):
+            create_session(device, setmemory, setdepth=2)
+        SoilHardnessProfile.objects.filter(setmemory=2).update(pressures=PackedSeries.pack([300, 20]))
+        SoilHardnessProfile.objects.update(landledger_id=1, landblock_id=1, associated=True)
+        SoilHardnessAggregateService.rebuild()
+
+        # setmemory=2 の貫入（1cm の最大の 300 を含む）を別の圃場ブロックに付け替えると、最大はプロファイルから求めなおす
+        SoilHardnessProfile.objects.filter(setmemory=2).update(landblock_id=2)
+        SoilHardnessAggregateService.apply([session(1, 1, [300, 20])], [session(1, 2, [300, 20])])
+
+        aggregate = SoilHardnessAggregate.objects.get(landledger_id=1, landblock_id=1, depth=1)
+        self.assertEqual((1, 10, 100, 10, 10), (aggregate.count, aggregate.pressure_sum, aggregate.pressure_sum_sq,
+                                                aggregate.pressure_min, aggregate.pressure_max))
+        aggregate = SoilHardnessAggregate.objects.get(landledger_id=1, landblock_id=2, depth=1)
+        self.assertEqual((1, 300, 300, 300), (aggregate.count, aggregate.pressure_sum,
+                                              aggregate.pressure_min, aggregate.pressure_max))
+
+        # 最後の貫入を外すと、その (台帳, 圃場ブロック) のロールアップは消える
+        SoilHardnessProfile.objects.filter(setmemory=2).update(landledger=None, landblock=None, associated=False)
+        SoilHardnessAggregateService.apply([session(1, 2, [300, 20])], [])
+        self.assertFalse(SoilHardnessAggregate.objects.filter(landblock_id=2).exists())
+        self.assertEqual(2, SoilHardnessAggregate.objects.filter(landblock_id=1).count())
+
+    def test_rebuild(self):
+        device = Device.objects.get(name='DIK-5531')
+        for setmemory in (1, 2, 3):
+            create_session(device, setmemory)
+        SoilHardnessProfile.objects.filter(setmemory__in=(1, 2)).update(landledger_id=1, landblock_id=1,
+                                                                        associated=True)
+        SoilHardnessProfile.objects.filter(setmemory=3).update(landledger_id=1, landblock_id=2, associated=True)
+        # プロファイルのない測定データは apply() と同じく数えない
+        SoilHardnessMeasurement.objects.update(landledger_id=1, landblock_id=3)
+
+        created = SoilHardnessAggregateService.rebuild(batch_size=7)
+
+        self.assertEqual(120, created)
+        self.assertEqual(120, SoilHardnessAggregate.objects.count())
+        self.assertEqual(1, SoilHardnessAggregate.objects.get(landblock_id=2, depth=60).count)
+        self.assertFalse(SoilHardnessAggregate.objects.filter(landblock_id=3).exists())
+
+    def test_apply_without_profiles(self):
+        # 測定データからロールアップを作ったあと、プロファイルがないまま貫入を外しても KeyError にならない
+        SoilHardnessAggregate.objects.create(landledger_id=1, landblock_id=1, depth=1, count=2, pressure_sum=30,
+                                             pressure_sum_sq=500, pressure_min=10, pressure_max=20)
+
+        SoilHardnessAggregateService.apply([session(1, 1, [10])], [])
+
+        # 残りの最小・最大を貫入から求められないので、件数・合計とも貫入（ない）に合わせて行を消す
+        self.assertFalse(SoilHardnessAggregate.objects.exists())
@@ -0,0 +1,148 @@
+from datetime import datetime
+from unittest import mock
+
+import pytz
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from crm.domain.service.soilhardnessaggregateservice import SoilHardnessAggregateService
+from crm.domain.service.soilhardnessassociationservice import SoilHardnessAssociationService
+from crm.domain.valueobject.packedseries import PackedSeries
+from crm.models import Device, SoilHardnessMeasurement, SoilHardnessProfile, LandLedger, LandBlock, SamplingOrder, \
+    SoilHardnessAggregate, SamplingMethod
+
+FIXTURES = ['companycategory', 'company', 'authuser', 'crop', 'landblock', 'landperiod', 'cultivationtype', 'land',
+            'samplingmethod', 'samplingorder', 'landledger', 'device']
+
+
+def create_session(device: Device, setmemory: int, setdepth: int = 60):
+    """
+    1回の貫入分の測定データとプロファイルを作る
+    """
+    setdatetime = pytz.timezone('Asia/Tokyo').localize(datetime(2023, 7, 1, 12, 0, setmemory % 60))
+    SoilHardnessMeasurement.objects.bulk_create([
+        SoilHardnessMeasurement(
+            setdevice=device, setmemory=setmemory, setdatetime=setdatetime, setdepth=setdepth, setspring=5,
+            setcone=2, depth=depth, pressure=depth * 10, csvfolder='ススムA1'
+        ) for depth in range(1, setdepth + 1)
+    ])
+    SoilHardnessProfile.objects.create(
+        setdevice=device, setmemory=setmemory, setdatetime=setdatetime, setdepth=setdepth, setspring=5, setcone=2,
+        depths=PackedSeries.pack(range(1, setdepth + 1)),
+        pressures=PackedSeries.pack([depth * 10 for depth in range(1, setdepth + 1)]),
+        row_count=setdepth,
+        csvfolder='ススムA1',
+    )
+
+
+class TestSoilHardnessAssociationService(TestCase):
+    fixtures = FIXTURES
+
+    def test_sync_profiles(self):
+        device = Device.objects.get(name='DIK-5531')
+        create_session(device, 1)
+        create_session(device, 2)
+        landledger = LandLedger.objects.get(pk=1)
+        landblock = LandBlock.objects.get(pk=7)
+
+        measurements = list(SoilHardnessMeasurement.objects.filter(setmemory=1))
+        for measurement in measurements:
+            measurement.landblock = landblock
+            measurement.landledger = landledger
+        SoilHardnessAssociationService.sync_profiles(measurements)
+
+        self.assertEqual(landblock.pk, SoilHardnessProfile.objects.get(setmemory=1).landblock_id)
+        self.assertEqual(landledger.pk, SoilHardnessProfile.objects.get(setmemory=1).landledger_id)
+        self.assertTrue(SoilHardnessProfile.objects.get(setmemory=1).associated)
+        self.assertIsNone(SoilHardnessProfile.objects.get(setmemory=2).landblock_id)
+        self.assertFalse(SoilHardnessProfile.objects.get(setmemory=2).associated)
+        self.assertEqual(60, SoilHardnessAggregate.objects.filter(landledger=landledger, landblock=landblock).count())
+        self.assertEqual(300, SoilHardnessAggregate.objects.get(landblock=landblock, depth=30).pressure_sum)
+
+    def test_associate_r_pattern(self):
+        device = Device.objects.get(name='DIK-5531')
+        for setmemory in range(1, 52):
+            create_session(device, setmemory)
+        landledger = LandLedger.objects.select_related('sampling_method').get(pk=1)
+        landblock_ids = list(SamplingOrder.objects
+                             .filter(sampling_method=landledger.sampling_method)
+                             .order_by('ordering')
+                             .values_list('landblock_id', flat=True))
+
+        # 採土順と付け替え前のプロファイルの取得、測定データとプロファイルの UPDATE、ロールアップへの差分の反映
+        # （SELECT, DELETE, INSERT）だけで、セッション数によらない（測定データは読まない）
+        # （ロールアップの INSERT は SQLite だとパラメータ数の上限で分割されるので、件数は固定せず比べる）
+        with CaptureQueriesContext(connection) as one_field:
+            SoilHardnessAssociationService.associate_r_pattern(landledger, [1])
+        with CaptureQueriesContext(connection) as two_fields:
+            updated = SoilHardnessAssociationService.associate_r_pattern(landledger, [1, 26])
+        self.assertEqual(len(one_field), len(two_fields))
+        self.assertEqual(5, len([q for q in two_fields if q['sql'].startswith(('SELECT', 'UPDATE'))]))
+        self.assertFalse([q for q in two_fields
+                          if q['sql'].startswith('SELECT') and 'crm_soilhardnessmeasurement' in q['sql']])
+
+        self.assertEqual(50 * 60, updated)
+        for setmemory in range(1, 51):
+            expected = landblock_ids[(setmemory - 1) % 25 // landledger.sampling_method.times]
+            self.assertEqual({expected}, set(SoilHardnessMeasurement.objects
+                                             .filter(setmemory=setmemory)
+                                             .values_list('landblock_id', flat=True)))
+            self.assertEqual(expected, SoilHardnessProfile.objects.get(setmemory=setmemory).landblock_id)
+            self.assertEqual(landledger.pk, SoilHardnessProfile.objects.get(setmemory=setmemory).landledger_id)
+        self.assertFalse(SoilHardnessMeasurement.objects.filter(setmemory=51, landblock__isnull=False).exists())
+        # 1ブロックあたり 2圃場分✕5回 の貫入
+        aggregate = SoilHardnessAggregate.objects.get(landledger=landledger, landblock_id=landblock_ids[0], depth=30)
+        self.assertEqual(10, aggregate.count)
+        self.assertEqual(300, aggregate.pressure_mean)
+        self.assertEqual(0, aggregate.pressure_std)
+        self.assertEqual(5 * 60, SoilHardnessAggregate.objects.count())
+        self.assertEqual([51], list(SoilHardnessProfile.objects
+                                    .filter(associated=False)
+                                    .values_list('setmemory', flat=True)))
+
+    def test_field_size(self):
+        # 5点法 は採土順が5ブロック✕5回、9点法 は採土順がない
+        self.assertEqual(25, SoilHardnessAssociationService.field_size(SamplingMethod.objects.get(pk=1)))
+        self.assertEqual(0, SoilHardnessAssociationService.field_size(SamplingMethod.objects.get(pk=2)))
+
+    def test_associate_r_pattern_without_sampling_order(self):
+        device = Device.objects.get(name='DIK-5531')
+        for setmemory in range(1, 46):
+            create_session(device, setmemory)
+        landledger = LandLedger.objects.select_related('sampling_method').get(pk=1)
+        landledger.sampling_method_id = 2
+        landledger.save()
+        landledger = LandLedger.objects.select_related('sampling_method').get(pk=1)
+
+        # 9点法 には採土順がないので、何も更新せずに失敗を知らせる
+        with self.assertRaisesRegex(ValueError, 'no sampling order'):
+            SoilHardnessAssociationService.associate_r_pattern(landledger, [1])
+        self.assertFalse(SoilHardnessProfile.objects.filter(associated=True).exists())
+
+    def test_associate_r_pattern_rolls_back(self):
+        device = Device.objects.get(name='DIK-5531')
+        for setmemory in range(1, 26):
+            create_session(device, setmemory)
+        landledger = LandLedger.objects.select_related('sampling_method').get(pk=1)
+
+        # ロールアップの差分で失敗したら、測定データとプロファイルの関連付けも元に戻る
+        with mock.patch.object(SoilHardnessAggregateService, 'apply', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                SoilHardnessAssociationService.associate_r_pattern(landledger, [1])
+        self.assertFalse(SoilHardnessMeasurement.objects.filter(landledger__isnull=False).exists())
+        self.assertFalse(SoilHardnessProfile.objects.filter(associated=True).exists())
+
+    def test_associate_r_pattern_again(self):
+        device = Device.objects.get(name='DIK-5531')
+        for setmemory in range(1, 26):
+            create_session(device, setmemory)
+        landledger = LandLedger.objects.select_related('sampling_method').get(pk=1)
+        SoilHardnessAssociationService.associate_r_pattern(landledger, [1])
+
+        # 別の台帳に付け替えると、付け替え前の台帳のロールアップは消える
+        other_landledger = LandLedger.objects.select_related('sampling_method').get(pk=2)
+        SoilHardnessAssociationService.associate_r_pattern(other_landledger, [1])
+
+        self.assertFalse(SoilHardnessAggregate.objects.filter(landledger=landledger).exists())
+        self.assertEqual(5 * 60, SoilHardnessAggregate.objects.filter(landledger=other_landledger).count())
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime
+from unittest import TestCase
+
+from crm.domain.service.soilhardnesscsvgenerator import SoilHardnessCsvGenerator
+from crm.domain.service.zipfileservice import ZipFileService
+from crm.management.commands.import_soil_hardness import parse_csv_file
+from crm.tests.domain.service.test_zipfileservice import Cp932ZipInfo
+
+
+class TestSoilHardnessCsvGenerator(TestCase):
+    def test_generate(self):
+        generator = SoilHardnessCsvGenerator(seed=1)
+        members = list(generator.generate(26))
+
+        self.assertEqual(26, len(members))
+        self.assertEqual('ススムA1/DIK-5531_0001.csv', members[0][0])
+        self.assertEqual('ススムA2/DIK-5531_0026.csv', members[25][0])
+
+        # 取り込みと同じ解析を通る
+        csv_file, _, header, depths, pressures, error = parse_csv_file((members[1][0], members[1][1].encode(), ''))
+        self.assertIsNone(error)
+        self.assertEqual(2, header['setmemory'])
+        self.assertEqual(datetime(2023, 7, 1, 9, 1), header['setdatetime'].replace(tzinfo=None))
+        self.assertEqual(60, len(depths))
+        self.assertTrue((pressures >= 0).all())
+
+    def test_write_zip(self):
+        work_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_path)
+        zip_path = os.path.join(work_path, 'generated.zip')
+        SoilHardnessCsvGenerator(seed=1).write_zip(3, zip_path)
+
+        with zipfile.ZipFile(zip_path) as z:
+            self.assertTrue(z.infolist()[0].flag_bits & 0x800)
+        member_names = [member_name for member_name, _ in ZipFileService.iter_members(zip_path, '.csv')]
+        self.assertEqual(['ススムA1/DIK-5531_0001.csv', 'ススムA1/DIK-5531_0002.csv', 'ススムA1/DIK-5531_0003.csv'],
+                         member_names)
+
+    def test_write_zip_cp932(self):
+        work_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_path)
+        zip_path = os.path.join(work_path, 'generated.zip')
+        SoilHardnessCsvGenerator(seed=1).write_zip(1, zip_path, zipinfo_class=Cp932ZipInfo)
+
+        with zipfile.ZipFile(zip_path) as z:
+            # UTF-8 フラグなしの cp932 で書かれていても、取り込み時に ZipFileService の文字化け対応を通る
+            self.assertFalse(z.infolist()[0].flag_bits & 0x800)
+        self.assertEqual(['ススムA1/DIK-5531_0001.csv'],
+                         [member_name for member_name, _ in ZipFileService.iter_members(zip_path, '.csv')])
+
+    def test_write_folder(self):
+        folder_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder_path)
+        SoilHardnessCsvGenerator(seed=1).write_folder(2, folder_path)
+
+        self.assertTrue(os.path.exists(os.path.join(folder_path, 'ススムA1', 'DIK-5531_0002.csv')))
@@ -1,29 +1,28 @@
 import os
+import shutil
 import tempfile
 import zipfile
 
 from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.test import TestCase, override_settings
+
 from crm.domain.service.zipfileservice import ZipFileService
 
 
+class Cp932ZipInfo(zipfile.ZipInfo):
+    """
+    Windows のエクスプローラで作ったzipと同じように、メンバー名を UTF-8 フラグなしの cp932 で書き込む
+    zipfile には名前のエンコードを指定して書き込む方法がないので CPython 内部のメソッドを上書きしている（テスト専用）
+    """
+    def _encodeFilenameFlags(self):
+        return self.filename.encode('cp932'), self.flag_bits
+
+
 class ZipFileServiceTestCase(TestCase):
     @override_settings(MEDIA_ROOT=tempfile.gettempdir())
-    def test_handle_uploaded_zip(self):
-        # ZIP ファイルを作成
-        tmpdir = tempfile.mkdtemp()
-        zip_fn = os.path.join(tmpdir, 'archive.zip')
-        zip_obj = zipfile.ZipFile(zip_fn, 'w')
-
-        # ZIP ファイルに追加
+    def test_save_uploaded_zip(self):
         file_data = b'Test file data'
-        zip_obj.writestr('test_file.txt', file_data)
-        zip_obj.close()
-
-        # ZIP ファイルを InMemoryUploadedFile に変換する
-        with open(zip_fn, 'rb') as f:
-            file_data = f.read()
         uploaded_file = InMemoryUploadedFile(
             ContentFile(file_data),
             field_name='file',
@@ -33,9 +32,34 @@ class ZipFileServiceTestCase(TestCase):
             charset=None,
         )
 
-        result = ZipFileService.handle_uploaded_zip(uploaded_file)
+        result = ZipFileService.save_uploaded_zip(uploaded_file)
+
+        # media/soilhardness に解凍せずに保存される
+        self.assertEqual(os.path.join(tempfile.gettempdir(), 'soilhardness'), os.path.dirname(result))
+        with open(result, 'rb') as f:
+            self.assertEqual(file_data, f.read())
+        os.remove(result)
+
+    def test_iter_members(self):
+        work_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_path)
+        zip_fn = os.path.join(work_path, 'archive.zip')
+        with zipfile.ZipFile(zip_fn, 'w') as z:
+            z.writestr('ススムA1/', b'')
+            z.writestr('ススムA1/DIK-5531_0001.csv', b'csv data')
+            z.writestr('ススムA1/readme.txt', b'text data')
+
+        members = list(ZipFileService.iter_members(zip_fn, '.csv'))
+
+        self.assertEqual([('ススムA1/DIK-5531_0001.csv', b'csv data')], members)
+
+    def test_iter_members_cp932(self):
+        work_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_path)
+        zip_fn = os.path.join(work_path, 'archive.zip')
+        with zipfile.ZipFile(zip_fn, 'w') as z:
+            z.writestr(Cp932ZipInfo('ススムA1/DIK-5531_0001.csv'), b'csv data')
+
+        members = list(ZipFileService.iter_members(zip_fn, '.csv'))
 
-        # media/soilhardness と一致する
-        expected_upload_folder = os.path.join(tempfile.gettempdir(), 'soilhardness')
-        self.assertEqual(expected_upload_folder, result)
-        self.assertTrue(os.path.exists(expected_upload_folder))
+        self.assertEqual([('ススムA1/DIK-5531_0001.csv', b'csv data')], members)
@@ -0,0 +1,30 @@
+import json
+from decimal import Decimal
+from unittest import TestCase
+
+import numpy as np
+from django.test import override_settings
+
+from crm.domain.valueobject.graph.chartjson import ChartJson
+from crm.domain.valueobject.graph.graphengines import get_graph_engine
+from crm.domain.valueobject.graph.matplotlib import Matplotlib
+
+
+class TestChartJson(TestCase):
+    def test_plot_graph(self):
+        chart = ChartJson().plot_graph("title", ['ph', 'CaO'], [Decimal('6.5'), None])
+
+        self.assertEqual({'title': 'title', 'labels': ['ph', 'CaO'], 'values': [6.5, None]}, chart)
+        json.dumps(chart)
+
+    def test_plot_profile(self):
+        chart = ChartJson().plot_profile("title", np.arange(1, 3), {'mean': np.array([10.0, np.nan])})
+
+        self.assertEqual({'title': 'title', 'depths': [1, 2], 'series': {'mean': [10.0, None]}}, chart)
+        json.dumps(chart)
+
+    @override_settings(REPORT_GRAPH_ENGINE='json')
+    def test_get_graph_engine(self):
+        self.assertIsInstance(get_graph_engine(), ChartJson)
+        self.assertIsInstance(get_graph_engine('matplotlib'), Matplotlib)
+        self.assertIsInstance(get_graph_engine('unknown'), ChartJson)
@@ -0,0 +1,31 @@
+import base64
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+import matplotlib.pyplot as plt
+
+from crm.domain.valueobject.graph.matplotlib import Matplotlib
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class TestMatplotlib(TestCase):
+    def test_plot_graph(self):
+        graph = Matplotlib().plot_graph("title", ['a', 'b'], [1, 2])
+
+        self.assertTrue(base64.b64decode(graph).startswith(PNG_SIGNATURE))
+        # pyplot に Figure を残さない
+        self.assertEqual([], plt.get_fignums())
+
+    def test_plot_profile(self):
+        graph = Matplotlib().plot_profile("title", [1, 2, 3], {'mean': [10, 20, 30]})
+
+        self.assertTrue(base64.b64decode(graph).startswith(PNG_SIGNATURE))
+
+    def test_plot_graph_from_threads(self):
+        g = Matplotlib()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            graphs = list(executor.map(lambda i: g.plot_graph(f"title{i}", ['a', 'b'], [i, 2]), range(8)))
+
+        expected = g.plot_graph("title3", ['a', 'b'], [3, 2])
+        self.assertEqual(expected, graphs[3])
@@ -0,0 +1,24 @@
+from unittest import TestCase
+
+import numpy as np
+
+from crm.domain.valueobject.packedseries import PackedSeries
+
+
+class TestPackedSeries(TestCase):
+    def test_pack_unpack(self):
+        values = [0, 1, 1500, 32767, -32768]
+        packed = PackedSeries.pack(values)
+
+        self.assertEqual(2 * len(values), len(packed))
+        np.testing.assert_array_equal(np.array(values, dtype=np.int16), PackedSeries.unpack(packed))
+
+    def test_pack_unpack_compressed(self):
+        values = list(range(1, 61))
+        packed = PackedSeries.pack(values, compress=True)
+
+        np.testing.assert_array_equal(np.array(values, dtype=np.int16), PackedSeries.unpack(memoryview(packed), True))
+
+    def test_pack_out_of_range(self):
+        with self.assertRaises(ValueError):
+            PackedSeries.pack([0, 32768])
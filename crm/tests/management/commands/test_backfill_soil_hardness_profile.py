@@ -0,0 +1,47 @@
+from datetime import datetime
+from io import StringIO
+
+import pytz
+from django.core.management import call_command
+from django.test import TestCase
+
+from crm.models import Device, SoilHardnessMeasurement, SoilHardnessProfile
+
+
+class TestBackfillSoilHardnessProfile(TestCase):
+    def setUp(self):
+        device = Device.objects.create(name='DIK-5531')
+        for setmemory in (1, 2):
+            SoilHardnessMeasurement.objects.bulk_create([
+                SoilHardnessMeasurement(
+                    setdevice=device,
+                    setmemory=setmemory,
+                    setdatetime=pytz.timezone('Asia/Tokyo').localize(datetime(2023, 7, 1, 12, setmemory)),
+                    setdepth=60,
+                    setspring=5,
+                    setcone=2,
+                    depth=depth,
+                    pressure=depth * 10 + setmemory,
+                    csvfolder='ススムA1',
+                ) for depth in range(60, 0, -1)
+            ])
+
+    def test_handle(self):
+        out = StringIO()
+        call_command('backfill_soil_hardness_profile', compress=True, stdout=out)
+
+        self.assertIn('Successfully backfilled 2 soil hardness profiles.', out.getvalue())
+        profile = SoilHardnessProfile.objects.get(setmemory=2)
+        self.assertTrue(profile.compressed)
+        self.assertEqual(list(range(1, 61)), profile.depth_array().tolist())
+        self.assertEqual([depth * 10 + 2 for depth in range(1, 61)], profile.pressure_array().tolist())
+        self.assertEqual(60, profile.row_count)
+        self.assertFalse(profile.associated)
+
+    def test_handle_twice(self):
+        call_command('backfill_soil_hardness_profile', stdout=StringIO())
+        out = StringIO()
+        call_command('backfill_soil_hardness_profile', stdout=out)
+
+        self.assertIn('Successfully backfilled 0 soil hardness profiles.', out.getvalue())
+        self.assertEqual(2, SoilHardnessProfile.objects.count())
@@ -0,0 +1,38 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from crm.domain.valueobject.graph.matplotlib import Matplotlib
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-export-command'},
+})
+@mock.patch.object(Matplotlib, 'plot_graph', return_value='cG5n')
+class TestExportChemicalReports(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def setUp(self):
+        caches['reports'].clear()
+        self.work_path = tempfile.mkdtemp()
+        self.output = os.path.join(self.work_path, 'reports.zip')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_path)
+
+    def test_handle(self, plot_graph):
+        out = StringIO()
+        call_command('export_chemical_reports', self.output, landperiod=[4], workers=1, stdout=out)
+
+        self.assertIn(f'Successfully exported 2 chemical reports to {self.output}.', out.getvalue())
+        with zipfile.ZipFile(self.output) as zf:
+            self.assertEqual(2, len([name for name in zf.namelist() if name.endswith('report.html')]))
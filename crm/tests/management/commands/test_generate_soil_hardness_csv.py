@@ -0,0 +1,26 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from crm.models import Device, SoilHardnessMeasurement, SoilHardnessMeasurementImportErrors
+
+
+class TestGenerateSoilHardnessCsv(TestCase):
+    def test_handle_zip_can_be_imported(self):
+        Device.objects.create(name='DIK-5531')
+        work_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_path)
+        zip_path = os.path.join(work_path, 'generated.zip')
+        out = StringIO()
+        call_command('generate_soil_hardness_csv', zip_path, files=30, zip=True, seed=1, stdout=out)
+        self.assertIn('Successfully generated 30 soil hardness CSV files', out.getvalue())
+
+        call_command('import_soil_hardness', zip_path, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(1800, SoilHardnessMeasurement.objects.count())
+        self.assertEqual({'ススムA1', 'ススムA2'}, set(SoilHardnessMeasurement.objects.values_list('csvfolder', flat=True)))
+        self.assertFalse(SoilHardnessMeasurementImportErrors.objects.exists())
@@ -1,14 +1,55 @@
+import os
+import shutil
+import tempfile
+import zipfile
 from datetime import datetime
 from io import StringIO
+from unittest import mock
 
 import pytz
 from django.core.management import call_command
 from django.test import TestCase
 
-from crm.management.commands.import_soil_hardness import extract_setdevice, extract_setdatetime, extract_numeric_value
+from crm.management.commands.import_soil_hardness import Command, extract_setdevice, extract_setdatetime, extract_numeric_value, \
+    read_data_block
+from crm.models import Device, SoilHardnessMeasurement, SoilHardnessMeasurementImportErrors, \
+    SoilHardnessImportManifest, SoilHardnessProfile
+
+
+def soil_hardness_csv(setmemory: int, setdatetime: str = '23.07.01 12:34:56', setdepth: int = 60) -> str:
+    """
+    DIK-5531 が出力するレイアウトのCSVを1ファイル分つくる
+    """
+    lines = [
+        'DIK-5531,Digital Cone Penetrometer',
+        f'Memory No.,{setmemory}',
+        'Latitude,0',
+        'Longitude,0',
+        f'Set Depth,{setdepth}',
+        f'Date and Time, {setdatetime}',
+        'Spring,5',
+        'Cone,2',
+        '',
+        'Depth[cm],Pressure[kPa]',
+    ]
+    lines += [f'{depth},{depth * 10}' for depth in range(1, setdepth + 1)]
+    return '\n'.join(lines) + '\n'
+
+
+def write_soil_hardness_csv(path: str, setmemory: int, setdatetime: str = '23.07.01 12:34:56', setdepth: int = 60):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        f.write(soil_hardness_csv(setmemory, setdatetime, setdepth))
 
 
 class TestImportSoilHardness(TestCase):
+    def _mkdtemp(self) -> str:
+        """
+        テストが終わったら消える一時フォルダを作る
+        """
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        return path
+
     def test_handle_folder_path_not_exist(self):
         out = StringIO()
         err = StringIO()
@@ -106,3 +147,171 @@ class TestImportSoilHardness(TestCase):
         line = ['invalid', '10']
         with self.assertRaises(ValueError):
             extract_numeric_value(line)
+
+    def test_read_data_block_valid(self):
+        depths, pressures = read_data_block('1,10\n2,0\n3,35\n', 3)
+        self.assertEqual([1, 2, 3], depths.tolist())
+        self.assertEqual([10, 0, 35], pressures.tolist())
+
+    def test_read_data_block_invalid_value(self):
+        with self.assertRaises(ValueError):
+            read_data_block('1,10\n2,invalid\n', 2)
+
+    def test_read_data_block_invalid_row_count(self):
+        with self.assertRaisesRegex(ValueError, 'unexpected row count: 2'):
+            read_data_block('1,10\n2,20\n', 60)
+
+    def test_read_data_block_invalid_depth_order(self):
+        with self.assertRaisesRegex(ValueError, 'unexpected depth order at row 13'):
+            read_data_block('1,10\n2,20\n2,30\n', 3)
+
+    def test_read_data_block_invalid_pressure(self):
+        with self.assertRaisesRegex(ValueError, 'unexpected negative pressure at row 12'):
+            read_data_block('1,10\n2,-20\n', 2)
+
+    def test_handle_import_with_batch_size(self):
+        Device.objects.create(name='DIK-5531')
+        folder_path = self._mkdtemp()
+        os.makedirs(os.path.join(folder_path, 'ススムA1'))
+        write_soil_hardness_csv(os.path.join(folder_path, 'ススムA1', 'DIK-5531_0001.csv'), 1)
+        write_soil_hardness_csv(os.path.join(folder_path, 'ススムA1', 'DIK-5531_0002.csv'), 2)
+
+        call_command('import_soil_hardness', folder_path, batch_size=7, files_per_transaction=2,
+                     stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(120, SoilHardnessMeasurement.objects.count())
+        self.assertEqual(60, SoilHardnessMeasurement.objects.filter(setmemory=2).count())
+        self.assertEqual({'ススムA1'}, set(SoilHardnessMeasurement.objects.values_list('csvfolder', flat=True)))
+        self.assertFalse(SoilHardnessMeasurementImportErrors.objects.exists())
+        profile = SoilHardnessProfile.objects.get(setmemory=2)
+        self.assertEqual(list(range(1, 61)), profile.depth_array().tolist())
+        self.assertEqual([depth * 10 for depth in range(1, 61)], profile.pressure_array().tolist())
+        self.assertEqual(60, profile.row_count)
+        self.assertFalse(profile.associated)
+
+    def test_handle_import_rolls_back_broken_file(self):
+        Device.objects.create(name='DIK-5531')
+        folder_path = self._mkdtemp()
+        write_soil_hardness_csv(os.path.join(folder_path, 'DIK-5531_0001.csv'), 1)
+        broken_csv = os.path.join(folder_path, 'DIK-5531_0002.csv')
+        write_soil_hardness_csv(broken_csv, 2)
+        with open(broken_csv, 'a', encoding='utf-8') as f:
+            f.write('61,invalid\n')
+
+        call_command('import_soil_hardness', folder_path, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(60, SoilHardnessMeasurement.objects.count())
+        self.assertFalse(SoilHardnessMeasurement.objects.filter(setmemory=2).exists())
+        import_error = SoilHardnessMeasurementImportErrors.objects.get()
+        self.assertEqual('DIK-5531_0002.csv', import_error.csvfile)
+
+    def test_handle_import_with_workers(self):
+        Device.objects.create(name='DIK-5531')
+        folder_path = self._mkdtemp()
+        for i in range(1, 7):
+            write_soil_hardness_csv(os.path.join(folder_path, f'DIK-5531_{i:04}.csv'), i)
+        with open(os.path.join(folder_path, 'DIK-5531_0007.csv'), 'w', encoding='utf-8') as f:
+            f.write('ABC-1234,Digital Cone Penetrometer\n')
+
+        call_command('import_soil_hardness', folder_path, workers=2, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(360, SoilHardnessMeasurement.objects.count())
+        import_error = SoilHardnessMeasurementImportErrors.objects.get()
+        self.assertEqual('DIK-5531_0007.csv', import_error.csvfile)
+        self.assertEqual('unexpected devicename: ABC-1234', import_error.message)
+
+    def test_handle_import_from_zip(self):
+        Device.objects.create(name='DIK-5531')
+        zip_path = os.path.join(self._mkdtemp(), 'uploaded.zip')
+        with zipfile.ZipFile(zip_path, 'w') as z:
+            z.writestr('ススムA1/DIK-5531_0001.csv', soil_hardness_csv(1))
+            z.writestr('ススムA2/DIK-5531_0002.csv', soil_hardness_csv(2))
+            z.writestr('ススムA2/readme.txt', 'not a csv')
+
+        call_command('import_soil_hardness', zip_path, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(120, SoilHardnessMeasurement.objects.count())
+        self.assertEqual('ススムA2', SoilHardnessMeasurement.objects.filter(setmemory=2).first().csvfolder)
+        self.assertFalse(SoilHardnessMeasurementImportErrors.objects.exists())
+
+    def test_handle_skip_imported_sessions(self):
+        Device.objects.create(name='DIK-5531')
+        folder_path = self._mkdtemp()
+        write_soil_hardness_csv(os.path.join(folder_path, 'DIK-5531_0001.csv'), 1)
+        call_command('import_soil_hardness', folder_path, stdout=StringIO(), stderr=StringIO())
+
+        # 取り込み済みの測定と、同じ測定が重複した2ファイルを取り込む（中身は変えて台帳では読み飛ばされないようにする）
+        write_soil_hardness_csv(os.path.join(folder_path, 'DIK-5531_0001_reexport.csv'), 1, setdepth=50)
+        write_soil_hardness_csv(os.path.join(folder_path, 'DIK-5531_0002.csv'), 2)
+        write_soil_hardness_csv(os.path.join(folder_path, 'DIK-5531_0002_copy.csv'), 2, setdepth=50)
+        err = StringIO()
+        call_command('import_soil_hardness', folder_path, stdout=StringIO(), stderr=err)
+
+        self.assertEqual(120, SoilHardnessMeasurement.objects.count())
+        self.assertEqual(2, SoilHardnessMeasurementImportErrors.objects.filter(message='取り込み済み').count())
+        self.assertIn('Duplicate entry detected', err.getvalue())
+
+        # 取り込み済みと報告したファイルも台帳に記録するので、もう一度アップロードしても開かずに読み飛ばす
+        self.assertTrue(SoilHardnessImportManifest.objects.filter(csvfile='DIK-5531_0001_reexport.csv').exists())
+        out = StringIO()
+        with mock.patch.object(Command, '_find_imported_sessions') as find_imported_sessions:
+            call_command('import_soil_hardness', folder_path, stdout=out, stderr=StringIO())
+        find_imported_sessions.assert_not_called()
+        self.assertIn('Skipped 4 unchanged CSV files.', out.getvalue())
+        self.assertFalse(SoilHardnessMeasurementImportErrors.objects.exists())
+
+    def test_handle_identical_files_in_one_run(self):
+        Device.objects.create(name='DIK-5531')
+        folder_path = self._mkdtemp()
+        write_soil_hardness_csv(os.path.join(folder_path, 'DIK-5531_0001.csv'), 1)
+        write_soil_hardness_csv(os.path.join(folder_path, 'DIK-5531_0001_copy.csv'), 1)
+        out = StringIO()
+        call_command('import_soil_hardness', folder_path, stdout=out, stderr=StringIO())
+
+        # 同じ取り込みの中で同じ中身のファイルは、読み飛ばさずに取り込み済みとして報告する
+        self.assertNotIn('unchanged', out.getvalue())
+        self.assertEqual(60, SoilHardnessMeasurement.objects.count())
+        self.assertEqual(1, SoilHardnessMeasurementImportErrors.objects.filter(message='取り込み済み').count())
+        self.assertEqual(1, SoilHardnessImportManifest.objects.count())
+
+    def test_handle_duplicate_saved_concurrently(self):
+        Device.objects.create(name='DIK-5531')
+        folder_path = self._mkdtemp()
+        write_soil_hardness_csv(os.path.join(folder_path, 'DIK-5531_0001.csv'), 1)
+        call_command('import_soil_hardness', folder_path, stdout=StringIO(), stderr=StringIO())
+
+        # 事前チェックでは見つからず、INSERT したときに別の取り込みが同じ測定を保存していた
+        find_imported_sessions = Command._find_imported_sessions
+        calls = []
+
+        def find_after_preflight(parsed_files, m_device):
+            calls.append(parsed_files)
+            return set() if len(calls) == 1 else find_imported_sessions(parsed_files, m_device)
+
+        write_soil_hardness_csv(os.path.join(folder_path, 'DIK-5531_0001.csv'), 1, setdepth=50)
+        err = StringIO()
+        with mock.patch.object(Command, '_find_imported_sessions', side_effect=find_after_preflight):
+            call_command('import_soil_hardness', folder_path, stdout=StringIO(), stderr=err)
+
+        self.assertEqual(2, len(calls))
+        self.assertEqual(60, SoilHardnessMeasurement.objects.count())
+        self.assertEqual(1, SoilHardnessMeasurementImportErrors.objects.filter(message='取り込み済み').count())
+        self.assertIn('Duplicate entry detected', err.getvalue())
+
+    def test_handle_skip_unchanged_files(self):
+        Device.objects.create(name='DIK-5531')
+        folder_path = self._mkdtemp()
+        os.makedirs(os.path.join(folder_path, 'ススムA1'))
+        write_soil_hardness_csv(os.path.join(folder_path, 'ススムA1', 'DIK-5531_0001.csv'), 1)
+        call_command('import_soil_hardness', folder_path, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(1, SoilHardnessImportManifest.objects.filter(csvfolder='ススムA1').count())
+
+        # 中身が同じCSVは測定データを照会せずに読み飛ばされ、新しいCSVだけ取り込まれる
+        write_soil_hardness_csv(os.path.join(folder_path, 'ススムA1', 'DIK-5531_0002.csv'), 2)
+        out = StringIO()
+        call_command('import_soil_hardness', folder_path, stdout=out, stderr=StringIO())
+
+        self.assertIn('Skipped 1 unchanged CSV files.', out.getvalue())
+        self.assertEqual(120, SoilHardnessMeasurement.objects.count())
+        self.assertEqual(2, SoilHardnessImportManifest.objects.count())
+        self.assertFalse(SoilHardnessMeasurementImportErrors.objects.exists())
@@ -0,0 +1,19 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from crm.models import LandScoreChemical, LandScoreChemicalSummary
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES
+
+
+class TestRebuildLandScoreSummary(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def test_handle(self):
+        out = StringIO()
+        call_command('rebuild_land_score_summary', stdout=out)
+
+        created = 5 * len(LandScoreChemical.METRICS)
+        self.assertIn(f'Successfully rebuilt {created} land score summaries.', out.getvalue())
+        self.assertEqual(created, LandScoreChemicalSummary.objects.count())
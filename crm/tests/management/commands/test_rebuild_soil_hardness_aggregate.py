@@ -0,0 +1,23 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from crm.models import Device, SoilHardnessAggregate, SoilHardnessProfile
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES, create_session
+
+
+class TestRebuildSoilHardnessAggregate(TestCase):
+    fixtures = FIXTURES
+
+    def test_handle(self):
+        device = Device.objects.get(name='DIK-5531')
+        create_session(device, 1)
+        create_session(device, 2)
+        SoilHardnessProfile.objects.filter(setmemory=1).update(landledger_id=1, landblock_id=1, associated=True)
+
+        out = StringIO()
+        call_command('rebuild_soil_hardness_aggregate', stdout=out)
+
+        self.assertIn('Successfully rebuilt 60 soil hardness aggregates.', out.getvalue())
+        self.assertEqual(600, SoilHardnessAggregate.objects.get(depth=60).pressure_max)
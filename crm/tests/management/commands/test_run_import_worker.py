@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from crm.models import Device, SoilHardnessImportJob, SoilHardnessMeasurement, SoilHardnessMeasurementImportErrors, \
+    SoilHardnessImportManifest, SoilHardnessProfile
+from crm.tests.management.commands.test_import_soil_hardness import soil_hardness_csv
+
+
+class TestRunImportWorker(TestCase):
+    def setUp(self):
+        Device.objects.create(name='DIK-5531')
+
+    def test_handle_once(self):
+        work_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_path)
+        zip_path = os.path.join(work_path, 'uploaded.zip')
+        with zipfile.ZipFile(zip_path, 'w') as z:
+            z.writestr('ススムA1/DIK-5531_0001.csv', soil_hardness_csv(1))
+            z.writestr('ススムA1/DIK-5531_0002.csv', 'invalid')
+        job = SoilHardnessImportJob.objects.create(zip_path=zip_path)
+
+        call_command('run_import_worker', once=True, stdout=StringIO(), stderr=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(SoilHardnessImportJob.DONE, job.status)
+        self.assertEqual(2, job.total_files)
+        self.assertEqual(2, job.processed_files)
+        self.assertEqual(1, job.error_files)
+        self.assertEqual(60, SoilHardnessMeasurement.objects.count())
+        self.assertEqual('DIK-5531_0002.csv', SoilHardnessMeasurementImportErrors.objects.get(job=job).csvfile)
+        self.assertFalse(os.path.exists(zip_path))
+
+    def test_handle_missing_zip(self):
+        job = SoilHardnessImportJob.objects.create(zip_path='/path/to/nonexistent.zip')
+
+        call_command('run_import_worker', once=True, stdout=StringIO(), stderr=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(SoilHardnessImportJob.FAILED, job.status)
+        self.assertIn('Zip file does not exist', job.message)
+
+    def test_handle_resume_interrupted(self):
+        work_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_path)
+        zip_path = os.path.join(work_path, 'uploaded.zip')
+        with zipfile.ZipFile(zip_path, 'w') as z:
+            z.writestr('ススムA1/DIK-5531_0001.csv', soil_hardness_csv(1))
+            z.writestr('ススムA1/DIK-5531_0002.csv', soil_hardness_csv(2))
+        job = SoilHardnessImportJob.objects.create(zip_path=zip_path, status=SoilHardnessImportJob.RUNNING)
+
+        # 1ファイル目までコミットしたところで止まったジョブ
+        call_command('import_soil_hardness', zip_path, stdout=StringIO(), stderr=StringIO())
+        SoilHardnessMeasurement.objects.filter(setmemory=2).delete()
+        SoilHardnessProfile.objects.filter(setmemory=2).delete()
+        SoilHardnessImportManifest.objects.filter(csvfile='DIK-5531_0002.csv').delete()
+
+        out = StringIO()
+        call_command('run_import_worker', once=True, resume_interrupted=True, stdout=out, stderr=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(SoilHardnessImportJob.DONE, job.status)
+        self.assertEqual(2, job.processed_files)
+        self.assertEqual(0, job.error_files)
+        self.assertIn('Skipped 1 unchanged CSV files.', out.getvalue())
+        self.assertEqual(120, SoilHardnessMeasurement.objects.count())
@@ -0,0 +1,38 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from crm.domain.service.reports.reportcache import ChemicalReportCache
+from crm.domain.service.reports.reportlayout1 import ReportLayout1
+from crm.models import LandLedger
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-warm-reports'},
+})
+class TestWarmReportCache(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def setUp(self):
+        caches['reports'].clear()
+
+    @mock.patch.object(ReportLayout1, 'publish_chart', return_value='cG5n')
+    def test_handle(self, publish_chart):
+        out = StringIO()
+        call_command('warm_report_cache', landledger=[1], engine='matplotlib', stdout=out)
+
+        self.assertIn('Successfully warmed 1 chemical report charts.', out.getvalue())
+        self.assertEqual(b'png', ChemicalReportCache.get_chart_png(LandLedger.objects.get(pk=1), 4))
+        self.assertEqual(4, publish_chart.call_count)
+
+    @mock.patch.object(ReportLayout1, 'publish', side_effect=lambda: {'chart1': {}})
+    def test_handle_json(self, publish):
+        call_command('warm_report_cache', landledger=[1], engine='json', stdout=StringIO())
+
+        ChemicalReportCache.get_charts(LandLedger.objects.get(pk=1), 'json')
+        self.assertEqual(1, publish.call_count)
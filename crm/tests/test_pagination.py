@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import pytz
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from crm.domain.valueobject.packedseries import PackedSeries
+from crm.models import Device, SoilHardnessProfile, Company
+from crm.pagination import KeysetPaginator
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES
+
+KEYSET_FIELDS = ('setmemory', 'setdatetime', 'pk')
+
+
+def add_profiles(setmemories, devices):
+    """
+    setmemory ごとに、機器の数だけ（同じ setmemory で）未関連付けのプロファイルを追加する
+    """
+    setdatetime = pytz.timezone('Asia/Tokyo').localize(datetime(2023, 7, 1, 12, 0))
+    SoilHardnessProfile.objects.bulk_create([
+        SoilHardnessProfile(
+            setdevice=device, setmemory=setmemory, setdatetime=setdatetime, setdepth=60, setspring=5, setcone=2,
+            depths=PackedSeries.pack([]), pressures=PackedSeries.pack([]), row_count=60, csvfolder='ススムA1')
+        for setmemory in setmemories for device in devices
+    ])
+
+
+class TestKeysetPaginator(TestCase):
+    fixtures = FIXTURES
+
+    def setUp(self):
+        add_profiles(range(1, 31), Device.objects.order_by('pk'))
+        self.queryset = SoilHardnessProfile.objects.filter(associated=False)
+        self.expected = list(self.queryset.order_by(*KEYSET_FIELDS).values_list('pk', flat=True))
+
+    def test_page_forward(self):
+        paginator = KeysetPaginator(self.queryset, KEYSET_FIELDS, 25)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(after=pages[-1].next_cursor))
+
+        self.assertEqual([25, 25, 10], [len(page) for page in pages])
+        # setmemory が同じ行がページの境目にあっても、抜けたり重なったりしない
+        self.assertEqual(self.expected, [profile.pk for page in pages for profile in page])
+        self.assertFalse(pages[0].has_previous())
+        self.assertTrue(pages[-1].has_previous())
+
+    def test_page_backward(self):
+        paginator = KeysetPaginator(self.queryset, KEYSET_FIELDS, 25)
+        second = paginator.page(after=paginator.page().next_cursor)
+        third = paginator.page(after=second.next_cursor)
+
+        self.assertEqual([profile.pk for profile in second],
+                         [profile.pk for profile in paginator.page(before=third.previous_cursor)])
+        first = paginator.page(before=second.previous_cursor)
+        self.assertEqual(self.expected[:25], [profile.pk for profile in first])
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(self.queryset, KEYSET_FIELDS, 25)
+
+        for cursor in ('!!', 'WzFd', 'eyJhIjoxfQ'):
+            self.assertEqual(self.expected[:25], [profile.pk for profile in paginator.page(after=cursor)])
+
+    def test_constant_cost(self):
+        paginator = KeysetPaginator(self.queryset, KEYSET_FIELDS, 25)
+        with CaptureQueriesContext(connection) as first:
+            cursor = paginator.page().next_cursor
+        with CaptureQueriesContext(connection) as last:
+            paginator.page(after=paginator.page(after=cursor).next_cursor)
+
+        self.assertEqual(1, len(first))
+        self.assertEqual(2, len(last))
+        for query in first.captured_queries + last.captured_queries:
+            self.assertNotIn('OFFSET', query['sql'].upper())
+
+    def test_page_by_pk(self):
+        paginator = KeysetPaginator(Company.objects.all(), ('pk',), 1)
+        first = paginator.page()
+        second = paginator.page(after=first.next_cursor)
+
+        self.assertLess(first.object_list[0].pk, second.object_list[0].pk)
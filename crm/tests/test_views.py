@@ -0,0 +1,354 @@
+import os
+import subprocess
+import sys
+import zipfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from crm.domain.service.landscoresummaryservice import LandScoreSummaryService
+from crm.domain.service.reports.chemicalreportexporter import ChemicalReportExporter
+from crm.domain.service.reports.reportlayout1 import ReportLayout1
+from crm.domain.service.soilhardnessassociationservice import SoilHardnessAssociationService
+from crm.domain.valueobject.graph.matplotlib import Matplotlib
+from crm.models import Company, CompanyCategory, Device, LandLedger, LandScoreChemical, \
+    SamplingOrder, SoilHardnessMeasurement
+from crm.tests.domain.repository.test_landrepository import add_lands
+from crm.tests.domain.service.test_soilhardnessassociationservice import FIXTURES, create_session
+from crm.tests.test_pagination import add_profiles
+from crm.views import CompanyListView
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-views-reports'},
+})
+@mock.patch.object(ReportLayout1, 'publish_chart', return_value='cG5n')
+class TestLandReportChemicalChartView(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def setUp(self):
+        caches['reports'].clear()
+        self.landledger = LandLedger.objects.get(pk=1)
+        self.url = reverse('crm:land_report_chemical_chart', kwargs={'landledger_id': 1, 'chart_no': 2})
+
+    def test_get(self, publish_chart):
+        response = self.client.get(self.url)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('image/png', response['Content-Type'])
+        self.assertEqual(b'png', response.content)
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertTrue(response.has_header('Last-Modified'))
+        publish_chart.assert_called_once_with(2)
+
+    def test_get_not_modified(self, publish_chart):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(1, publish_chart.call_count)
+
+    def test_get_after_save(self, publish_chart):
+        etag = self.client.get(self.url)['ETag']
+        landscore = LandScoreChemical.objects.filter(landledger=self.landledger).first()
+        landscore.ph = 6.5
+        landscore.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+        self.assertEqual(2, publish_chart.call_count)
+
+    def test_get_unknown_chart(self, publish_chart):
+        url = reverse('crm:land_report_chemical_chart', kwargs={'landledger_id': 1, 'chart_no': 5})
+
+        self.assertEqual(404, self.client.get(url).status_code)
+
+    def test_report_page_does_not_render_charts(self, publish_chart):
+        url = reverse('crm:land_report_chemical', kwargs={'company_id': 1, 'landledger_id': 1})
+
+        response = self.client.get(url, {'engine': 'matplotlib'})
+
+        self.assertEqual(200, response.status_code)
+        self.assertContains(response, f'{self.url}?v=')
+        self.assertNotContains(response, 'base64')
+        publish_chart.assert_not_called()
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-views-reports'},
+})
+class TestLandReportChemicalListView(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def setUp(self):
+        caches['reports'].clear()
+        self.url = reverse('crm:land_report_chemical', kwargs={'company_id': 1, 'landledger_id': 1})
+
+    def test_get_queries(self):
+        # 台帳、分析結果、講評の3回（台帳の関連と圃場ブロック名で追加のクエリを出さない）
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'engine': 'matplotlib'})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(5, len(response.context['landscores']))
+
+    def test_get_queries_json(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'engine': 'json'})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(4, len(response.context['charts']))
+
+    def test_get_not_found(self):
+        url = reverse('crm:land_report_chemical', kwargs={'company_id': 1, 'landledger_id': 999})
+
+        self.assertEqual(404, self.client.get(url).status_code)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-views-reports'},
+})
+@mock.patch.object(Matplotlib, 'plot_graph', return_value='cG5n')
+class TestLandReportChemicalExportView(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def setUp(self):
+        caches['reports'].clear()
+
+    def test_get(self, plot_graph):
+        url = reverse('crm:land_report_chemical_export', kwargs={'company_id': 1})
+
+        response = self.client.get(url, {'landperiod': 4})
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as zf:
+            folders = {name.rsplit('/', 1)[0] for name in zf.namelist()}
+        self.assertEqual({ChemicalReportExporter.folder_name(LandLedger.objects.get(pk=pk)) for pk in (3, 4)},
+                         folders)
+
+    def test_get_unknown_company(self, plot_graph):
+        url = reverse('crm:land_report_chemical_export', kwargs={'company_id': 999})
+
+        self.assertEqual(404, self.client.get(url).status_code)
+
+    def test_get_invalid_landperiod(self, plot_graph):
+        url = reverse('crm:land_report_chemical_export', kwargs={'company_id': 1})
+
+        self.assertEqual(400, self.client.get(url, {'landperiod': 'spring'}).status_code)
+        self.assertEqual(404, self.client.get(url, {'landperiod': 999}).status_code)
+
+
+@mock.patch.object(Matplotlib, 'plot_trend', return_value='cG5n')
+class TestLandReportTrendView(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def setUp(self):
+        LandScoreSummaryService.rebuild()
+
+    def test_get(self, plot_trend):
+        url = reverse('crm:land_report_trend', kwargs={'company_id': 1, 'land_id': 1})
+
+        response = self.client.get(url, {'metric': ['ph', 'unknown']})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['ph'], list(response.context['charts']))
+        self.assertEqual(3, len(response.context['seasons']))
+        plot_trend.assert_called_once()
+
+    def test_get_other_company(self, plot_trend):
+        url = reverse('crm:land_report_trend', kwargs={'company_id': 2, 'land_id': 1})
+
+        self.assertEqual(404, self.client.get(url).status_code)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-views-reports'},
+})
+class TestChemicalDashboardView(TestCase):
+    fixtures = FIXTURES + ['landscorechemical']
+
+    def setUp(self):
+        caches['reports'].clear()
+        LandScoreSummaryService.rebuild()
+        self.url = reverse('crm:chemical_dashboard', kwargs={'company_id': 1})
+
+    def test_get(self):
+        response = self.client.get(self.url, {'metric': ['ph', 'unknown']})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([('ph', '水素イオン濃度')], response.context['metrics'])
+        self.assertEqual(5, len(response.context['rows']))
+        self.assertTrue(all(row['cells'][0] for row in response.context['rows']))
+
+    def test_get_crop(self):
+        response = self.client.get(self.url, {'crop': 2})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({4, 5}, {row['landledger'].pk for row in response.context['rows']})
+
+    def test_get_invalid_crop(self):
+        self.assertEqual(400, self.client.get(self.url, {'crop': 'rice'}).status_code)
+
+
+class TestViewsImport(SimpleTestCase):
+    # 画面を表示するだけのワーカーやコマンドの起動時には読み込まない（使うときに import する）
+    HEAVY_MODULES = ['matplotlib', 'numpy', 'fastkml', 'lxml', 'exifread', 'haversine']
+
+    def test_import_does_not_load_heavy_modules(self):
+        code = (
+            'import sys, django; django.setup(); import crm.urls, crm.views; '
+            f'print(",".join(m for m in {self.HEAVY_MODULES!r} if m in sys.modules))'
+        )
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE,
+               'PYTHONPATH': os.pathsep.join(sys.path)}
+
+        result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+
+        self.assertEqual('', result.stdout.strip())
+
+
+class TestLandListView(TestCase):
+    fixtures = FIXTURES
+
+    def test_get_constant_queries(self):
+        url = reverse('crm:land_list', kwargs={'company_id': 1})
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+
+        add_lands(Company.objects.get(pk=1), 30)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+
+        self.assertEqual(20, len(response.context['object_list']))
+        self.assertEqual(len(few), len(many))
+        self.assertLessEqual(len(many), 2)
+
+    def test_get_next_page(self):
+        add_lands(Company.objects.get(pk=1), 30)
+        url = reverse('crm:land_list', kwargs={'company_id': 1})
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get(url)
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(url, {'after': response.context['page_obj'].next_cursor})
+
+        self.assertContains(response, '追加の圃場29')
+        self.assertFalse(response.context['page_obj'].has_next())
+        # 2ページ目も1ページ目と同じクエリ数で、2列の行はすべて閉じる
+        self.assertEqual(len(first), len(second))
+        content = response.content.decode()
+        self.assertEqual(content.count('<div'), content.count('</div>'))
+        self.assertEqual(Company.objects.get(pk=1).land_set.count() - 20, len(response.context['object_list']))
+
+
+class TestCompanyListView(TestCase):
+    fixtures = FIXTURES
+
+    def test_get_pages(self):
+        url = reverse('crm:company_list')
+        with mock.patch.object(CompanyListView, 'paginate_by', 2):
+            first = self.client.get(url)
+            second = self.client.get(url, {'after': first.context['page_obj'].next_cursor})
+            back = self.client.get(url, {'before': second.context['page_obj'].previous_cursor})
+
+        expected = list(Company.objects.filter(category=CompanyCategory.AGRI_COMPANY).order_by('pk'))
+        self.assertEqual(expected[:2], list(first.context['object_list']))
+        self.assertEqual(expected[2:4], list(second.context['object_list']))
+        self.assertEqual(expected[:2], list(back.context['object_list']))
+        self.assertContains(first, '次へ')
+
+
+class TestSoilhardnessAssociationView(TestCase):
+    fixtures = FIXTURES
+
+    def test_get_r_blocks_across_pages(self):
+        add_profiles(range(1, 151), Device.objects.filter(pk=1))
+        url = reverse('crm:soilhardness_association')
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url, {'after': first.context['page_obj'].next_cursor})
+
+        self.assertEqual(list(range(1, 101)), [profile.setmemory for profile in first.context['object_list']])
+        self.assertEqual(list(range(101, 151)), [profile.setmemory for profile in second.context['object_list']])
+        # R型 のまとまり（25件）は2ページ目でも 101, 126 から始まる
+        for setmemory in (101, 126):
+            self.assertContains(second, f'name="form_checkboxes[]" value="{setmemory}"')
+        self.assertNotContains(second, 'name="form_checkboxes[]" value="102"')
+        self.assertNotIn('OFFSET', ' '.join(query['sql'].upper() for query in queries.captured_queries))
+
+    def test_get_r_blocks_for_9_point_method(self):
+        SamplingOrder.objects.bulk_create([
+            SamplingOrder(sampling_method_id=2, ordering=order.ordering, landblock_id=order.landblock_id)
+            for order in SamplingOrder.objects.filter(sampling_method_id=1)
+        ])
+        LandLedger.objects.filter(pk=1).update(sampling_method_id=2)
+        add_profiles(range(1, 201), Device.objects.filter(pk=1))
+        url = reverse('crm:soilhardness_association')
+        first = self.client.get(url, {'sampling_method': 2})
+        second = self.client.get(url, {'sampling_method': 2, 'after': first.context['page_obj'].next_cursor})
+
+        # 9点法 の1圃場は 5ブロック✕9回 = 45件なので、1ページは4圃場分の180件
+        self.assertEqual(45, first.context['field_size'])
+        self.assertEqual(list(range(1, 181)), [profile.setmemory for profile in first.context['object_list']])
+        self.assertEqual(list(range(181, 201)), [profile.setmemory for profile in second.context['object_list']])
+        for setmemory in (1, 46, 91, 136):
+            self.assertContains(first, f'name="form_checkboxes[]" value="{setmemory}"')
+        self.assertNotContains(first, 'name="form_checkboxes[]" value="26"')
+        self.assertContains(second, 'name="form_checkboxes[]" value="181"')
+        # ページを移っても採土法を引き継ぐ
+        self.assertContains(first, '?sampling_method=2&amp;after=')
+        # 帳簿は選んだ採土法のものだけ
+        self.assertEqual([1], [landledger.pk for landledger in first.context['landledgers']])
+
+    def test_get_without_sampling_order(self):
+        add_profiles(range(1, 101), Device.objects.filter(pk=1))
+        response = self.client.get(reverse('crm:soilhardness_association'), {'sampling_method': 2})
+
+        self.assertContains(response, '採土順が登録されていないため、Rパターンでは関連付けできません')
+        self.assertNotContains(response, 'name="form_checkboxes[]"')
+        # 個別の関連付けは採土順がなくてもできるので、5✕9回 = 45件ずつボタンを出す
+        for setmemory in (1, 46, 91):
+            self.assertContains(response, f'name="btn_individual" value="{setmemory}"')
+        self.assertNotContains(response, 'name="btn_individual" value="26"')
+        self.assertEqual(100, len(response.context['object_list']))
+
+    def test_get_invalid_sampling_method(self):
+        url = reverse('crm:soilhardness_association')
+        self.assertEqual(400, self.client.get(url, {'sampling_method': 'x'}).status_code)
+        self.assertEqual(404, self.client.get(url, {'sampling_method': 999}).status_code)
+
+    def test_post_individual_rolls_back(self):
+        create_session(Device.objects.get(name='DIK-5531'), 1)
+        url = reverse('crm:soilhardness_association_individual', kwargs={'memory_anchor': 1, 'landledger': 1})
+
+        # プロファイルかロールアップの更新で失敗したら、測定データの関連付けも元に戻る
+        with mock.patch.object(SoilHardnessAssociationService, 'sync_profiles', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(url, {'landblocks[]': [1]})
+        self.assertFalse(SoilHardnessMeasurement.objects.filter(landledger__isnull=False).exists())
+
+    def test_post_r_pattern_without_sampling_order(self):
+        add_profiles(range(1, 46), Device.objects.filter(pk=1))
+        LandLedger.objects.filter(pk=1).update(sampling_method_id=2)
+
+        response = self.client.post(reverse('crm:soilhardness_association'),
+                                    {'landledger': 1, 'form_checkboxes[]': [1]}, follow=True)
+
+        self.assertRedirects(response, reverse('crm:soilhardness_association'))
+        self.assertContains(response, '採土順が登録されていないため関連付けできません')
+        self.assertEqual(45, len(response.context['object_list']))
@@ -15,8 +15,20 @@ urlpatterns = [
     path('company/<int:company_id>/land/<int:pk>/detail', views.LandDetailView.as_view(), name='land_detail'),
     path('company/<int:company_id>/landledger/<int:landledger_id>/land_report_chemical',
          views.LandReportChemicalListView.as_view(), name='land_report_chemical'),
+    path('landledger/<int:landledger_id>/chart/<int:chart_no>.png', views.LandReportChemicalChartView.as_view(),
+         name='land_report_chemical_chart'),
+    path('company/<int:company_id>/land/<int:land_id>/land_report_trend', views.LandReportTrendView.as_view(),
+         name='land_report_trend'),
+    path('company/<int:company_id>/chemical_dashboard', views.ChemicalDashboardView.as_view(),
+         name='chemical_dashboard'),
+    path('company/<int:company_id>/land_report_chemical_export', views.LandReportChemicalExportView.as_view(),
+         name='land_report_chemical_export'),
+    path('company/<int:company_id>/landledger/<int:landledger_id>/land_report_physical',
+         views.LandReportPhysicalView.as_view(), name='land_report_physical'),
     path('soilhardness/upload', views.SoilhardnessUploadView.as_view(), name='soilhardness_upload'),
-    path('soilhardness/success', views.SoilhardnessSuccessView.as_view(), name='soilhardness_success'),
+    path('soilhardness/success/<int:job_id>', views.SoilhardnessSuccessView.as_view(), name='soilhardness_success'),
+    path('soilhardness/job/<int:job_id>/progress', views.SoilhardnessImportJobProgressView.as_view(),
+         name='soilhardness_job_progress'),
     path('soilhardness/association', views.SoilhardnessAssociationView.as_view(), name='soilhardness_association'),
     path('soilhardness/association/individual/<int:memory_anchor>/<int:landledger>',
          views.SoilhardnessAssociationIndividualView.as_view(), name='soilhardness_association_individual'),
@@ -1,31 +1,46 @@
-import os
-import shutil
+import hashlib
 
 from django.contrib import messages
+from django.core.exceptions import BadRequest
 from django.core.files.uploadedfile import InMemoryUploadedFile
-from django.core.management import call_command
-from django.db.models import Count
-from django.http import HttpResponseRedirect
-from django.shortcuts import redirect
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import HttpResponseRedirect, JsonResponse, Http404, HttpResponse, StreamingHttpResponse, \
+    HttpResponseBadRequest
+from django.shortcuts import redirect, get_object_or_404
 from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.functional import cached_property
+from django.utils.http import http_date, quote_etag
+from django.views import View
 from django.views.generic import ListView, CreateView, DetailView, TemplateView, FormView
 
 from crm.domain.service.landcandidateservice import LandCandidateService
+from crm.domain.service.reports.basereportlayout import get_chart_executor
+from crm.domain.service.reports.chemicalreportexporter import ChemicalReportExporter
+from crm.domain.service.reports.reportcache import ChemicalReportCache
 from crm.domain.service.reports.reportlayout1 import ReportLayout1
+from crm.domain.service.soilhardnessassociationservice import SoilHardnessAssociationService
+from crm.domain.repository.chemicalreportrepository import ChemicalReportRepository
 from crm.domain.repository.landrepository import LandRepository
+from crm.domain.valueobject.graph.graphengines import resolve_graph_engine_name
 from crm.domain.service.zipfileservice import ZipFileService
 from crm.forms import CompanyCreateForm, LandCreateForm, UploadForm
+from crm.pagination import KeysetPaginationMixin
 from crm.models import Company, Land, LandScoreChemical, LandReview, CompanyCategory, LandLedger, \
-    SoilHardnessMeasurementImportErrors, SoilHardnessMeasurement, LandBlock, SamplingOrder, RouteSuggestImport
+    SoilHardnessMeasurementImportErrors, SoilHardnessMeasurement, LandBlock, RouteSuggestImport, \
+    SoilHardnessImportJob, SoilHardnessProfile, Crop, LandPeriod, SamplingMethod
 
 
 class Home(TemplateView):
     template_name = "crm/home.html"
 
 
-class CompanyListView(ListView):
+class CompanyListView(KeysetPaginationMixin, ListView):
     model = Company
     template_name = "crm/company/list.html"
+    # 2列で並べるので偶数にする
+    paginate_by = 20
 
     def get_queryset(self):
         return super().get_queryset().filter(category=CompanyCategory.AGRI_COMPANY)
@@ -45,21 +60,21 @@ class CompanyDetailView(DetailView):
     template_name = 'crm/company/detail.html'
 
 
-class LandListView(ListView):
+class LandListView(KeysetPaginationMixin, ListView):
     model = Land
     template_name = "crm/land/list.html"
+    # 2列で並べるので偶数にする
+    paginate_by = 20
 
     def get_queryset(self):
         company = Company(pk=self.kwargs['company_id'])
-        return super().get_queryset().filter(company=company)
+        return LandRepository(company).read_lands()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         company = Company(pk=self.kwargs['company_id'])
-        land_repository = LandRepository(company)
-        land_ledger_map = {land: land_repository.read_landledgers(land) for land in context['object_list']}
         context['company'] = company
-        context['land_ledger_map'] = land_ledger_map
+        context['land_ledger_map'] = LandRepository.read_landledger_map(context['object_list'])
 
         return context
 
@@ -96,60 +111,290 @@ class LandReportChemicalListView(ListView):
     template_name = "crm/landreport/chemical.html"
 
     def get_queryset(self):
-        landledger = LandLedger(self.kwargs['landledger_id'])
-        return super().get_queryset().filter(landledger=landledger)
+        # 台帳と分析結果はここで1回ずつだけ読み、画面、グラフのバージョン、グラフの平均で共有する
+        repository = ChemicalReportRepository(self.kwargs['landledger_id'])
+        try:
+            self.landledger = repository.read_landledger()
+        except LandLedger.DoesNotExist:
+            raise Http404
+        return repository.read_landscores()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        landledger = LandLedger.objects.get(id=self.kwargs['landledger_id'])
-
-        context['charts'] = ReportLayout1(landledger).publish()
+        landledger = self.landledger
+        landscores = self.object_list
+
+        engine = resolve_graph_engine_name(self.request.GET.get('engine'))
+        if engine == 'matplotlib':
+            # png はグラフごとの URL から読ませるので、ここでは描かずにバージョンだけ URL に付ける
+            context['chart_version'] = chart_etag(
+                landledger.pk, 0, ChemicalReportCache.version(landledger, landscores))
+        else:
+            context['charts'] = ChemicalReportCache.get_charts(landledger, engine, landscores)
+        context['charts_engine'] = engine
         context['company'] = Company(self.kwargs['company_id'])
         context['landledger'] = landledger
-        context['landscores'] = LandScoreChemical.objects.filter(landledger=landledger)
+        context['landscores'] = landscores
         context['landreview'] = LandReview.objects.filter(landledger=landledger)
 
         return context
 
 
+def chart_etag(landledger_id: int, chart_no: int, version: str) -> str:
+    return hashlib.sha1(f'{landledger_id}:{chart_no}:{version}'.encode()).hexdigest()[:16]
+
+
+class LandReportChemicalChartView(View):
+    # URL に ?v=<バージョン> を付けて参照するので、同じ URL の中身は変わらない
+    MAX_AGE = 60 * 60 * 24 * 365
+
+    @staticmethod
+    def get(request, **kwargs):
+        """
+        化学レポートのグラフ1つ分の png を返す
+        ETag と Last-Modified で条件付きリクエストに応え、変わっていなければ描かずに 304 を返す
+        """
+        landledger = get_object_or_404(LandLedger, pk=kwargs['landledger_id'])
+        chart_no = kwargs['chart_no']
+        if not 1 <= chart_no <= ReportLayout1.CHART_COUNT:
+            raise Http404
+
+        version, last_modified = ChemicalReportCache.state(landledger)
+        etag = quote_etag(chart_etag(landledger.pk, chart_no, version))
+        last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(ChemicalReportCache.get_chart_png(landledger, chart_no, version),
+                                    content_type='image/png')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, public=True, max_age=LandReportChemicalChartView.MAX_AGE)
+        return response
+
+
+class LandReportChemicalExportView(View):
+    @staticmethod
+    def get(request, **kwargs):
+        """
+        法人のすべての台帳の化学レポートを zip にしてストリーミングで返す（?landperiod=<id> で時期を絞る）
+        """
+        company = get_object_or_404(Company, pk=kwargs['company_id'])
+        landledgers = LandRepository(company).land_ledgers.filter(landscorechemical__isnull=False).distinct()
+        if request.GET.get('landperiod'):
+            try:
+                landperiod_id = int(request.GET['landperiod'])
+            except ValueError:
+                return HttpResponseBadRequest('landperiod must be an integer')
+            landledgers = landledgers.filter(landperiod=get_object_or_404(LandPeriod, pk=landperiod_id))
+
+        exporter = ChemicalReportExporter(landledgers, get_chart_executor())
+        response = StreamingHttpResponse(exporter.iter_zip(), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="land_report_chemical_{company.pk}.zip"'
+        return response
+
+
+class LandReportPhysicalView(TemplateView):
+    template_name = "crm/landreport/physical.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # NumPy を使うレポートは、ワーカーの起動を軽くするため最初に表示するときに import する
+        from crm.domain.service.reports.reportlayout2 import ReportLayout2
+
+        landledger = get_object_or_404(LandLedger, id=self.kwargs['landledger_id'])
+
+        context['charts'] = ReportLayout2(landledger).publish()
+        context['company'] = Company(self.kwargs['company_id'])
+        context['landledger'] = landledger
+
+        return context
+
+
+class LandReportTrendView(TemplateView):
+    template_name = "crm/landreport/trend.html"
+
+    def get_context_data(self, **kwargs):
+        """
+        圃場の作期をまたいだ化学分析値の推移（?metric=ph&metric=ec でグラフにする分析値を選ぶ）
+        """
+        from crm.domain.service.reports.reportlayout3 import ReportLayout3
+
+        context = super().get_context_data(**kwargs)
+        land = get_object_or_404(Land, pk=self.kwargs['land_id'], company_id=self.kwargs['company_id'])
+        metrics = [metric for metric in self.request.GET.getlist('metric') if metric in ReportLayout3.METRIC_LABELS]
+
+        layout = ReportLayout3(land)
+        context['charts'] = layout.publish(metrics)
+        context['seasons'] = layout.seasons
+        context['rows'] = layout.table()
+        context['metric_labels'] = ReportLayout3.METRIC_LABELS
+        context['company'] = Company(self.kwargs['company_id'])
+        context['land'] = land
+
+        return context
+
+
+class ChemicalDashboardView(TemplateView):
+    template_name = "crm/landreport/dashboard.html"
+    paginate_by = 100
+
+    def get_context_data(self, **kwargs):
+        """
+        法人の台帳ごとの分析値を、法人のすべての台帳（?crop=<id> なら同じ作物のすべての台帳）と比べた順位で並べる
+        ?metric=ph&metric=ec で列にする分析値を選ぶ
+        """
+        from crm.domain.service.chemicaldashboardservice import ChemicalDashboardService
+        from crm.domain.service.reports.reportlayout3 import ReportLayout3
+
+        context = super().get_context_data(**kwargs)
+        company = get_object_or_404(Company, pk=self.kwargs['company_id'])
+        metrics = [metric for metric in self.request.GET.getlist('metric') if metric in ReportLayout3.METRIC_LABELS]
+        metrics = metrics or list(ReportLayout3.DEFAULT_METRICS)
+
+        landledgers = LandRepository(company).land_ledgers
+        crop_id = self.request.GET.get('crop')
+        if crop_id:
+            try:
+                crop_id = int(crop_id)
+            except ValueError:
+                raise BadRequest('crop must be an integer')
+            landledgers = landledgers.filter(crop_id=crop_id)
+            service = ChemicalDashboardService('crop', crop_id)
+        else:
+            service = ChemicalDashboardService('company', company.pk)
+
+        landledger_ids = landledgers.order_by('land__name', 'sampling_date', 'pk').values_list('pk', flat=True)
+        page = Paginator(landledger_ids, self.paginate_by).get_page(self.request.GET.get('page'))
+        page_landledgers = LandLedger.objects \
+            .filter(pk__in=list(page.object_list)) \
+            .select_related('land', 'landperiod', 'crop') \
+            .in_bulk()
+        rows = ChemicalDashboardService.rows(service.load(), list(page.object_list), metrics)
+
+        context['company'] = company
+        context['crops'] = Crop.objects.order_by('pk')
+        context['crop_id'] = crop_id or None
+        context['metrics'] = [(metric, ReportLayout3.METRIC_LABELS[metric]) for metric in metrics]
+        context['metric_labels'] = ReportLayout3.METRIC_LABELS
+        context['page_obj'] = page
+        context['rows'] = [
+            {'landledger': page_landledgers[landledger_id],
+             'cells': [rows.get(landledger_id, {}).get(metric) for metric in metrics]}
+            for landledger_id in page.object_list
+        ]
+
+        return context
+
+
 class SoilhardnessUploadView(FormView):
     template_name = 'crm/soilhardness/form.html'
     form_class = UploadForm
-    success_url = reverse_lazy('crm:soilhardness_success')
 
     def form_valid(self, form):
-        # Zipを処理してバッチ実行
-        upload_folder = ZipFileService.handle_uploaded_zip(self.request.FILES['file'])
-        if os.path.exists(upload_folder):
-            call_command('import_soil_hardness', upload_folder)
-            shutil.rmtree(upload_folder)
+        """
+        Zipは解凍せずに保存してジョブに積むだけにし、取り込みは run_import_worker に任せる
+        """
+        zip_path = ZipFileService.save_uploaded_zip(self.request.FILES['file'])
+        self.job = SoilHardnessImportJob.objects.create(zip_path=zip_path)
 
         return super().form_valid(form)
 
+    def get_success_url(self):
+        return reverse('crm:soilhardness_success', kwargs={'job_id': self.job.pk})
+
 
 class SoilhardnessSuccessView(TemplateView):
     template_name = 'crm/soilhardness/success.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['import_errors'] = SoilHardnessMeasurementImportErrors.objects.all()
+        job = get_object_or_404(SoilHardnessImportJob, pk=self.kwargs['job_id'])
+        context['job'] = job
+        context['import_errors'] = SoilHardnessMeasurementImportErrors.objects.filter(job=job)
         return context
 
 
-class SoilhardnessAssociationView(ListView):
-    model = SoilHardnessMeasurement
+class SoilhardnessImportJobProgressView(View):
+    @staticmethod
+    def get(request, **kwargs):
+        """
+        取り込みジョブの進捗を返す（成功ページからポーリングされるので1行だけ読む）
+        """
+        progress = SoilHardnessImportJob.objects \
+            .filter(pk=kwargs['job_id']) \
+            .values('status', 'total_files', 'processed_files', 'error_files', 'message') \
+            .first()
+        if progress is None:
+            raise Http404
+
+        progress['finished'] = progress['status'] in SoilHardnessImportJob.FINISHED_STATUSES
+        return JsonResponse(progress)
+
+
+class SoilhardnessAssociationView(KeysetPaginationMixin, ListView):
+    """
+    未関連付けの貫入を、選んだ採土法（?sampling_method=）の1圃場の測定の数ずつのまとまりで並べる
+    """
+    model = SoilHardnessProfile
     template_name = 'crm/soilhardness/association/list.html'
+    # 1ページに並べる圃場の数（ページの境目が圃場の途中にならないように、件数は1圃場の測定の数の倍数にする）
+    fields_per_page = 4
+    # 採土法が1つも登録されていないときの件数
+    paginate_by = 100
+    keyset_fields = ('setmemory', 'setdatetime', 'pk')
+
+    @cached_property
+    def sampling_method(self):
+        """
+        Raises:
+            BadRequest: ?sampling_method が数値でないとき
+            Http404: ?sampling_method の採土法がないとき
+        """
+        sampling_methods = SamplingMethod.objects.order_by('pk')
+        sampling_method_id = self.request.GET.get('sampling_method')
+        if not sampling_method_id:
+            return sampling_methods.first()
+        try:
+            sampling_method_id = int(sampling_method_id)
+        except ValueError:
+            raise BadRequest('invalid sampling_method')
+        return get_object_or_404(sampling_methods, pk=sampling_method_id)
+
+    @cached_property
+    def field_size(self) -> int:
+        if self.sampling_method is None:
+            return 0
+        return SoilHardnessAssociationService.field_size(self.sampling_method)
+
+    @cached_property
+    def block_size(self) -> int:
+        """
+        1圃場として並べる件数。採土順がなくて R型 で関連付けられない採土法は、
+        個別の関連付け（SoilhardnessAssociationIndividualView）と同じ 5✕採土法の回数 ずつにする
+        """
+        if self.sampling_method is None:
+            return 0
+        return self.field_size or 5 * self.sampling_method.times
+
+    def get_paginate_by(self, queryset):
+        return self.fields_per_page * self.block_size if self.block_size else self.paginate_by
 
     def get_queryset(self, **kwargs):
+        """
+        深さごとの測定データを GROUP BY せずに、取り込みと関連付けで維持しているセッションごとのプロファイルから読む
+        """
         return super().get_queryset() \
-            .filter(landblock__isnull=True) \
-            .values('setmemory', 'setdatetime') \
-            .annotate(cnt=Count('pk')) \
+            .filter(associated=False) \
+            .only('setmemory', 'setdatetime', 'row_count') \
             .order_by('setmemory')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['landledgers'] = LandLedger.objects.all().order_by('pk')
+        context['sampling_methods'] = SamplingMethod.objects.order_by('pk')
+        context['sampling_method'] = self.sampling_method
+        context['field_size'] = self.field_size
+        context['block_size'] = self.block_size
+        context['landledgers'] = LandLedger.objects.filter(sampling_method=self.sampling_method).order_by('pk')
         return context
 
     @staticmethod
@@ -158,7 +403,7 @@ class SoilhardnessAssociationView(ListView):
         R型 で登録するときは、圃場の1ブロックが5点計測なので、採土法（5点法、9点法）の回数を乗ずると、1圃場での採取回数になる
         R型以外のときはIndividualViewへ飛ぶ
         """
-        form_landledger = int(request.POST.get('landledger')[0])
+        form_landledger = int(request.POST.get('landledger'))
         if "btn_individual" in request.POST:
             return HttpResponseRedirect(
                 reverse(
@@ -171,31 +416,19 @@ class SoilhardnessAssociationView(ListView):
 
         form_checkboxes = [int(checkbox) for checkbox in request.POST.getlist('form_checkboxes[]')]
         if form_checkboxes:
-            landledger = LandLedger.objects.filter(pk=form_landledger).first()
-            sampling_times = landledger.sampling_method.times
-            total_sampling_times = 5 * sampling_times
-            needle = 0
-            landblock_orders = SamplingOrder.objects \
-                .filter(sampling_method=landledger.sampling_method) \
-                .order_by('ordering')
-            for memory_anchor in form_checkboxes:
-                soilhardness_measurements = SoilHardnessMeasurement.objects \
-                    .filter(setmemory__range=(memory_anchor, memory_anchor + (total_sampling_times - 1))) \
-                    .order_by('pk')
-                for i, soilhardness_measurement in enumerate(soilhardness_measurements):
-                    soilhardness_measurement.landblock = landblock_orders[needle].landblock
-                    soilhardness_measurement.landledger = landledger
-                    forward_the_needle = i > 0 and i % (soilhardness_measurement.setdepth * sampling_times) == 0
-                    if forward_the_needle:
-                        needle += 1
-                SoilHardnessMeasurement.objects.bulk_update(soilhardness_measurements,
-                                                            fields=["landblock", "landledger"])
+            landledger = get_object_or_404(LandLedger.objects.select_related('sampling_method'), pk=form_landledger)
+            try:
+                SoilHardnessAssociationService.associate_r_pattern(landledger, form_checkboxes)
+            except ValueError:
+                messages.error(
+                    request, f"採土法「{landledger.sampling_method.name}」の採土順が登録されていないため関連付けできません")
+                return HttpResponseRedirect(reverse('crm:soilhardness_association'))
 
         return HttpResponseRedirect(reverse('crm:soilhardness_association_success'))
 
 
 class SoilhardnessAssociationIndividualView(ListView):
-    model = SoilHardnessMeasurement
+    model = SoilHardnessProfile
     template_name = 'crm/soilhardness/association/individual/list.html'
 
     def get_queryset(self, **kwargs):
@@ -205,8 +438,7 @@ class SoilhardnessAssociationIndividualView(ListView):
         total_sampling_times = 5 * landledger.sampling_method.times
         return super().get_queryset() \
             .filter(setmemory__range=(form_memory_anchor, form_memory_anchor + (total_sampling_times - 1))) \
-            .values('setmemory', 'setdatetime') \
-            .annotate(cnt=Count('pk')) \
+            .only('setmemory', 'setdatetime', 'row_count') \
             .order_by('setmemory')
 
     def get_context_data(self, **kwargs):
@@ -231,13 +463,17 @@ class SoilhardnessAssociationIndividualView(ListView):
         soilhardness_measurements = SoilHardnessMeasurement.objects \
             .filter(setmemory__range=(form_memory_anchor, form_memory_anchor + (total_sampling_times - 1))) \
             .order_by('pk')
-        for i, soilhardness_measurement in enumerate(soilhardness_measurements):
-            needle = i // 60
-            soilhardness_measurement.landblock_id = form_landblocks[needle]
-            soilhardness_measurement.landledger = landledger
-        SoilHardnessMeasurement.objects.bulk_update(soilhardness_measurements,
-                                                    fields=["landblock", "landledger"])
-        if SoilHardnessMeasurement.objects.filter(landblock__isnull=True).count() == 0:
+        # 測定データ、プロファイル、ロールアップを1つのトランザクションで更新する
+        with transaction.atomic():
+            soilhardness_measurements = list(soilhardness_measurements.select_for_update())
+            for i, soilhardness_measurement in enumerate(soilhardness_measurements):
+                needle = i // 60
+                soilhardness_measurement.landblock_id = form_landblocks[needle]
+                soilhardness_measurement.landledger = landledger
+            SoilHardnessMeasurement.objects.bulk_update(soilhardness_measurements,
+                                                        fields=["landblock", "landledger"])
+            SoilHardnessAssociationService.sync_profiles(soilhardness_measurements)
+        if not SoilHardnessProfile.objects.filter(associated=False).exists():
             return HttpResponseRedirect(reverse('crm:soilhardness_association_success'))
 
         return HttpResponseRedirect(reverse('crm:soilhardness_association'))